@@ -1,10 +1,18 @@
 from django.contrib import admin
-from .models import Project, Task, Comment
+from .models import Membership, Project, Task, Comment
 
 # Register your models here.
 
+class MembershipInline(admin.TabularInline):
+    # Участники хранятся в Membership: M2M с through в форме проекта не редактируется
+    model = Membership
+    extra = 0
+    raw_id_fields = ['user']
+
+
 @admin.register(Project)
 class ProjectAdmin(admin.ModelAdmin):
+    inlines = [MembershipInline]
     list_display = ['title', 'description', 'status', 'created', 'update'   ]
     list_editable = ['status']
 
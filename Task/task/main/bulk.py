@@ -0,0 +1,154 @@
+from collections import Counter
+
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from task.response_cache import bump
+from user_messages.models import Message
+from users.models import User
+from .counters import apply_delta, state_delta, task_state
+from .models import Project, Task
+from .notifications import task_created_message, task_updated_message
+from .serializers import TaskBulkItemSerializer, get_changed_fields
+
+MAX_OPERATIONS = 500
+
+
+class TaskOperationSerializer(serializers.Serializer):
+    """Одна операция пачки: create (data), update (id, data) или transition (id, status)."""
+    op = serializers.ChoiceField(choices=('create', 'update', 'transition'))
+    id = serializers.IntegerField(required=False)
+    data = serializers.DictField(required=False)
+    status = serializers.ChoiceField(choices=Task.Status.choices, required=False)
+
+    def validate(self, attrs):
+        required = {
+            'create': ('data', ),
+            'update': ('id', 'data'),
+            'transition': ('id', 'status'),
+        }[attrs['op']]
+        missing = {name: 'Обязательное поле.' for name in required if name not in attrs}
+        if missing:
+            raise serializers.ValidationError(missing)
+        return attrs
+
+
+class TaskBulkSerializer(serializers.Serializer):
+    operations = TaskOperationSerializer(many=True, allow_empty=False, max_length=MAX_OPERATIONS)
+
+
+def _collect_ids(operations, name):
+    ids = set()
+    for operation in operations:
+        value = operation.get('data', {}).get(name)
+        try:
+            ids.add(int(value))
+        except (TypeError, ValueError):
+            pass
+    return ids
+
+
+def _in_bulk(queryset, ids):
+    return queryset.in_bulk(ids) if ids else {}
+
+
+def apply_task_operations(operations):
+    """
+    Применяет пачку операций над задачами «всё или ничего».
+
+    Возвращает (результаты по элементам, успех). Все задачи, проекты и
+    исполнители загружаются заранее по одному запросу на таблицу, изменения
+    пишутся через bulk_create/bulk_update, уведомления — одной вставкой,
+    поэтому число запросов не зависит от размера пачки.
+    """
+    tasks = _in_bulk(Task.objects.select_related('project', 'executor'),
+                     {operation['id'] for operation in operations if 'id' in operation})
+    context = {'preloaded': {
+        Project: _in_bulk(Project.objects.all(), _collect_ids(operations, 'project')),
+        User: _in_bulk(User.objects.all(), _collect_ids(operations, 'executor')),
+    }}
+
+    results = []
+    created = []
+    changed = {}
+    valid = True
+    for index, operation in enumerate(operations):
+        result = {'index': index, 'op': operation['op']}
+        results.append(result)
+
+        if operation['op'] == 'create':
+            serializer = TaskBulkItemSerializer(data=operation['data'], context=context)
+            if not serializer.is_valid():
+                result['errors'] = serializer.errors
+                valid = False
+                continue
+            task = Task(**serializer.validated_data)
+            created.append(task)
+            result['task'] = task
+            continue
+
+        task = tasks.get(operation['id'])
+        if task is None:
+            result['errors'] = {'id': ['Задача не найдена.']}
+            valid = False
+            continue
+        if operation['op'] == 'update':
+            serializer = TaskBulkItemSerializer(task, data=operation['data'], partial=True, context=context)
+            if not serializer.is_valid():
+                result['errors'] = serializer.errors
+                valid = False
+                continue
+            values = serializer.validated_data
+        else:
+            values = {'status': operation['status']}
+
+        fields = get_changed_fields(task, values)
+        for name in fields:
+            setattr(task, name, values[name])
+        if fields:
+            changed.setdefault(task.id, (task, {}))[1].update(dict.fromkeys(fields))
+        result['task'] = task
+        result['changed'] = bool(fields)
+
+    if not valid:
+        return [{key: value for key, value in result.items() if key in ('index', 'op', 'errors')}
+                for result in results], False
+
+    with transaction.atomic():
+        Task.objects.bulk_create(created)
+
+        updated = [task for task, _ in changed.values()]
+        if updated:
+            # bulk_update не выставляет auto_now, поэтому update задаётся явно
+            now = timezone.now()
+            for task in updated:
+                task.update = now
+            fields = set().union(*(fields for _, fields in changed.values()))
+            Task.objects.bulk_update(updated, [*sorted(fields), 'update'])
+
+        Message.objects.bulk_create(
+            [task_created_message(task) for task in created]
+            + [task_updated_message(task, list(fields)) for task, fields in changed.values()]
+        )
+
+        # Сигналы save() не срабатывают, поэтому счётчики и кэш обновляются здесь
+        delta = Counter()
+        projects = set()
+        for task in [*created, *updated]:
+            after = task_state(task)
+            delta.update(state_delta(task._counter_state, after))
+            projects.update(state[0] for state in (task._counter_state, after) if state)
+            task._counter_state = after
+        apply_delta(delta)
+        bump('tasks', *(f'project:{project_id}' for project_id in projects))
+
+    for result in results:
+        task = result.pop('task')
+        changed_flag = result.pop('changed', None)
+        result['id'] = task.id
+        if changed_flag is None:
+            result['result'] = 'created'
+        else:
+            result['result'] = 'updated' if changed_flag else 'unchanged'
+    return results, True
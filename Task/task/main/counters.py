@@ -0,0 +1,154 @@
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import Project, ProjectCounter, Task
+
+Kind = ProjectCounter.Kind
+
+
+def task_state(task):
+    """Значения задачи, от которых зависят счётчики; None, если поля не загружены."""
+    values = task.__dict__
+    if any(name not in values for name in ('project_id', 'status', 'priority', 'term', 'executor_id')):
+        return None
+    term = values['term']
+    return (
+        values['project_id'],
+        values['status'],
+        values['priority'],
+        term.isoformat() if hasattr(term, 'isoformat') else str(term),
+        values['executor_id'],
+    )
+
+
+def load_task_state(pk):
+    values = Task.objects.filter(pk=pk).values('project_id', 'status', 'priority', 'term', 'executor_id').first()
+    if values is None:
+        return None
+    return task_state(Task(**values))
+
+
+def state_keys(state):
+    project_id, status, priority, term, executor_id = state
+    keys = [(project_id, Kind.STATUS_PRIORITY, f'{status}:{priority}')]
+    if status != Task.Status.DONE:
+        keys.append((project_id, Kind.TERM, term))
+        keys.append((project_id, Kind.EXECUTOR, str(executor_id)))
+    return keys
+
+
+def state_delta(before, after):
+    """Разница счётчиков между двумя состояниями задачи (любое может быть None)."""
+    delta = Counter()
+    if before is not None:
+        delta.subtract(state_keys(before))
+    if after is not None:
+        delta.update(state_keys(after))
+    return delta
+
+
+def apply_delta(delta):
+    """
+    Применяет изменения счётчиков. Увеличения — upsert (INSERT ... ON CONFLICT),
+    уменьшения — только UPDATE: при каскадном удалении проекта строки счётчиков
+    могут быть уже удалены, и вставлять их заново нельзя.
+    """
+    delta = {key: value for key, value in delta.items() if value}
+    if not delta:
+        return
+    table = connection.ops.quote_name(ProjectCounter._meta.db_table)
+    increments = [(*key, value) for key, value in delta.items() if value > 0]
+    decrements = [(*key, value) for key, value in delta.items() if value < 0]
+    with transaction.atomic(), connection.cursor() as cursor:
+        if increments:
+            rows = ', '.join(['(%s, %s, %s, %s)'] * len(increments))
+            cursor.execute(
+                f'INSERT INTO {table} (project_id, kind, key, count) VALUES {rows} '
+                f'ON CONFLICT (project_id, kind, key) DO UPDATE SET count = {table}.count + EXCLUDED.count',
+                [value for row in increments for value in row],
+            )
+        if decrements:
+            rows = ', '.join(['(%s, %s, %s, %s)'] * len(decrements))
+            cursor.execute(
+                f'UPDATE {table} SET count = {table}.count + d.delta '
+                f'FROM (VALUES {rows}) AS d (project_id, kind, key, delta) '
+                f'WHERE {table}.project_id = d.project_id AND {table}.kind = d.kind AND {table}.key = d.key',
+                [value for row in decrements for value in row],
+            )
+
+
+def get_summary(project_id, today=None):
+    """Сводка доски по счётчикам проекта; None, если проекта нет."""
+    today = (today or timezone.localdate()).isoformat()
+    rows = list(ProjectCounter.objects.filter(project_id=project_id).exclude(count=0)
+                .values_list('kind', 'key', 'count'))
+    if not rows and not Project.objects.filter(id=project_id).exists():
+        return None
+
+    by_status = {status: {priority: 0 for priority in Task.Priority.values} for status in Task.Status.values}
+    overdue_by_term = {}
+    executors = {}
+    for kind, key, count in rows:
+        if kind == Kind.STATUS_PRIORITY:
+            status, priority = key.split(':')
+            by_status.setdefault(status, {})[priority] = count
+        elif kind == Kind.TERM and key < today:
+            overdue_by_term[key] = count
+        elif kind == Kind.EXECUTOR:
+            executors[int(key)] = count
+
+    return {
+        'project': project_id,
+        'total': sum(sum(priorities.values()) for priorities in by_status.values()),
+        'by_status': by_status,
+        'overdue': sum(overdue_by_term.values()),
+        'overdue_by_term': dict(sorted(overdue_by_term.items())),
+        'executors': [{'executor': executor, 'open': count} for executor, count in sorted(executors.items())],
+    }
+
+
+def compute_counters(project_ids=None):
+    tasks = Task.objects.all()
+    if project_ids is not None:
+        tasks = tasks.filter(project_id__in=project_ids)
+    open_tasks = tasks.filter(~Q(status=Task.Status.DONE))
+
+    counters = Counter()
+    for project_id, status, priority, count in (tasks.values_list('project_id', 'status', 'priority')
+                                                .annotate(count=Count('id')).order_by()):
+        counters[(project_id, Kind.STATUS_PRIORITY, f'{status}:{priority}')] = count
+    for project_id, term, count in open_tasks.values_list('project_id', 'term').annotate(count=Count('id')).order_by():
+        counters[(project_id, Kind.TERM, term.isoformat())] = count
+    for project_id, executor_id, count in (open_tasks.values_list('project_id', 'executor_id')
+                                           .annotate(count=Count('id')).order_by()):
+        counters[(project_id, Kind.EXECUTOR, str(executor_id))] = count
+    return counters
+
+
+@transaction.atomic
+def rebuild_counters(project_ids=None):
+    """Пересчитывает счётчики по таблице задач и возвращает число исправленных значений."""
+    expected = compute_counters(project_ids)
+    existing = ProjectCounter.objects.select_for_update()
+    if project_ids is not None:
+        existing = existing.filter(project_id__in=project_ids)
+    actual = {(row.project_id, row.kind, row.key): row for row in existing}
+
+    stale = [row for key, row in actual.items() if key not in expected]
+    changed = []
+    created = []
+    for key, count in expected.items():
+        row = actual.get(key)
+        if row is None:
+            created.append(ProjectCounter(project_id=key[0], kind=key[1], key=key[2], count=count))
+        elif row.count != count:
+            row.count = count
+            changed.append(row)
+
+    ProjectCounter.objects.filter(id__in=[row.id for row in stale]).delete()
+    ProjectCounter.objects.bulk_update(changed, ['count'])
+    ProjectCounter.objects.bulk_create(created)
+    return sum(1 for row in stale if row.count) + len(changed) + len(created)
@@ -0,0 +1,41 @@
+import django_filters
+
+from task.filters import IndexedOrderingFilter
+from .models import Project, Task, Comment
+
+
+class ProjectFilter(django_filters.FilterSet):
+    created_from = django_filters.DateTimeFilter(field_name='created', lookup_expr='gte')
+    created_to = django_filters.DateTimeFilter(field_name='created', lookup_expr='lte')
+    updated_from = django_filters.DateTimeFilter(field_name='update', lookup_expr='gte')
+    updated_to = django_filters.DateTimeFilter(field_name='update', lookup_expr='lte')
+    ordering = IndexedOrderingFilter(
+        indexed={'created': (), 'update': ()},
+        downgraded=('title', 'status'),
+    )
+
+    class Meta:
+        model = Project
+        fields = ['status']
+
+
+class TaskFilter(django_filters.FilterSet):
+    ordering = IndexedOrderingFilter(
+        indexed={'created': ('project',), 'update': ('project',), 'status': ('project',)},
+        downgraded=('title', 'priority', 'term'),
+    )
+
+    class Meta:
+        model = Task
+        fields = ['status', 'priority']
+
+
+class CommentFilter(django_filters.FilterSet):
+    ordering = IndexedOrderingFilter(
+        indexed={'create': ('task',)},
+        downgraded=('name', 'update'),
+    )
+
+    class Meta:
+        model = Comment
+        fields = []
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from main.sync import purge_tombstones
+
+
+class Command(BaseCommand):
+    help = 'Удаляет надгробия удалённых строк старше SYNC["TOMBSTONE_DAYS"] дней'
+
+    def handle(self, *args, **options):
+        deleted = purge_tombstones()
+        self.stdout.write(self.style.SUCCESS(f'Удалено надгробий: {deleted}'))
\ No newline at end of file
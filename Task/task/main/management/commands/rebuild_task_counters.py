@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from main.counters import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики доски (ProjectCounter) по таблице задач и исправляет расхождения'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', type=int, action='append', dest='projects',
+                            help='id проекта (можно указать несколько раз); по умолчанию все проекты')
+
+    def handle(self, *args, projects=None, **options):
+        fixed = rebuild_counters(projects)
+        self.stdout.write(self.style.SUCCESS(f'Исправлено счётчиков: {fixed}'))
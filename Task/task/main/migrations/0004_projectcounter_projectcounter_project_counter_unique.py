@@ -0,0 +1,47 @@
+# Generated by Django 4.2.11 on 2026-10-18 19:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_counters(apps, schema_editor):
+    # Начальное заполнение счётчиков по уже существующим задачам
+    Task = apps.get_model('main', 'Task')
+    ProjectCounter = apps.get_model('main', 'ProjectCounter')
+    open_tasks = Task.objects.exclude(status='DN')
+    counters = []
+    for row in Task.objects.values('project_id', 'status', 'priority').annotate(count=models.Count('id')).order_by():
+        counters.append(ProjectCounter(project_id=row['project_id'], kind='SP',
+                                       key=f"{row['status']}:{row['priority']}", count=row['count']))
+    for row in open_tasks.values('project_id', 'term').annotate(count=models.Count('id')).order_by():
+        counters.append(ProjectCounter(project_id=row['project_id'], kind='TM',
+                                       key=row['term'].isoformat(), count=row['count']))
+    for row in open_tasks.values('project_id', 'executor_id').annotate(count=models.Count('id')).order_by():
+        counters.append(ProjectCounter(project_id=row['project_id'], kind='EX',
+                                       key=str(row['executor_id']), count=row['count']))
+    ProjectCounter.objects.bulk_create(counters, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0003_alter_comment_task_alter_task_project_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('SP', 'Status x Priority'), ('TM', 'Open tasks by term'), ('EX', 'Open tasks by executor')], max_length=2)),
+                ('key', models.CharField(max_length=32)),
+                ('count', models.IntegerField(default=0)),
+                ('project', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='counters', to='main.project')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='projectcounter',
+            constraint=models.UniqueConstraint(fields=('project', 'kind', 'key'), name='project_counter_unique'),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
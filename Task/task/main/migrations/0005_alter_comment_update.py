@@ -0,0 +1,18 @@
+# Generated by Django 4.2.11 on 2026-10-18 19:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0004_projectcounter_projectcounter_project_counter_unique'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='comment',
+            name='update',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,132 @@
+# Generated by Django 4.2.11 on 2026-10-18 20:12
+
+from django.db import migrations, models
+
+# Номер транзакции изменения ставит триггер, а не Django: так его получают и
+# bulk_update, и QuerySet.update, и любые записи в обход моделей. Триггер
+# удаления пишет надгробие (main_tombstone), в том числе при каскадном удалении.
+TRIGGERS_SQL = """
+CREATE FUNCTION main_set_change_xid() RETURNS trigger AS $$
+BEGIN
+    NEW.change_xid := pg_current_xact_id()::text::bigint;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION main_record_tombstone() RETURNS trigger AS $$
+DECLARE
+    project integer;
+BEGIN
+    IF TG_TABLE_NAME = 'main_project' THEN
+        project := OLD.id;
+    ELSIF TG_TABLE_NAME = 'main_task' THEN
+        project := OLD.project_id;
+    ELSE
+        -- Django удаляет комментарии раньше их задачи, поэтому задача ещё на месте
+        SELECT project_id INTO project FROM main_task WHERE id = OLD.task_id;
+    END IF;
+    INSERT INTO main_tombstone (model, object_id, project_id, change_xid, deleted)
+    VALUES (TG_ARGV[0], OLD.id, project, pg_current_xact_id()::text::bigint, now());
+    RETURN OLD;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER main_project_change_xid BEFORE INSERT OR UPDATE ON main_project
+    FOR EACH ROW EXECUTE FUNCTION main_set_change_xid();
+CREATE TRIGGER main_task_change_xid BEFORE INSERT OR UPDATE ON main_task
+    FOR EACH ROW EXECUTE FUNCTION main_set_change_xid();
+CREATE TRIGGER main_comment_change_xid BEFORE INSERT OR UPDATE ON main_comment
+    FOR EACH ROW EXECUTE FUNCTION main_set_change_xid();
+
+-- Состав участников отдаётся вместе с проектом: его изменение тоже меняет проект
+CREATE FUNCTION main_touch_project() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        UPDATE main_project SET change_xid = 0 WHERE id = OLD.project_id;
+    ELSE
+        UPDATE main_project SET change_xid = 0 WHERE id = NEW.project_id;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER main_project_users_touch AFTER INSERT OR DELETE ON main_project_project_users
+    FOR EACH ROW EXECUTE FUNCTION main_touch_project();
+
+CREATE TRIGGER main_project_tombstone AFTER DELETE ON main_project
+    FOR EACH ROW EXECUTE FUNCTION main_record_tombstone('projects');
+CREATE TRIGGER main_task_tombstone AFTER DELETE ON main_task
+    FOR EACH ROW EXECUTE FUNCTION main_record_tombstone('tasks');
+CREATE TRIGGER main_comment_tombstone AFTER DELETE ON main_comment
+    FOR EACH ROW EXECUTE FUNCTION main_record_tombstone('comments');
+"""
+
+DROP_TRIGGERS_SQL = """
+DROP TRIGGER main_project_change_xid ON main_project;
+DROP TRIGGER main_task_change_xid ON main_task;
+DROP TRIGGER main_comment_change_xid ON main_comment;
+DROP TRIGGER main_project_tombstone ON main_project;
+DROP TRIGGER main_task_tombstone ON main_task;
+DROP TRIGGER main_comment_tombstone ON main_comment;
+DROP TRIGGER main_project_users_touch ON main_project_project_users;
+DROP FUNCTION main_touch_project();
+DROP FUNCTION main_set_change_xid();
+DROP FUNCTION main_record_tombstone();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_alter_comment_update'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=20)),
+                ('object_id', models.IntegerField()),
+                ('project_id', models.IntegerField(null=True)),
+                ('change_xid', models.BigIntegerField()),
+                ('deleted', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='change_xid',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='change_xid',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='change_xid',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['change_xid'], name='comment_change_xid_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['change_xid'], name='project_change_xid_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['change_xid'], name='task_change_xid_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['change_xid'], name='tombstone_change_xid_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['deleted'], name='tombstone_deleted_idx'),
+        ),
+        migrations.RunSQL(TRIGGERS_SQL, DROP_TRIGGERS_SQL),
+    ]
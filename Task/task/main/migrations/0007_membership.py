@@ -0,0 +1,93 @@
+# Generated by Django 4.2.11 on 2026-10-18 20:35
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+# Участники хранились дважды: main_project_project_users (Project.project_users)
+# и users_user_user_projects (User.user_projects), и таблицы расходились.
+# Обе сливаются в main_membership; время вступления неизвестно, поэтому
+# берётся время создания проекта. Проекты, у которых после слияния появились
+# участники, помечаются изменёнными для /api/v1/sync/.
+MERGE_SQL = """
+INSERT INTO main_membership (project_id, user_id, role, joined_at)
+SELECT links.project_id, links.user_id, 'MB', project.created
+FROM (
+    SELECT project_id, user_id FROM main_project_project_users
+    UNION
+    SELECT project_id, user_id FROM users_user_user_projects
+) AS links
+JOIN main_project AS project ON project.id = links.project_id;
+
+UPDATE main_project SET change_xid = 0 WHERE id IN (
+    SELECT project_id FROM (
+        SELECT project_id, user_id FROM users_user_user_projects
+        EXCEPT
+        SELECT project_id, user_id FROM main_project_project_users
+    ) AS added
+);
+"""
+
+RESTORE_SQL = """
+INSERT INTO main_project_project_users (project_id, user_id)
+SELECT project_id, user_id FROM main_membership;
+"""
+
+OLD_TOUCH_TRIGGER_SQL = """
+CREATE TRIGGER main_project_users_touch AFTER INSERT OR DELETE ON main_project_project_users
+    FOR EACH ROW EXECUTE FUNCTION main_touch_project();
+"""
+
+# Триггер синхронизации (0006) переезжает на новую таблицу: смена состава или роли меняет проект
+TOUCH_TRIGGER_SQL = """
+CREATE TRIGGER main_membership_touch AFTER INSERT OR UPDATE OR DELETE ON main_membership
+    FOR EACH ROW EXECUTE FUNCTION main_touch_project();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('main', '0006_sync_change_xid'),
+        ('users', '0007_user_avatar_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Membership',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('OW', 'Owner'), ('MB', 'Member'), ('VW', 'Viewer')], default='MB', max_length=2)),
+                ('joined_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('project', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='main.project')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='membership',
+            index=models.Index(fields=['user', 'joined_at'], name='membership_user_joined_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='membership',
+            constraint=models.UniqueConstraint(fields=('project', 'user'), name='membership_project_user_unique'),
+        ),
+        migrations.RunSQL(MERGE_SQL, RESTORE_SQL),
+        migrations.RunSQL(
+            'DROP TRIGGER main_project_users_touch ON main_project_project_users;',
+            OLD_TOUCH_TRIGGER_SQL,
+        ),
+        # M2M нельзя перевести на through изменением поля: старая таблица удаляется,
+        # поле объявляется заново поверх main_membership
+        migrations.RemoveField(
+            model_name='project',
+            name='project_users',
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='project_users',
+            field=models.ManyToManyField(related_name='user_projects', through='main.Membership', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunSQL(TOUCH_TRIGGER_SQL, 'DROP TRIGGER main_membership_touch ON main_membership;'),
+    ]
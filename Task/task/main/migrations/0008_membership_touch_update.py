@@ -0,0 +1,46 @@
+# Generated by Django 4.2.11 on 2026-10-18 23:40
+
+from django.db import migrations
+
+# Состав участников отдаётся вместе с проектом, поэтому его изменение должно
+# менять и Project.update — по нему строятся ETag и Last-Modified
+# (task/conditional.py). Триггер main_membership_touch срабатывает на любую
+# запись в main_membership: через модель, bulk_create, админку и сырой SQL.
+# clock_timestamp(), а не now(): now() — начало транзакции, и update мог бы
+# откатиться назад относительно сохранения проекта в той же транзакции.
+TOUCH_FUNCTION_SQL = """
+CREATE OR REPLACE FUNCTION main_touch_project() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        UPDATE main_project SET change_xid = 0, "update" = clock_timestamp() WHERE id = OLD.project_id;
+    ELSE
+        UPDATE main_project SET change_xid = 0, "update" = clock_timestamp() WHERE id = NEW.project_id;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+OLD_TOUCH_FUNCTION_SQL = """
+CREATE OR REPLACE FUNCTION main_touch_project() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        UPDATE main_project SET change_xid = 0 WHERE id = OLD.project_id;
+    ELSE
+        UPDATE main_project SET change_xid = 0 WHERE id = NEW.project_id;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_membership'),
+    ]
+
+    operations = [
+        migrations.RunSQL(TOUCH_FUNCTION_SQL, OLD_TOUCH_FUNCTION_SQL),
+    ]
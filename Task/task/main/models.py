@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 # Create your models here.
 
@@ -13,7 +14,19 @@ class Project(models.Model):
     created = models.DateTimeField(auto_now_add=True)
     update = models.DateTimeField(auto_now=True)
     status = models.CharField(max_length=2, choices=Status.choices, default=Status.ACTIVE)
-    project_users = models.ManyToManyField("users.User")
+    # Участники хранятся в одной таблице Membership (роль, время вступления);
+    # с пользователя проекты доступны как user.user_projects
+    project_users = models.ManyToManyField("users.User", through='Membership', related_name='user_projects')
+    # Транзакция последнего изменения (pg_current_xact_id); выставляется триггером БД, по ней работает main/sync.py
+    change_xid = models.BigIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # ProjectView фильтрует по диапазонам created/update
+            models.Index(fields=['created'], name='project_created_idx'),
+            models.Index(fields=['update'], name='project_update_idx'),
+            models.Index(fields=['change_xid'], name='project_change_xid_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -33,7 +46,8 @@ class Task(models.Model):
 
     title = models.CharField(max_length=100)
     description = models.TextField()
-    project = models.ForeignKey(Project, on_delete=models.CASCADE)
+    # Отдельный индекс по project_id не нужен: его покрывают составные индексы ниже
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, db_index=False)
     executor = models.ForeignKey("users.User", on_delete=models.CASCADE)
     status = models.CharField(max_length=2, choices=Status.choices, default=Status.GROOMING)
     priority = models.CharField(max_length=2, choices=Priority.choices, default=Priority.LOW)
@@ -41,17 +55,114 @@ class Task(models.Model):
     update = models.DateTimeField(auto_now=True)
     term = models.DateField()
     responsible_for_test = models.CharField(max_length=100)
+    # Транзакция последнего изменения (pg_current_xact_id); выставляется триггером БД, по ней работает main/sync.py
+    change_xid = models.BigIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # Доска проекта: колонки по статусу и приоритету
+            models.Index(fields=['project', 'status', 'priority'], name='task_project_status_prio_idx'),
+            # Сроки по незакрытым задачам
+            models.Index(fields=['project', 'term'], condition=~models.Q(status='DN'), name='task_project_open_term_idx'),
+            # TaskView: задачи проекта, отсортированные по created/update
+            models.Index(fields=['project', 'created'], name='task_project_created_idx'),
+            models.Index(fields=['project', 'update'], name='task_project_update_idx'),
+            models.Index(fields=['change_xid'], name='task_change_xid_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+class Membership(models.Model):
+    """Участие пользователя в проекте."""
+
+    class Role(models.TextChoices):
+        OWNER = 'OW', 'Owner'
+        MEMBER = 'MB', 'Member'
+        VIEWER = 'VW', 'Viewer'
+
+    # Индексы по project_id и user_id покрываются составными ниже
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='memberships', db_index=False)
+    user = models.ForeignKey("users.User", on_delete=models.CASCADE, related_name='memberships', db_index=False)
+    role = models.CharField(max_length=2, choices=Role.choices, default=Role.MEMBER)
+    joined_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            # Участники проекта
+            models.UniqueConstraint(fields=['project', 'user'], name='membership_project_user_unique'),
+        ]
+        indexes = [
+            # Проекты пользователя, новые сверху (/api/v1/users/me/projects/)
+            models.Index(fields=['user', 'joined_at'], name='membership_user_joined_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id} in {self.project_id}: {self.role}'
+
+class ProjectCounter(models.Model):
+    """
+    Счётчики задач проекта для сводки доски; обновляются инкрементально
+    сигналами Task (main/counters.py), пересчитываются командой rebuild_task_counters.
+    """
+
+    class Kind(models.TextChoices):
+        STATUS_PRIORITY = 'SP', 'Status x Priority'
+        TERM = 'TM', 'Open tasks by term'
+        EXECUTOR = 'EX', 'Open tasks by executor'
+
+    # Индекс по project_id покрывается уникальным ограничением (project, kind, key)
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='counters', db_index=False)
+    kind = models.CharField(max_length=2, choices=Kind.choices)
+    key = models.CharField(max_length=32)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['project', 'kind', 'key'], name='project_counter_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.project_id} {self.kind} {self.key}: {self.count}'
+
 class Comment(models.Model):
     name = models.CharField(max_length=100)
     body = models.TextField()
     create = models.DateField(auto_now_add=True)
-    update = models.DateField(auto_now=True)
-    task = models.ForeignKey(Task, on_delete=models.CASCADE)
+    # DateTimeField, а не DateField: по update строятся ETag/Last-Modified
+    update = models.DateTimeField(auto_now=True)
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, db_index=False)
+    # Транзакция последнего изменения (pg_current_xact_id); выставляется триггером БД, по ней работает main/sync.py
+    change_xid = models.BigIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # CommentView: комментарии задачи по дате создания
+            models.Index(fields=['task', 'create'], name='comment_task_create_idx'),
+            models.Index(fields=['change_xid'], name='comment_change_xid_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+class Tombstone(models.Model):
+    """
+    Удалённая строка Project/Task/Comment для дельта-синхронизации (main/sync.py).
+    Пишется триггером БД на каждый DELETE, в том числе каскадный, и хранится
+    SYNC['TOMBSTONE_DAYS'] дней (команда purge_tombstones).
+    """
+    model = models.CharField(max_length=20)
+    object_id = models.IntegerField()
+    # Проект удалённой строки, чтобы синхронизацию можно было сузить до проекта
+    project_id = models.IntegerField(null=True)
+    change_xid = models.BigIntegerField()
+    deleted = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['change_xid'], name='tombstone_change_xid_idx'),
+            models.Index(fields=['deleted'], name='tombstone_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.model} {self.object_id}'
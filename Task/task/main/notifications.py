@@ -0,0 +1,92 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from user_messages.models import Message
+from user_messages.notifications import push_messages
+
+
+def task_created_message(task):
+    return Message(
+        title=f"Вы зачислены в новый проект: '{task.project}'",
+        text=f"'{task.title}' - Ваша задача",
+        owner=task.executor,
+        project=task.project,
+        task=task
+    )
+
+
+def task_updated_text(task, changes=(), updates=1):
+    text = f"'{task.title}' - Ваша задача была обновлена."
+    if updates > 1:
+        text = f"'{task.title}' - Ваша задача была обновлена {updates} раз(а)."
+    if changes:
+        text += f" Изменено: {', '.join(changes)}."
+    return text
+
+
+def task_updated_message(task, changes=()):
+    return Message(
+        title=f"Задача обновлена: '{task.title}'",
+        text=task_updated_text(task, changes),
+        owner=task.executor,
+        project=task.project,
+        task=task,
+        changes=list(changes)
+    )
+
+
+def get_coalesce_window():
+    return getattr(settings, 'NOTIFICATIONS_COALESCE_WINDOW', 60)
+
+
+class UpdateCoalescer:
+    """
+    Склеивает уведомления об обновлении задачи для одного владельца.
+
+    Первое обновление создаёт сообщение с окном coalesce_until = now + window;
+    следующие обновления той же задачи для того же владельца до конца окна
+    не создают новых строк, а дописывают изменённые поля и увеличивают
+    счётчик updates. Прочитанное сообщение закрывает окно. Время берётся
+    из clock, поэтому в тестах его можно подменить.
+    """
+
+    def __init__(self, window=None, clock=timezone.now):
+        self.window = window
+        self.clock = clock
+
+    def get_window(self):
+        return get_coalesce_window() if self.window is None else self.window
+
+    @transaction.atomic
+    def task_updated(self, task, changes):
+        """Сохраняет уведомление об обновлении task; возвращает созданное или дополненное сообщение."""
+        message = task_updated_message(task, changes)
+        window = self.get_window()
+        if not window or task.executor_id is None:
+            message.save()
+            return message
+        now = self.clock()
+        pending = (Message.objects.select_for_update()
+                   .filter(owner_id=task.executor_id, task_id=task.id, read_at__isnull=True, coalesce_until__gt=now)
+                   .order_by('-id').first())
+        if pending is None:
+            message.coalesce_until = now + timedelta(seconds=window)
+            message.save()
+            return message
+
+        # Порядок полей сохраняется: сначала изменённые раньше, затем новые
+        pending.changes = list(dict.fromkeys([*pending.changes, *changes]))
+        pending.updates += 1
+        pending.title = message.title
+        pending.text = task_updated_text(task, pending.changes, pending.updates)
+        pending.save(update_fields=['title', 'text', 'changes', 'updates', 'sequence'])
+        # Новое сообщение не создаётся, поэтому клиенту отправляется обновлённое с тем же id
+        # и новым sequence: по нему его получат и клиенты, догружающие пропущенное
+        transaction.on_commit(lambda: push_messages([pending]))
+        return pending
+
+
+coalescer = UpdateCoalescer()
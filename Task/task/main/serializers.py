@@ -1,92 +1,136 @@
+from django.db import transaction
 from rest_framework import serializers
-from .models import Project, Task, Comment
+from .models import Membership, Project, Task, Comment
 from user_messages.models import Message
-from django.core.mail import send_mail
+from user_messages.outbox import enqueue_emails
+from users.models import User
+from users.serializers import UserBriefSerializer
+from task.expand import ExpandableSerializerMixin
+from task.fieldsets import SparseFieldsetSerializerMixin
+from task.fields import BulkPrimaryKeyRelatedField, PreloadedPrimaryKeyRelatedField
+from .notifications import coalescer, task_created_message
 
 
-class ProjectSerializer(serializers.ModelSerializer):
+def get_changed_fields(instance, values):
+    """Имена полей из values, значения которых отличаются от текущих (FK сравниваются по id)."""
+    changed = []
+    for name, value in values.items():
+        field = instance._meta.get_field(name)
+        if field.many_to_one:
+            current, value = getattr(instance, field.attname), getattr(value, 'pk', value)
+        else:
+            current = getattr(instance, name)
+        if current != value:
+            changed.append(name)
+    return changed
+
+
+class ProjectSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
+    # Участники проверяются одним запросом, а не запросом на каждый id. Поле объявлено явно:
+    # M2M через Membership DRF по умолчанию делает только для чтения; set() при
+    # обновлении создаёт Membership с ролью и временем вступления по умолчанию
+    project_users = BulkPrimaryKeyRelatedField(many=True, queryset=User.objects.all(), allow_empty=False)
+
     class Meta:
         model = Project
-        fields = '__all__'
+        # change_xid служебный: по нему работает /api/v1/sync/
+        exclude = ('change_xid', )
 
+    @transaction.atomic
     def create(self, validated_data):
         project_users = validated_data.pop('project_users', [])
         project = Project.objects.create(**validated_data)
-        project.project_users.set(project_users)
-        # Отправка email уведомления всем пользователям проекта
+        # Число запросов не зависит от количества участников: все вставки одной пачкой
+        Membership.objects.bulk_create(Membership(project=project, user=user) for user in project_users)
+        # Email уведомления пишутся в outbox в этой же транзакции,
+        # отправляет их отдельный воркер (manage.py send_outbox_emails)
         subject = 'Вас добавили в проект'
         message = f'Здравствуйте, Вас добавили в новый проект: "{project.title}".'
-        from_email = 'Poklpokl12@yandex.ru'
-        recipient_list = [user.email for user in project_users]
-        send_mail(subject, message, from_email, recipient_list, fail_silently=False)
+        enqueue_emails(subject, message, [user.email for user in project_users])
 
-        for user in project_users:
-            Message.objects.create(
+        Message.objects.bulk_create(
+            Message(
                 title=f"Welcome to {project.title}",
                 text=f"Hello {user.username}, welcome to the project {project.title}!",
                 owner=user,
                 project=project,
                 task=None
             )
-            user.user_projects.add(project)
-            # user.user_all_projects.add(project.title)
+            for user in project_users
+        )
 
         return project
 
 
-class TaskSerializer(serializers.ModelSerializer):
+class UserProjectSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
+    """Проект пользователя с его ролью: строка Membership и проект из одного JOIN."""
+    id = serializers.IntegerField(source='project_id', read_only=True)
+    title = serializers.CharField(source='project.title', read_only=True)
+    description = serializers.CharField(source='project.description', read_only=True)
+    status = serializers.CharField(source='project.status', read_only=True)
+    created = serializers.DateTimeField(source='project.created', read_only=True)
+    update = serializers.DateTimeField(source='project.update', read_only=True)
+
+    class Meta:
+        model = Membership
+        fields = ('id', 'title', 'description', 'status', 'created', 'update', 'role', 'joined_at')
+
+
+class TaskSerializer(SparseFieldsetSerializerMixin, ExpandableSerializerMixin, serializers.ModelSerializer):
+    expandable_fields = {'project': ProjectSerializer, 'executor': UserBriefSerializer}
+
     class Meta:
         model = Task
-        fields = '__all__'
+        exclude = ('change_xid', )
 
     def create(self, validated_data):
         task = Task.objects.create(**validated_data)
-        Message.objects.create(
-            title=f"Вы зачислены в новый проект: '{task.project}'",
-            text=f"'{task.title}' - Ваша задача",
-            owner=task.executor,
-            project=task.project,
-            task=task
-        )
+        task_created_message(task).save()
         return task
 
 
     def update(self, instance, validated_data):
-        # Обновляем поля задачи
-        instance.title = validated_data.get('title', instance.title)
-        instance.description = validated_data.get('description', instance.description)
-        instance.project = validated_data.get('project', instance.project)
-        instance.executor = validated_data.get('executor', instance.executor)
-        instance.status = validated_data.get('status', instance.status)
-        instance.priority = validated_data.get('priority', instance.priority)
-        instance.term = validated_data.get('term', instance.term)
-        instance.responsible_for_test = validated_data.get('responsible_for_test', instance.responsible_for_test)
-        instance.save()
-
-        # Создаем сообщение, если задача была обновлена
-        Message.objects.create(
-            title=f"Задача обновлена: '{instance.title}'",
-            text=f"'{instance.title}' - Ваша задача была обновлена.",
-            owner=instance.executor,
-            project=instance.project,
-            task=instance
-        )
+        # Пишем только изменённые поля; запрос без изменений не трогает ни строку, ни сообщения
+        changes = get_changed_fields(instance, validated_data)
+        if not changes:
+            return instance
+        for name in changes:
+            setattr(instance, name, validated_data[name])
+        instance.save(update_fields=[*changes, 'update'])
+
+        # Создаем сообщение со списком изменённых полей; частые правки одной задачи
+        # склеиваются в одно сообщение (main.notifications.UpdateCoalescer)
+        coalescer.task_updated(instance, changes)
 
         return instance
 
-class CommentSerializer(serializers.ModelSerializer):
+
+class TaskBulkItemSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
+    """Проверка одного элемента пачки: project/executor берутся из заранее загруженных объектов."""
+    serializer_related_field = PreloadedPrimaryKeyRelatedField
+
+    class Meta:
+        model = Task
+        exclude = ('change_xid', )
+
+class CommentSerializer(SparseFieldsetSerializerMixin, ExpandableSerializerMixin, serializers.ModelSerializer):
     """Какой-то сериализатор для модели комментов"""
+    expandable_fields = {'task': TaskSerializer}
+
     class Meta:
         model = Comment
-        fields = '__all__'
+        exclude = ('change_xid', )
 
     def create(self, validated_data):
         comment = Comment.objects.create(**validated_data)
+        # Задача уже загружена при проверке поля task: исполнитель и проект берутся по id,
+        # без отдельных запросов за ними
+        task = comment.task
         Message.objects.create(
             title=f"К вашей задаче оставили комментарий.'",
             text=f"К вашей задаче оставили комментарий.",
-            owner=comment.task.executor,
-            project=comment.task.project,
-            task=comment.task
+            owner_id=task.executor_id,
+            project_id=task.project_id,
+            task=task
         )
         return comment
@@ -0,0 +1,80 @@
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+
+from task.response_cache import bump
+from .counters import apply_delta, load_task_state, state_delta, task_state
+from .models import Comment, Membership, Project, Task
+
+
+# Счётчики доски (ProjectCounter) обновляются по разнице между состоянием
+# задачи при загрузке и после сохранения, без пересчёта всей таблицы.
+
+@receiver(post_init, sender=Task)
+def remember_task_state(sender, instance, **kwargs):
+    instance._counter_state = task_state(instance) if instance.pk else None
+
+
+@receiver(pre_save, sender=Task)
+def ensure_task_state(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding or instance._counter_state is not None:
+        return
+    instance._counter_state = load_task_state(instance.pk)
+
+
+@receiver(post_save, sender=Task)
+def update_task_counters(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    after = task_state(instance) or load_task_state(instance.pk)
+    before = None if created else instance._counter_state
+    apply_delta(state_delta(before, after))
+    # Задача могла переехать в другой проект: сбрасываем кэш обоих
+    bump('tasks', *{f'project:{state[0]}' for state in (before, after) if state})
+    instance._counter_state = after
+
+
+@receiver(post_delete, sender=Task)
+def release_task_counters(sender, instance, origin=None, **kwargs):
+    bump('tasks', f'project:{instance.project_id}')
+    if isinstance(origin, Project):
+        # Каскадное удаление проекта: его счётчики удаляются вместе с ним
+        return
+    apply_delta(state_delta(instance._counter_state or task_state(instance), None))
+
+
+# Версии кэша ответов (task/response_cache.py)
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def invalidate_project(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump('projects', f'project:{instance.pk}')
+
+
+@receiver(m2m_changed, sender=Project.project_users.through)
+def invalidate_project_users(sender, instance, action, reverse, pk_set=None, **kwargs):
+    if not action.startswith('post_'):
+        return
+    project_ids = (pk_set or ()) if reverse else (instance.pk, )
+    bump('projects', *(f'project:{pk}' for pk in project_ids))
+
+
+@receiver(post_save, sender=Membership)
+@receiver(post_delete, sender=Membership)
+def invalidate_membership(sender, instance, raw=False, **kwargs):
+    # Membership.objects.create/delete и админка не шлют m2m_changed; Project.update сдвигает триггер (0008)
+    if not raw:
+        bump('projects', f'project:{instance.project_id}')
+
+
+@receiver(post_save, sender=Comment)
+def invalidate_comment(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump(f'project:{instance.task.project_id}')
+
+
+@receiver(post_delete, sender=Comment)
+def invalidate_deleted_comment(sender, instance, origin=None, **kwargs):
+    # При каскадном удалении задачи/проекта версию уже повысил их собственный сигнал
+    if origin is instance:
+        bump(f'project:{instance.task.project_id}')
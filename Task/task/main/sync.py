@@ -0,0 +1,117 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from rest_framework import serializers
+
+from .models import Comment, Project, Task, Tombstone
+from .serializers import CommentSerializer, ProjectSerializer, TaskSerializer
+
+# Дельта-синхронизация (/api/v1/sync/). Каждая строка Project/Task/Comment
+# хранит номер транзакции последнего изменения (change_xid), удаления
+# записываются в Tombstone; и то и другое делают триггеры БД (миграция 0006).
+#
+# Курсор — это xmin снимка PostgreSQL на момент ответа: все транзакции с
+# номером меньше xmin уже завершены и видны, поэтому следующий запрос берёт
+# строки с change_xid >= xmin и не теряет изменений, закоммиченных позже
+# транзакций с большим номером. По времени (update) так нельзя: транзакция,
+# начатая раньше, может закоммититься после ответа с более поздней меткой.
+# Строки транзакций, шедших во время ответа, могут прийти повторно — клиент
+# применяет их как upsert.
+
+DEFAULTS = {
+    'TOMBSTONE_DAYS': 30,
+    'MAX_CHANGES': 5000,
+}
+
+SYNCED = (
+    ('projects', Project, ProjectSerializer, 'id'),
+    ('tasks', Task, TaskSerializer, 'project_id'),
+    ('comments', Comment, CommentSerializer, 'task__project_id'),
+)
+
+
+def get_sync_options():
+    return {**DEFAULTS, **getattr(settings, 'SYNC', {})}
+
+
+def current_xmin():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint')
+        return cursor.fetchone()[0]
+
+
+def make_cursor(xmin, now):
+    return f'{xmin}-{int(now.timestamp())}'
+
+
+def parse_cursor(value):
+    """Курсор '<xmin>-<unix time>' -> (xmin, время выдачи)."""
+    xmin, _, issued = value.partition('-')
+    return int(xmin), datetime.fromtimestamp(int(issued), tz=dt_timezone.utc)
+
+
+class SyncQuerySerializer(serializers.Serializer):
+    since = serializers.CharField(required=False)
+    project = serializers.IntegerField(required=False)
+
+    def validate_since(self, value):
+        try:
+            return parse_cursor(value)
+        except (ValueError, OverflowError, OSError):
+            raise serializers.ValidationError('Некорректный курсор.')
+
+
+def get_changes(since=None, project_id=None, now=None):
+    """
+    Изменения после курсора since ((xmin, время) из parse_cursor) или полный
+    снимок, если since не передан. reset=True означает, что дельту отдать
+    нельзя (курсор старше срока хранения надгробий или изменений больше
+    MAX_CHANGES) и клиент должен заново загрузить снимок без since.
+    """
+    options = get_sync_options()
+    now = now or timezone.now()
+    # xmin берётся до чтения строк: всё, что завершилось раньше, эти запросы увидят
+    result = {'cursor': make_cursor(current_xmin(), now), 'reset': False}
+
+    if since is not None:
+        since_xmin, issued = since
+        if issued < now - timedelta(days=options['TOMBSTONE_DAYS']):
+            result['reset'] = True
+            return result
+
+    limit = None if since is None else options['MAX_CHANGES']
+    total = 0
+    for name, model, serializer_class, project_field in SYNCED:
+        queryset = model.objects.order_by('id')
+        if name == 'projects':
+            queryset = queryset.prefetch_related('project_users')
+        if since is not None:
+            queryset = queryset.filter(change_xid__gte=since_xmin)
+        if project_id is not None:
+            queryset = queryset.filter(**{project_field: project_id})
+        rows = list(queryset[:limit + 1 - total] if limit is not None else queryset)
+        total += len(rows)
+        if limit is not None and total > limit:
+            return {'cursor': result['cursor'], 'reset': True}
+        result[name] = serializer_class(rows, many=True).data
+
+    deleted = {name: [] for name, *_ in SYNCED}
+    if since is not None:
+        tombstones = Tombstone.objects.filter(change_xid__gte=since_xmin)
+        if project_id is not None:
+            tombstones = tombstones.filter(project_id=project_id)
+        for model, object_id in tombstones.order_by('id').values_list('model', 'object_id')[:limit + 1 - total]:
+            deleted[model].append(object_id)
+            total += 1
+        if total > limit:
+            return {'cursor': result['cursor'], 'reset': True}
+    result['deleted'] = deleted
+    return result
+
+
+def purge_tombstones(now=None):
+    """Удаляет надгробия старше TOMBSTONE_DAYS; клиенты с более старым курсором получают reset."""
+    cutoff = (now or timezone.now()) - timedelta(days=get_sync_options()['TOMBSTONE_DAYS'])
+    return Tombstone.objects.filter(deleted__lt=cutoff).delete()[0]
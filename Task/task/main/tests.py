@@ -1,8 +1,29 @@
+from datetime import date, timedelta
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import DateTimeField, ExpressionWrapper, F
+from django.db.models.functions import Now
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
-from rest_framework.test import APITestCase
-from .models import Project, Task, Comment
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase, APITransactionTestCase
+from task.pagination import KeysetPagination
+from task.response_cache import get_stats, reset_stats
+from task.throttling import TokenBucketThrottle
+from task.testing import QueryPlanMixin
+from .models import Membership, Project, Task, Comment
+from .notifications import UpdateCoalescer, coalescer
+from .sync import make_cursor, purge_tombstones
 from users.models import User
+from user_messages.models import Message
 
 class ProjectViewTests(APITestCase):
     def setUp(self):
@@ -335,4 +356,1261 @@ class CommentViewTests(APITestCase):
         response = self.client.get(url, {'ordering': 'update'})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data[0]['name'], 'Comment 1')
-        self.assertEqual(response.data[1]['name'], 'Comment 2')
\ No newline at end of file
+        self.assertEqual(response.data[1]['name'], 'Comment 2')
+
+class KeysetPaginationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.client.force_authenticate(user=self.user)
+
+        self.projects = [
+            Project.objects.create(title=f'Project {i}', description='Description')
+            for i in range(7)
+        ]
+
+    def collect(self, params):
+        url = reverse('project-list')
+        ids = []
+        pages = 0
+        while url:
+            response = self.client.get(url, params) if pages == 0 else self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data['results']), params['page_size'])
+            ids += [item['id'] for item in response.data['results']]
+            url = response.data['next']
+            pages += 1
+        return ids, pages
+
+    def test_pagination_is_opt_in(self):
+        """
+        Без ?page_size= и ?cursor= список отдаётся целиком.
+        """
+        response = self.client.get(reverse('project-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 7)
+
+    def test_walk_all_pages(self):
+        """
+        Обход всех страниц по курсору возвращает каждую запись ровно один раз.
+        """
+        ids, pages = self.collect({'page_size': 3})
+        self.assertEqual(ids, [project.id for project in self.projects])
+        self.assertEqual(pages, 3)
+
+    def test_walk_with_descending_ordering(self):
+        """
+        Курсор учитывает параметр ordering и направление сортировки.
+        """
+        ids, _ = self.collect({'page_size': 2, 'ordering': '-created'})
+        self.assertEqual(ids, [project.id for project in reversed(self.projects)])
+
+    def test_ties_are_broken_by_id(self):
+        """
+        Записи с одинаковым значением поля сортировки не теряются и не дублируются.
+        """
+        ids, _ = self.collect({'page_size': 2, 'ordering': 'status'})
+        self.assertEqual(ids, [project.id for project in self.projects])
+
+    def test_invalid_cursor(self):
+        """
+        Некорректный курсор возвращает 404.
+        """
+        response = self.client.get(reverse('project-list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_walk_past_null_ordering_values(self):
+        """
+        Сортировка по полю с NULL (Message.read_at): курсор проходит через строки
+        с NULL в обе стороны без потерь, повторов и ошибок.
+        """
+        now = timezone.now()
+        read_at = [None, now, None, now - timedelta(days=1), now, None, now + timedelta(days=1)]
+        messages = [
+            Message.objects.create(title=f'Message {i}', text='Text', owner=self.user, project=self.projects[0],
+                                   read_at=value)
+            for i, value in enumerate(read_at)
+        ]
+        read = sorted((message for message in messages if message.read_at), key=lambda m: (m.read_at, m.id))
+        unread = [message for message in messages if message.read_at is None]
+        factory = APIRequestFactory()
+
+        def walk(ordering):
+            ids, cursor = [], None
+            while True:
+                params = {'page_size': 2, **({'cursor': cursor} if cursor else {})}
+                paginator = KeysetPagination()
+                page = paginator.paginate_queryset(Message.objects.order_by(ordering), Request(factory.get('/', params)))
+                ids += [message.id for message in page]
+                cursor = paginator.next_cursor
+                if cursor is None:
+                    return ids
+
+        self.assertEqual(walk('read_at'), [message.id for message in read + unread])
+        self.assertEqual(walk('-read_at'), [message.id for message in reversed(read + unread)])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'EXPLAIN-тесты рассчитаны на PostgreSQL')
+class QueryPlanTests(QueryPlanMixin, APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.client.force_authenticate(user=self.user)
+
+        projects = Project.objects.bulk_create(
+            Project(title=f'Project {i}', description='Description') for i in range(50)
+        )
+        # Разносим даты создания, чтобы фильтр по диапазону был селективным
+        Project.objects.update(created=ExpressionWrapper(
+            Now() - F('id') * timedelta(hours=1), output_field=DateTimeField()
+        ))
+        statuses = [choice for choice, _ in Task.Status.choices]
+        Task.objects.bulk_create(
+            Task(
+                title=f'Task {i}',
+                description='Description',
+                project=projects[i % len(projects)],
+                executor=self.user,
+                status=statuses[i % len(statuses)],
+                term=date(2024, 1, 1) + timedelta(days=i % 365),
+                responsible_for_test='Tester',
+            )
+            for i in range(2000)
+        )
+        tasks = list(Task.objects.filter(project=projects[0]))
+        Comment.objects.bulk_create(
+            Comment(name=f'Comment {i}', body='Body', task=tasks[i % len(tasks)])
+            for i in range(1000)
+        )
+        self.analyze('main_project', 'main_task', 'main_comment')
+        self.project = projects[0]
+        self.task = tasks[0]
+
+    def test_project_list_uses_created_index(self):
+        """
+        Фильтр проектов по диапазону created использует индекс.
+        """
+        now = timezone.now()
+        self.assertUsesIndex('main_project', reverse('project-list'), {
+            'created_from': (now - timedelta(hours=5)).isoformat(),
+            'created_to': now.isoformat(),
+        }, index='project_created_idx')
+
+    def test_project_list_uses_update_index(self):
+        """
+        Фильтр проектов по диапазону update использует индекс.
+        """
+        now = timezone.now()
+        self.assertUsesIndex('main_project', reverse('project-list'), {
+            'updated_from': (now - timedelta(hours=5)).isoformat(),
+        }, index='project_update_idx')
+
+    def test_task_list_uses_project_index(self):
+        """
+        Список задач проекта читается по составному индексу.
+        """
+        self.assertUsesIndex('main_task', reverse('task-list', args=[self.project.id]))
+
+    def test_task_page_uses_project_index(self):
+        """
+        Страница задач (keyset-пагинация) тоже читается по индексу проекта.
+        """
+        self.assertUsesIndex('main_task', reverse('task-list', args=[self.project.id]), {
+            'page_size': 20,
+        })
+
+    def test_comment_list_uses_task_index(self):
+        """
+        Список комментариев задачи читается по (task, create).
+        """
+        self.assertUsesIndex(
+            'main_comment', reverse('comment-list-by-task', args=[self.task.id]),
+            index='comment_task_create_idx',
+        )
+
+    def test_open_tasks_by_term_use_partial_index(self):
+        """
+        Незакрытые задачи проекта по сроку используют частичный индекс.
+        """
+        queryset = Task.objects.filter(project=self.project, term__lt=date(2024, 6, 1)).exclude(status=Task.Status.DONE)
+        plan = self.explain_queryset(queryset)
+        self.assertIn('task_project_open_term_idx', plan)
+
+
+class IndexedOrderingTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.client.force_authenticate(user=self.user)
+
+        self.project = Project.objects.create(title='B project', description='Description')
+        self.other = Project.objects.create(title='A project', description='Description')
+        self.tasks = [
+            Task.objects.create(
+                title=f'Task {i}',
+                description='Description',
+                project=self.project,
+                executor=self.user,
+                term='2023-12-31',
+                responsible_for_test='Tester'
+            )
+            for i in range(3)
+        ]
+
+    def test_unknown_ordering_is_rejected(self):
+        """
+        Сортировка по полю вне белого списка отклоняется.
+        """
+        for ordering in ('description', 'project_users__username'):
+            response = self.client.get(reverse('project-list'), {'ordering': ordering})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_unindexed_ordering_is_downgraded(self):
+        """
+        Сортировка по полю без индекса заменяется сортировкой по умолчанию.
+        """
+        response = self.client.get(reverse('project-list'), {'ordering': 'title'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in response.data], [self.project.id, self.other.id])
+
+    def test_indexed_ordering_adds_id_tiebreaker(self):
+        """
+        К сортировке добавляется id в том же направлении.
+        """
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('project-list'), {'ordering': '-created'})
+        self.assertEqual([item['id'] for item in response.data], [self.other.id, self.project.id])
+        sql = next(q['sql'] for q in captured.captured_queries
+                   if 'FROM "main_project"' in q['sql'] and 'ORDER BY' in q['sql'])
+        self.assertIn('ORDER BY "main_project"."created" DESC, "main_project"."id" DESC', sql)
+
+    def test_task_ordering_requires_project_scope(self):
+        """
+        Сортировка задач по created действует только внутри проекта.
+        """
+        expected = [task.id for task in reversed(self.tasks)]
+        response = self.client.get(reverse('task-list', args=[self.project.id]), {'ordering': '-created'})
+        self.assertEqual([item['id'] for item in response.data], expected)
+
+        response = self.client.get('/api/v1/tasks/', {'ordering': '-created'})
+        self.assertEqual([item['id'] for item in response.data], list(reversed(expected)))
+
+    def test_filter_tasks_by_status(self):
+        """
+        Фильтрация задач по статусу.
+        """
+        Task.objects.filter(id=self.tasks[0].id).update(status=Task.Status.DONE)
+        response = self.client.get(reverse('task-list', args=[self.project.id]), {'status': 'DN'})
+        self.assertEqual([item['id'] for item in response.data], [self.tasks[0].id])
+
+
+class ProjectFanOutTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.client.force_authenticate(user=self.user)
+
+    def create_project(self, members):
+        users = User.objects.bulk_create(
+            User(username=f'member{members}_{i}', email=f'member{members}_{i}@example.com')
+            for i in range(members)
+        )
+        data = {'title': f'Project {members}', 'description': 'Description', 'project_users': [u.id for u in users]}
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.post(reverse('project-list'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response, users, len(captured)
+
+    def test_query_count_does_not_depend_on_members(self):
+        """
+        Число запросов при создании проекта не растёт с числом участников.
+        """
+        _, _, small = self.create_project(2)
+        _, _, large = self.create_project(50)
+        self.assertEqual(small, large)
+        self.assertLessEqual(large, 12)
+
+    def test_members_and_messages_are_created(self):
+        """
+        Участники записываются в Membership и видны с обеих сторон, каждому создаётся сообщение.
+        """
+        response, users, _ = self.create_project(5)
+        project = Project.objects.get(id=response.data['id'])
+        ids = {user.id for user in users}
+        self.assertEqual(set(project.project_users.values_list('id', flat=True)), ids)
+        self.assertEqual({user.id for user in User.objects.filter(user_projects=project)}, ids)
+        self.assertEqual(set(Membership.objects.filter(project=project).values_list('role', flat=True)),
+                         {Membership.Role.MEMBER})
+        self.assertEqual(set(Message.objects.filter(project=project).values_list('owner_id', flat=True)), ids)
+
+    def test_unknown_member_is_rejected(self):
+        """
+        Несуществующий участник — ошибка валидации.
+        """
+        data = {'title': 'Project', 'description': 'Description', 'project_users': [self.user.id, 999999]}
+        response = self.client.post(reverse('project-list'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('project_users', response.data)
+
+
+class ProjectSummaryTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.other = User.objects.create_user(username='other', password='testpass')
+        self.client.force_authenticate(user=self.user)
+        self.project = Project.objects.create(title='Test Project', description='Test Description')
+        self.today = timezone.localdate()
+
+    def create_task(self, **kwargs):
+        data = {
+            'title': 'Task',
+            'description': 'Description',
+            'project': self.project,
+            'executor': self.user,
+            'term': self.today + timedelta(days=7),
+            'responsible_for_test': 'Tester',
+        }
+        data.update(kwargs)
+        return Task.objects.create(**data)
+
+    def get_summary(self):
+        response = self.client.get(reverse('project-summary', args=[self.project.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_summary_counts(self):
+        """
+        Сводка считает задачи по статусу и приоритету, просрочку и нагрузку исполнителей.
+        """
+        self.create_task(priority=Task.Priority.HIGH)
+        self.create_task(term=self.today - timedelta(days=1))
+        self.create_task(term=self.today - timedelta(days=1), executor=self.other)
+        self.create_task(status=Task.Status.DONE, term=self.today - timedelta(days=3))
+
+        summary = self.get_summary()
+        self.assertEqual(summary['total'], 4)
+        self.assertEqual(summary['by_status']['GR']['HG'], 1)
+        self.assertEqual(summary['by_status']['GR']['LW'], 2)
+        self.assertEqual(summary['by_status']['DN']['LW'], 1)
+        self.assertEqual(summary['overdue'], 2)
+        self.assertEqual(summary['overdue_by_term'], {(self.today - timedelta(days=1)).isoformat(): 2})
+        self.assertEqual(summary['executors'], [
+            {'executor': self.user.id, 'open': 2},
+            {'executor': self.other.id, 'open': 1},
+        ])
+
+    def test_counters_follow_update_and_delete(self):
+        """
+        Счётчики меняются при обновлении и удалении задачи через API.
+        """
+        task = self.create_task(term=self.today - timedelta(days=1))
+        response = self.client.patch(reverse('task-detail', args=[task.id]), {'status': 'DN'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        summary = self.get_summary()
+        self.assertEqual(summary['by_status']['DN']['LW'], 1)
+        self.assertEqual(summary['by_status']['GR']['LW'], 0)
+        self.assertEqual((summary['overdue'], summary['executors']), (0, []))
+
+        self.client.delete(reverse('task-detail', args=[task.id]))
+        self.assertEqual(self.get_summary()['total'], 0)
+
+    def test_summary_is_a_single_query(self):
+        """
+        Сводка читается одним запросом к таблице счётчиков.
+        """
+        for _ in range(5):
+            self.create_task()
+        with self.assertNumQueries(1):
+            summary = self.client.get(reverse('project-summary', args=[self.project.id])).data
+        self.assertEqual(summary['total'], 5)
+
+    def test_unknown_project(self):
+        """
+        Сводка несуществующего проекта — 404.
+        """
+        response = self.client.get(reverse('project-summary', args=[999999]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_rebuild_fixes_drift(self):
+        """
+        Команда rebuild_task_counters исправляет расхождения после массовых update().
+        """
+        self.create_task()
+        self.create_task()
+        Task.objects.update(status=Task.Status.DEV)
+        self.assertEqual(self.get_summary()['by_status']['DV']['LW'], 0)
+
+        out = StringIO()
+        call_command('rebuild_task_counters', stdout=out)
+        self.assertIn('Исправлено счётчиков: 2', out.getvalue())
+        summary = self.get_summary()
+        self.assertEqual((summary['by_status']['DV']['LW'], summary['by_status']['GR']['LW']), (2, 0))
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.client.force_authenticate(user=self.user)
+        self.project = Project.objects.create(title='Test Project', description='Test Description')
+        self.task = Task.objects.create(
+            title='Test Task',
+            description='Test Description',
+            project=self.project,
+            executor=self.user,
+            term='2024-12-31',
+            responsible_for_test='Tester'
+        )
+        self.comment = Comment.objects.create(name='Comment', body='Body', task=self.task)
+
+    def test_detail_not_modified(self):
+        """
+        Совпадающий If-None-Match на детальном view — 304 одним запросом.
+        """
+        for url in (reverse('project-detail', args=[self.project.id]),
+                    reverse('task-detail', args=[self.task.id]),
+                    reverse('comment-detail', args=[self.comment.id])):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertIn('Last-Modified', response)
+            with self.assertNumQueries(1):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(response.content, b'')
+
+    def test_detail_etag_changes_on_update(self):
+        """
+        После изменения комментария ETag меняется, даже в тот же день.
+        """
+        url = reverse('comment-detail', args=[self.comment.id])
+        etag = self.client.get(url)['ETag']
+        self.client.patch(url, {'body': 'New body'}, format='json')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_list_not_modified(self):
+        """
+        Список отвечает 304, пока не изменились max(update) и количество строк.
+        """
+        url = reverse('task-list', args=[self.project.id])
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        Task.objects.create(
+            title='Another Task',
+            description='Description',
+            project=self.project,
+            executor=self.user,
+            term='2024-12-31',
+            responsible_for_test='Tester'
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 2)
+
+    def test_list_etag_depends_on_query(self):
+        """
+        Разные параметры запроса дают разные ETag.
+        """
+        url = reverse('project-list')
+        self.assertNotEqual(self.client.get(url)['ETag'], self.client.get(url, {'ordering': '-created'})['ETag'])
+
+    def test_if_modified_since(self):
+        """
+        If-Modified-Since с датой последнего изменения — 304.
+        """
+        url = reverse('project-detail', args=[self.project.id])
+        last_modified = self.client.get(url)['Last-Modified']
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_membership_change_updates_project_validators(self):
+        """
+        Участник, добавленный или удалённый мимо сериализатора проекта, меняет ETag
+        проекта и списка — и с кэшем ответов, и без него.
+        """
+        detail = reverse('project-detail', args=[self.project.id])
+        for enabled in (False, True):
+            cache.clear()
+            with self.settings(RESPONSE_CACHE={'ENABLED': enabled, 'ALIAS': 'default', 'TIMEOUT': 300}):
+                changes = (
+                    (lambda: Membership.objects.create(project=self.project, user=self.user), [self.user.id]),
+                    (lambda: Membership.objects.filter(project=self.project).delete(), []),
+                )
+                for change, users in changes:
+                    etags = {url: self.client.get(url)['ETag'] for url in (detail, reverse('project-list'))}
+                    change()
+                    for url, etag in etags.items():
+                        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                        self.assertEqual(response.status_code, status.HTTP_200_OK)
+                        self.assertNotEqual(response['ETag'], etag)
+                    self.assertEqual(self.client.get(detail).data['project_users'], users)
+
+
+@override_settings(RESPONSE_CACHE={'ENABLED': True, 'ALIAS': 'default', 'TIMEOUT': 300})
+class ResponseCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        reset_stats()
+        self.user = User.objects.create_user(username='testuser', password='testpass', email='testuser@example.com')
+        self.client.force_authenticate(user=self.user)
+        self.project = Project.objects.create(title='Test Project', description='Test Description')
+
+    def create_task(self):
+        data = {
+            'title': 'New Task',
+            'description': 'New Description',
+            'project': self.project.id,
+            'executor': self.user.id,
+            'term': '2023-12-31',
+            'responsible_for_test': 'Tester'
+        }
+        response = self.client.post(reverse('task-list', args=[self.project.id]), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_hit_skips_database(self):
+        """
+        Повторный запрос отдаётся из кэша без обращений к БД.
+        """
+        url = reverse('task-list', args=[self.project.id])
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(get_stats(), {'hits': 1, 'misses': 1})
+
+    def test_task_write_invalidates_project_list(self):
+        """
+        Создание задачи сбрасывает кэш списка задач её проекта.
+        """
+        url = reverse('task-list', args=[self.project.id])
+        self.assertEqual(len(self.client.get(url).data), 0)
+        self.create_task()
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(len(response.data), 1)
+
+    def test_other_project_stays_cached(self):
+        """
+        Изменения в одном проекте не сбрасывают кэш другого.
+        """
+        other = Project.objects.create(title='Other', description='Other')
+        url = reverse('task-list', args=[other.id])
+        self.client.get(url)
+        self.create_task()
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+    def test_bulk_created_messages_invalidate_inbox(self):
+        """
+        Сообщения, созданные через bulk_create, тоже сбрасывают кэш.
+        """
+        url = reverse('message-list')
+        params = {'owner': self.user.id}
+        self.assertEqual(len(self.client.get(url, params).data), 0)
+        data = {'title': 'New Project', 'description': 'Description', 'project_users': [self.user.id]}
+        self.client.post(reverse('project-list'), data, format='json')
+        response = self.client.get(url, params)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(len(response.data), 1)
+
+    def test_cache_is_per_user(self):
+        """
+        Ответы разных пользователей кэшируются отдельно.
+        """
+        url = reverse('project-list')
+        self.client.get(url)
+        self.client.force_authenticate(user=User.objects.create_user(username='other', password='testpass'))
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+
+    def test_conditional_get_from_cache(self):
+        """
+        Совпадающий If-None-Match на закэшированном ответе — 304 без БД.
+        """
+        url = reverse('project-list')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+class TaskBulkTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.other = User.objects.create_user(username='other', password='testpass')
+        self.client.force_authenticate(user=self.user)
+        self.project = Project.objects.create(title='Test Project', description='Test Description')
+        self.url = reverse('task-bulk')
+        self.term = (timezone.localdate() + timedelta(days=7)).isoformat()
+
+    def task_data(self, **kwargs):
+        data = {
+            'title': 'Task',
+            'description': 'Description',
+            'project': self.project.id,
+            'executor': self.user.id,
+            'term': self.term,
+            'responsible_for_test': 'Tester',
+        }
+        data.update(kwargs)
+        return data
+
+    def create_tasks(self, count):
+        return [
+            Task.objects.create(title=f'Task {i}', description='Description', project=self.project,
+                                executor=self.user, term=self.term, responsible_for_test='Tester')
+            for i in range(count)
+        ]
+
+    def operations(self, tasks):
+        operations = [{'op': 'create', 'data': self.task_data(title='New')}]
+        for i, task in enumerate(tasks):
+            if i % 2:
+                operations.append({'op': 'transition', 'id': task.id, 'status': Task.Status.DONE})
+            else:
+                operations.append({'op': 'update', 'id': task.id, 'data': {'executor': self.other.id}})
+        return operations
+
+    def count_queries(self, operations):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.post(self.url, {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return len(captured.captured_queries)
+
+    def test_mixed_operations(self):
+        """
+        Создание, частичное обновление и смена статуса применяются одной пачкой.
+        """
+        first, second, third = self.create_tasks(3)
+        Message.objects.all().delete()
+        operations = [
+            {'op': 'create', 'data': self.task_data(title='New')},
+            {'op': 'update', 'id': first.id, 'data': {'title': 'Renamed', 'executor': self.other.id}},
+            {'op': 'transition', 'id': second.id, 'status': Task.Status.DONE},
+            {'op': 'transition', 'id': third.id, 'status': Task.Status.GROOMING},
+        ]
+        response = self.client.post(self.url, {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['result'] for item in response.data['results']],
+                         ['created', 'updated', 'updated', 'unchanged'])
+
+        created = Task.objects.get(id=response.data['results'][0]['id'])
+        self.assertEqual(created.title, 'New')
+        first.refresh_from_db()
+        self.assertEqual((first.title, first.executor_id), ('Renamed', self.other.id))
+        self.assertEqual(Task.objects.get(id=second.id).status, Task.Status.DONE)
+        # Уведомления только по созданной и изменённым задачам
+        self.assertEqual(Message.objects.count(), 3)
+        self.assertEqual(Message.objects.filter(owner=self.other).count(), 1)
+        self.assertEqual(Message.objects.get(task=first).changes, ['title', 'executor'])
+
+    def test_updates_counters(self):
+        """
+        Сводка доски учитывает изменения пачки, как при обычном сохранении.
+        """
+        first, second = self.create_tasks(2)
+        operations = [
+            {'op': 'create', 'data': self.task_data(priority=Task.Priority.HIGH)},
+            {'op': 'update', 'id': first.id, 'data': {'executor': self.other.id}},
+            {'op': 'transition', 'id': second.id, 'status': Task.Status.DONE},
+        ]
+        response = self.client.post(self.url, {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        summary = self.client.get(reverse('project-summary', args=[self.project.id])).data
+        self.assertEqual(summary['total'], 3)
+        self.assertEqual(summary['by_status']['GR'], {'LW': 1, 'AR': 0, 'HG': 1})
+        self.assertEqual(summary['by_status']['DN']['LW'], 1)
+        self.assertEqual(summary['executors'], [{'executor': self.user.id, 'open': 1},
+                                                {'executor': self.other.id, 'open': 1}])
+        out = StringIO()
+        call_command('rebuild_task_counters', stdout=out)
+        self.assertIn('Исправлено счётчиков: 0', out.getvalue())
+
+    def test_invalid_item_rejects_batch(self):
+        """
+        Ошибка в любом элементе отклоняет всю пачку, ошибки возвращаются по индексам.
+        """
+        task, = self.create_tasks(1)
+        operations = [
+            {'op': 'create', 'data': self.task_data(title='New')},
+            {'op': 'update', 'id': task.id, 'data': {'title': 'Renamed'}},
+            {'op': 'create', 'data': self.task_data(project=999999)},
+            {'op': 'transition', 'id': 999999, 'status': Task.Status.DONE},
+        ]
+        response = self.client.post(self.url, {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        results = response.data['results']
+        self.assertNotIn('errors', results[0])
+        self.assertIn('project', results[2]['errors'])
+        self.assertIn('id', results[3]['errors'])
+        self.assertEqual(Task.objects.count(), 1)
+        task.refresh_from_db()
+        self.assertEqual(task.title, 'Task 0')
+
+    def test_batch_limits(self):
+        """
+        Пустая пачка, пачка больше лимита и операция без обязательных полей отклоняются.
+        """
+        for operations in ([], [{'op': 'create', 'data': self.task_data()}] * 501, [{'op': 'update', 'data': {}}]):
+            response = self.client.post(self.url, {'operations': operations}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Task.objects.count(), 0)
+
+    def test_query_count_does_not_grow(self):
+        """
+        Число запросов не зависит от размера пачки.
+        """
+        small = self.count_queries(self.operations(self.create_tasks(2)))
+        large = self.count_queries(self.operations(self.create_tasks(40)))
+        self.assertEqual(small, large)
+
+    def test_requires_authentication(self):
+        """
+        Анонимный пользователь не может отправить пачку.
+        """
+        self.client.force_authenticate(user=None)
+        response = self.client.post(self.url, {'operations': [{'op': 'create', 'data': self.task_data()}]},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class TaskPartialSaveTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.other = User.objects.create_user(username='other', password='testpass')
+        self.client.force_authenticate(user=self.user)
+        self.project = Project.objects.create(title='Test Project', description='Test Description')
+        self.task = Task.objects.create(
+            title='Task 1',
+            description='Description 1',
+            project=self.project,
+            executor=self.user,
+            term='2023-12-31',
+            responsible_for_test='Tester 1'
+        )
+        self.url = reverse('task-detail', args=[self.task.id])
+        Message.objects.all().delete()
+
+    def patch(self, data):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.patch(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [query['sql'] for query in captured.captured_queries]
+
+    def test_noop_patch_skips_write(self):
+        """
+        PATCH без изменений не пишет задачу и не создаёт уведомление.
+        """
+        update = self.task.update
+        queries = self.patch({'title': 'Task 1', 'executor': self.user.id, 'term': '2023-12-31'})
+        self.assertFalse([sql for sql in queries if sql.startswith(('UPDATE', 'INSERT'))])
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.update, update)
+        self.assertEqual(Message.objects.count(), 0)
+
+    def test_patch_saves_changed_fields(self):
+        """
+        Сохраняются только изменённые поля, их список попадает в уведомление.
+        """
+        queries = self.patch({'title': 'Renamed', 'status': Task.Status.DEV, 'description': 'Description 1'})
+        updates = [sql for sql in queries if sql.startswith('UPDATE "main_task"')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"title"', updates[0])
+        self.assertIn('"status"', updates[0])
+        self.assertNotIn('"description"', updates[0])
+        self.assertNotIn('"executor_id"', updates[0])
+
+        self.task.refresh_from_db()
+        self.assertEqual((self.task.title, self.task.status), ('Renamed', Task.Status.DEV))
+        message = Message.objects.get()
+        self.assertEqual(message.changes, ['title', 'status'])
+        self.assertIn('title, status', message.text)
+
+    def test_patch_executor_updates_counters(self):
+        """
+        Частичное сохранение по-прежнему обновляет счётчики доски.
+        """
+        self.patch({'executor': self.other.id})
+        summary = self.client.get(reverse('project-summary', args=[self.project.id])).data
+        self.assertEqual(summary['executors'], [{'executor': self.other.id, 'open': 1}])
+        self.assertEqual(Message.objects.get().owner, self.other)
+
+
+class FakeClock:
+    """Управляемые часы для UpdateCoalescer."""
+    def __init__(self):
+        self.now = timezone.now()
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += timedelta(seconds=seconds)
+
+
+class TaskUpdateCoalescingTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.other = User.objects.create_user(username='other', password='testpass')
+        self.client.force_authenticate(user=self.user)
+        self.project = Project.objects.create(title='Test Project', description='Test Description')
+        self.task = Task.objects.create(
+            title='Task 1',
+            description='Description 1',
+            project=self.project,
+            executor=self.user,
+            term='2023-12-31',
+            responsible_for_test='Tester 1'
+        )
+        self.url = reverse('task-detail', args=[self.task.id])
+        Message.objects.all().delete()
+        self.clock = FakeClock()
+        patcher = mock.patch.object(coalescer, 'clock', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def patch(self, data):
+        response = self.client.patch(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(NOTIFICATIONS_COALESCE_WINDOW=30)
+    def test_updates_within_window_are_merged(self):
+        """
+        Обновления задачи в пределах окна дают одно сообщение со счётчиком и всеми изменёнными полями.
+        """
+        self.patch({'title': 'Renamed'})
+        self.clock.advance(10)
+        self.patch({'status': Task.Status.DEV})
+        self.clock.advance(10)
+        with CaptureQueriesContext(connection) as captured:
+            self.patch({'title': 'Renamed again', 'description': 'Changed'})
+        inserts = [q['sql'] for q in captured.captured_queries if q['sql'].startswith('INSERT INTO "user_messages_message"')]
+        self.assertEqual(inserts, [])
+
+        message = Message.objects.get()
+        self.assertEqual(message.updates, 3)
+        self.assertEqual(message.changes, ['title', 'status', 'description'])
+        self.assertEqual(message.title, "Задача обновлена: 'Renamed again'")
+        self.assertIn('3 раз', message.text)
+        self.assertIn('title, status, description', message.text)
+
+    @override_settings(NOTIFICATIONS_COALESCE_WINDOW=30)
+    def test_window_is_counted_from_first_update(self):
+        """
+        Окно не продлевается новыми правками: после него создаётся новое сообщение.
+        """
+        self.patch({'title': 'Renamed'})
+        self.clock.advance(20)
+        self.patch({'status': Task.Status.DEV})
+        self.clock.advance(10)
+        self.patch({'description': 'Changed'})
+
+        messages = list(Message.objects.order_by('id').values_list('updates', 'changes'))
+        self.assertEqual(messages, [(2, ['title', 'status']), (1, ['description'])])
+
+    @override_settings(NOTIFICATIONS_COALESCE_WINDOW=30)
+    def test_read_message_is_not_merged(self):
+        """
+        Прочитанное сообщение закрывает окно; следующее обновление создаёт новое и увеличивает непрочитанные.
+        """
+        self.patch({'title': 'Renamed'})
+        message = Message.objects.get()
+        response = self.client.post(reverse('message-read'), {'ids': [message.id]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.patch({'status': Task.Status.DEV})
+
+        self.assertEqual(Message.objects.count(), 2)
+        self.assertEqual(self.client.get(reverse('message-unread')).data['unread'], 1)
+
+    @override_settings(NOTIFICATIONS_COALESCE_WINDOW=30)
+    def test_new_owner_gets_own_message(self):
+        """
+        Сообщения склеиваются только для того же владельца: новый исполнитель получает своё.
+        """
+        self.patch({'title': 'Renamed'})
+        self.patch({'executor': self.other.id})
+        self.patch({'status': Task.Status.DEV})
+
+        self.assertEqual(Message.objects.filter(owner=self.user).count(), 1)
+        message = Message.objects.get(owner=self.other)
+        self.assertEqual((message.updates, message.changes), (2, ['executor', 'status']))
+
+    @override_settings(NOTIFICATIONS_COALESCE_WINDOW=0)
+    def test_zero_window_disables_coalescing(self):
+        """
+        Окно 0 отключает склейку: каждое обновление — отдельное сообщение.
+        """
+        self.patch({'title': 'Renamed'})
+        self.patch({'status': Task.Status.DEV})
+        self.assertEqual(Message.objects.count(), 2)
+        self.assertFalse(Message.objects.filter(coalesce_until__isnull=False).exists())
+
+    def test_explicit_window_and_clock(self):
+        """
+        UpdateCoalescer принимает окно и часы явно, без настроек.
+        """
+        clock = FakeClock()
+        merger = UpdateCoalescer(window=5, clock=clock)
+        first = merger.task_updated(self.task, ['title'])
+        clock.advance(4)
+        self.assertEqual(merger.task_updated(self.task, ['status']).id, first.id)
+        clock.advance(1)
+        self.assertNotEqual(merger.task_updated(self.task, ['status']).id, first.id)
+
+
+class SyncTests(APITransactionTestCase):
+    # Нужны настоящие коммиты: курсор — это xmin снимка, а в TestCase всё идёт одной транзакцией
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.client.force_authenticate(user=self.user)
+        self.project = Project.objects.create(title='Project 1', description='Description')
+        self.other_project = Project.objects.create(title='Project 2', description='Description')
+        self.task = self.create_task(self.project, 'Task 1')
+        self.other_task = self.create_task(self.other_project, 'Task 2')
+        self.comment = Comment.objects.create(name='Comment', body='Body', task=self.task)
+
+    def create_task(self, project, title):
+        return Task.objects.create(title=title, description='Description', project=project, executor=self.user,
+                                   term='2023-12-31', responsible_for_test='Tester')
+
+    def sync(self, **params):
+        response = self.client.get(reverse('sync'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def ids(self, data, name):
+        return sorted(row['id'] for row in data[name])
+
+    def test_snapshot_then_delta(self):
+        """
+        Без since отдаётся полный снимок, с курсором — только строки, изменённые после него.
+        """
+        snapshot = self.sync()
+        self.assertFalse(snapshot['reset'])
+        self.assertEqual(self.ids(snapshot, 'tasks'), [self.task.id, self.other_task.id])
+        self.assertNotIn('change_xid', snapshot['tasks'][0])
+
+        self.client.patch(reverse('task-detail', args=[self.task.id]), {'title': 'Renamed'}, format='json')
+        new_comment = Comment.objects.create(name='New', body='Body', task=self.other_task)
+        delta = self.sync(since=snapshot['cursor'])
+        self.assertEqual([row['title'] for row in delta['tasks']], ['Renamed'])
+        self.assertEqual(self.ids(delta, 'comments'), [new_comment.id])
+        self.assertEqual(delta['projects'], [])
+
+        self.assertEqual(self.sync(since=delta['cursor'])['tasks'], [])
+
+    def test_cascade_deletes_leave_tombstones(self):
+        """
+        Каскадное удаление задачи оставляет надгробия и для неё, и для её комментариев.
+        """
+        cursor = self.sync()['cursor']
+        response = self.client.delete(reverse('task-detail', args=[self.task.id]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        delta = self.sync(since=cursor)
+        self.assertEqual(delta['deleted'], {'projects': [], 'tasks': [self.task.id], 'comments': [self.comment.id]})
+
+    def test_membership_change_updates_project(self):
+        """
+        Изменение участников проекта попадает в дельту как изменение проекта.
+        """
+        cursor = self.sync()['cursor']
+        self.project.project_users.add(self.user)
+        delta = self.sync(since=cursor)
+        self.assertEqual(self.ids(delta, 'projects'), [self.project.id])
+        self.assertEqual(delta['projects'][0]['project_users'], [self.user.id])
+
+    def test_project_scope(self):
+        """
+        ?project= сужает снимок и дельту до одного проекта.
+        """
+        cursor = self.sync(project=self.project.id)['cursor']
+        self.other_task.delete()
+        Task.objects.filter(id=self.task.id).update(title='Updated in bulk')
+        delta = self.sync(since=cursor, project=self.project.id)
+        self.assertEqual([row['title'] for row in delta['tasks']], ['Updated in bulk'])
+        self.assertEqual(delta['deleted']['tasks'], [])
+
+    @override_settings(SYNC={'MAX_CHANGES': 2})
+    def test_too_many_changes_require_reset(self):
+        """
+        Если изменений больше MAX_CHANGES, клиент получает reset вместо дельты.
+        """
+        cursor = self.sync()['cursor']
+        Task.objects.update(status=Task.Status.DEV)
+        Comment.objects.create(name='New', body='Body', task=self.task)
+        delta = self.sync(since=cursor)
+        self.assertTrue(delta['reset'])
+        self.assertNotIn('tasks', delta)
+
+    def test_stale_and_invalid_cursor(self):
+        """
+        Курсор старше срока хранения надгробий требует reset, некорректный курсор — 400.
+        """
+        stale = make_cursor(0, timezone.now() - timedelta(days=31))
+        self.assertTrue(self.sync(since=stale)['reset'])
+        response = self.client.get(reverse('sync'), {'since': 'garbage'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_purge_tombstones(self):
+        """
+        purge_tombstones удаляет только надгробия старше срока хранения.
+        """
+        self.comment.delete()
+        self.assertEqual(purge_tombstones(), 0)
+        self.assertEqual(purge_tombstones(now=timezone.now() + timedelta(days=31)), 1)
+
+
+class ExpandTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.client.force_authenticate(user=self.user)
+        self.project = Project.objects.create(title='Test Project', description='Test Description')
+        self.project.project_users.add(self.user)
+
+    def add_tasks(self, count):
+        for i in range(count):
+            executor = User.objects.create_user(username=f'executor{Task.objects.count()}', password='testpass')
+            task = Task.objects.create(title=f'Task {i}', description='Description', project=self.project,
+                                       executor=executor, term='2023-12-31', responsible_for_test='Tester')
+            Comment.objects.create(name=f'Comment {i}', body='Body', task=task)
+
+    def count_queries(self, url, params):
+        cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(captured), response.data
+
+    def test_comment_expand_query_count_is_fixed(self):
+        """
+        ?expand=task,task.executor,task.project не добавляет запросов на каждый комментарий.
+        """
+        params = {'expand': 'task.executor,task.project'}
+        self.add_tasks(2)
+        small, _ = self.count_queries(reverse('comment-list'), params)
+        self.add_tasks(8)
+        large, data = self.count_queries(reverse('comment-list'), params)
+        self.assertEqual(small, large)
+        self.assertEqual(len(data), 10)
+        task = data[0]['task']
+        self.assertEqual(task['executor']['username'], 'executor0')
+        self.assertNotIn('password', task['executor'])
+        self.assertEqual(task['project']['project_users'], [self.user.id])
+
+    def test_task_expand_query_count_is_fixed(self):
+        """
+        Развёрнутые project и executor списка задач загружаются фиксированным числом запросов.
+        """
+        url = reverse('task-list', args=[self.project.id])
+        self.add_tasks(2)
+        small, _ = self.count_queries(url, {'expand': 'project,executor'})
+        self.add_tasks(8)
+        large, data = self.count_queries(url, {'expand': 'project,executor'})
+        self.assertEqual(small, large)
+        self.assertEqual({row['project']['id'] for row in data}, {self.project.id})
+
+    def test_without_expand_returns_ids(self):
+        """
+        Без expand связи остаются id, как раньше.
+        """
+        self.add_tasks(1)
+        response = self.client.get(reverse('comment-list'))
+        self.assertEqual(response.data[0]['task'], Task.objects.get().id)
+
+    def test_unknown_expand_is_rejected(self):
+        """
+        Путь, которого нет в expandable_fields, — ошибка 400.
+        """
+        response = self.client.get(reverse('comment-list'), {'expand': 'task.executor.user_projects'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('expand', response.data)
+
+    def test_comment_create_does_not_load_task_relations(self):
+        """
+        Создание комментария не загружает исполнителя и проект задачи отдельными запросами.
+        """
+        self.add_tasks(1)
+        task = Task.objects.get()
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.post(reverse('comment-list'), {'name': 'New', 'body': 'Body', 'task': task.id})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        selects = [query['sql'] for query in captured.captured_queries if query['sql'].startswith('SELECT')]
+        self.assertFalse([sql for sql in selects if 'FROM "users_user"' in sql or 'FROM "main_project"' in sql])
+        message = Message.objects.get(text__startswith='К вашей задаче')
+        self.assertEqual((message.owner_id, message.project_id), (task.executor_id, task.project_id))
+
+    @override_settings(RESPONSE_CACHE={'ENABLED': True, 'ALIAS': 'default', 'TIMEOUT': 300})
+    def test_expanded_relation_change_not_served_stale(self):
+        """
+        Ответ с expand не получает ETag и не кэшируется: правка развёрнутого
+        исполнителя (даже мимо сигналов) видна в следующем запросе.
+        """
+        cache.clear()
+        self.add_tasks(1)
+        url = reverse('task-list', args=[self.project.id])
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, {'expand': 'executor'})
+        self.assertNotIn('ETag', response)
+        self.assertNotIn('X-Cache', response)
+
+        User.objects.filter(username='executor0').update(username='renamed')
+        response = self.client.get(url, {'expand': 'executor'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]['executor']['username'], 'renamed')
+        self.assertNotIn('X-Cache', response)
+        # Без expand валидаторы и кэш работают как прежде
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+class SparseFieldsetTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.client.force_authenticate(user=self.user)
+        self.project = Project.objects.create(title='Test Project', description='Test Description')
+        self.project.project_users.add(self.user)
+        for i in range(3):
+            Task.objects.create(title=f'Task {i}', description='Long description', project=self.project,
+                                executor=self.user, term='2023-12-31', responsible_for_test='Tester')
+
+    def get(self, url, params):
+        cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url, params)
+        return response, [query['sql'] for query in captured.captured_queries if 'FROM "main_task"' in query['sql']]
+
+    def test_only_requested_fields_and_columns(self):
+        """
+        ?fields=id,title — в ответе и в SELECT только эти поля.
+        """
+        response, queries = self.get(reverse('task-list', args=[self.project.id]), {'fields': 'id,title'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([set(row) for row in response.data], [{'id', 'title'}] * 3)
+        select = [sql for sql in queries if '"main_task"."title"' in sql][0]
+        self.assertNotIn('"main_task"."description"', select)
+
+    def test_fields_with_expand(self):
+        """
+        Развёрнутая связь попадает в ответ целиком, если она есть в ?fields=.
+        """
+        response, _ = self.get(reverse('task-list', args=[self.project.id]),
+                               {'fields': 'id,executor', 'expand': 'executor'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data[0]), {'id', 'executor'})
+        self.assertEqual(response.data[0]['executor']['username'], 'testuser')
+
+    def test_detail_and_unknown_fields(self):
+        """
+        ?fields= работает и на детальном представлении; неизвестное поле — 400.
+        """
+        task = Task.objects.first()
+        response = self.client.get(reverse('task-detail', args=[task.id]), {'fields': 'status'})
+        self.assertEqual(response.data, {'status': task.status})
+        response = self.client.get(reverse('project-list'), {'fields': 'id,password'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('fields', response.data)
+
+    def test_write_ignores_fields(self):
+        """
+        ?fields= не урезает запись и ответ на неё.
+        """
+        response = self.client.post(reverse('comment-list') + '?fields=id',
+                                    {'name': 'New', 'body': 'Body', 'task': Task.objects.first().id})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['body'], 'Body')
+
+
+class ThrottleTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.other = User.objects.create_user(username='other', password='testpass')
+        self.client.force_authenticate(user=self.user)
+        self.project = Project.objects.create(title='Project', description='Description')
+        self.url = reverse('project-detail', args=[self.project.id])
+        self.now = 1_000_000.0
+        clock = mock.patch.object(TokenBucketThrottle, 'timer', mock.Mock(side_effect=lambda: self.now))
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def rates(self, **rates):
+        return override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates})
+
+    def patch(self, user=None):
+        self.client.force_authenticate(user=user or self.user)
+        return self.client.patch(self.url, {'title': 'Renamed'}, format='json')
+
+    def statuses(self, count, user=None):
+        return [self.patch(user).status_code for _ in range(count)]
+
+    def test_burst_then_retry_after(self):
+        """
+        6/min с ёмкостью 3: три запроса подряд, четвёртый — 429 с Retry-After
+        до следующего токена; через 10 секунд проходит ровно один запрос.
+        """
+        with self.rates(projects='6/min:3', projects_ip='100/min'):
+            self.assertEqual(self.statuses(3), [status.HTTP_200_OK] * 3)
+            response = self.patch()
+            self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            self.assertEqual(response['Retry-After'], '10')
+            self.now += 4
+            self.assertEqual(self.patch()['Retry-After'], '6')
+            self.now += 6
+            self.assertEqual(self.statuses(2), [status.HTTP_200_OK, status.HTTP_429_TOO_MANY_REQUESTS])
+
+    def test_rejections_do_not_consume_tokens(self):
+        """
+        Отклонённые запросы не отодвигают следующий токен.
+        """
+        with self.rates(projects='6/min:3', projects_ip='100/min'):
+            self.statuses(3)
+            self.assertEqual(self.statuses(20), [status.HTTP_429_TOO_MANY_REQUESTS] * 20)
+            self.now += 10
+            self.assertEqual(self.patch().status_code, status.HTTP_200_OK)
+
+    def test_idle_bucket_refills_to_burst(self):
+        """
+        После простоя бакет полон, но не больше ёмкости.
+        """
+        with self.rates(projects='6/min:3', projects_ip='100/min'):
+            self.statuses(3)
+            self.now += 3600
+            self.assertEqual(self.statuses(4), [status.HTTP_200_OK] * 3 + [status.HTTP_429_TOO_MANY_REQUESTS])
+
+    def test_ip_bucket_shared_by_users(self):
+        """
+        Бакет <scope>_ip общий для всех пользователей с одного адреса.
+        """
+        with self.rates(projects='100/min', projects_ip='2/min'):
+            self.assertEqual(self.patch().status_code, status.HTTP_200_OK)
+            self.assertEqual(self.patch(self.other).status_code, status.HTTP_200_OK)
+            self.assertEqual(self.patch().status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_reads_and_unscoped_views_not_throttled(self):
+        """
+        GET не ограничивается; у ProjectSummary нет throttle_scope.
+        """
+        with self.rates(projects='1/min', projects_ip='1/min'):
+            self.patch()
+            self.assertEqual(self.patch().status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            for _ in range(3):
+                self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+            summary = self.client.get(reverse('project-summary', args=[self.project.id]))
+            self.assertEqual(summary.status_code, status.HTTP_200_OK)
+
+    def test_daily_rate_outlives_key_timeout(self):
+        """
+        Ставка /d: ключ бакета не истекает через key_timeout (час), пока бакет не наполнился.
+        """
+        with self.rates(projects='2/d', projects_ip='100/min'), \
+                mock.patch('time.time', side_effect=lambda: self.now):
+            self.assertEqual(self.statuses(3), [status.HTTP_200_OK] * 2 + [status.HTTP_429_TOO_MANY_REQUESTS])
+            self.now += 2 * 3600
+            self.assertEqual(self.patch().status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            self.now += 10 * 3600
+            self.assertEqual(self.patch().status_code, status.HTTP_200_OK)
+
+    def test_bucket_is_single_integer(self):
+        """
+        Состояние бакета в кэше — одно число (TAT в мс), сколько бы ни было запросов.
+        """
+        with self.rates(projects='6/min:3', projects_ip='100/min'):
+            self.statuses(5)
+            self.assertEqual(cache.get(f'throttle:projects:user:{self.user.pk}'), int(self.now * 1000) + 30000)
@@ -13,13 +13,17 @@ urlpatterns = [
 
     path('api/v1/projects/', ProjectView.as_view(), name='project-list'),
     path('api/v1/projects/<int:pk>/', ProjectUpdate.as_view(), name='project-detail'),
+    path('api/v1/projects/<int:pk>/summary/', ProjectSummary.as_view(), name='project-summary'),
     path('api/v1/projects/<int:project_id>/tasks/', TaskView.as_view(), name='task-list'),
     path('api/v1/tasks/', TaskView.as_view()),
+    path('api/v1/tasks/bulk/', TaskBulk.as_view(), name='task-bulk'),
     path('api/v1/tasks/<int:pk>/', TaskUpdate.as_view(), name='task-detail'),
     path('api/v1/comments/', CommentView.as_view(), name='comment-list'),
     path('api/v1/comments/<int:pk>/', CommentUpdate.as_view(), name='comment-detail'),
     path('api/v1/tasks/<int:task_id>/comments/', CommentView.as_view(), name='comment-list-by-task'),
 
+    path('api/v1/sync/', SyncView.as_view(), name='sync'),
+
     path('api/v1/users/', include('users.urls')),
 
     path('api/v1/messages/', include('user_messages.urls')),
@@ -1,56 +1,62 @@
+from django.http import Http404
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
 from .serializers import ProjectSerializer, TaskSerializer, CommentSerializer
+from .filters import ProjectFilter, TaskFilter, CommentFilter
+from .counters import get_summary
+from .bulk import TaskBulkSerializer, apply_task_operations
+from .sync import SyncQuerySerializer, get_changes
+from task.conditional import ConditionalGetMixin
+from task.expand import ExpandMixin
+from task.fieldsets import SparseFieldsetMixin
+from task.response_cache import ResponseCacheMixin
 from rest_framework import generics
 from .models import Project, Task, Comment
 # Create your views here.
 
-from rest_framework import generics
-from django.db.models import Q
-
-class ProjectView(generics.ListCreateAPIView):
+class ProjectView(SparseFieldsetMixin, ResponseCacheMixin, ConditionalGetMixin, generics.ListCreateAPIView):
+    # Фильтрация по created/update и сортировка описаны в ProjectFilter
+    queryset = Project.objects.all()
     serializer_class = ProjectSerializer
     permission_classes = (IsAuthenticatedOrReadOnly, )
+    filterset_class = ProjectFilter
+    throttle_scope = 'projects'
 
-    def get_queryset(self):
-        queryset = Project.objects.all()
-
-        # Сортировка
-        ordering = self.request.query_params.get('ordering', None)
-        if ordering:
-            queryset = queryset.order_by(ordering)
-
-        # Фильтрация
-        created_from = self.request.query_params.get('created_from', None)
-        created_to = self.request.query_params.get('created_to', None)
-        updated_from = self.request.query_params.get('updated_from', None)
-        updated_to = self.request.query_params.get('updated_to', None)
-
-        if created_from and created_to:
-            queryset = queryset.filter(created__range=(created_from, created_to))
-        elif created_from:
-            queryset = queryset.filter(created__gte=created_from)
-        elif created_to:
-            queryset = queryset.filter(created__lte=created_to)
-
-        if updated_from and updated_to:
-            queryset = queryset.filter(update__range=(updated_from, updated_to))
-        elif updated_from:
-            queryset = queryset.filter(update__gte=updated_from)
-        elif updated_to:
-            queryset = queryset.filter(update__lte=updated_to)
-
-        return queryset
-
-class ProjectUpdate(generics.RetrieveUpdateDestroyAPIView):
+    def get_cache_scopes(self):
+        return ['projects']
+
+class ProjectUpdate(SparseFieldsetMixin, ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Project.objects.all()
     serializer_class = ProjectSerializer
     permission_classes = (IsAuthenticated, )
+    throttle_scope = 'projects'
 
 
-class TaskView(generics.ListCreateAPIView):
+class ProjectSummary(APIView):
+    """Сводка доски: задачи по статусу и приоритету, просрочка, нагрузка исполнителей."""
+    permission_classes = (IsAuthenticatedOrReadOnly, )
+
+    def get(self, request, pk):
+        summary = get_summary(pk)
+        if summary is None:
+            raise Http404
+        return Response(summary)
+
+
+class TaskView(SparseFieldsetMixin, ExpandMixin, ResponseCacheMixin, ConditionalGetMixin, generics.ListCreateAPIView):
+    # ?expand=project,executor разворачивает связи одним запросом (task/expand.py),
+    # ?fields=id,title,status — только нужные поля и колонки (task/fieldsets.py)
     serializer_class = TaskSerializer
     permission_classes = (IsAuthenticatedOrReadOnly, )
+    filterset_class = TaskFilter
+    throttle_scope = 'tasks'
+
+    def get_cache_scopes(self):
+        project_id = self.kwargs.get('project_id')
+        return [f'project:{project_id}'] if project_id else ['tasks']
+
     def get_queryset(self):
         project_id = self.kwargs.get('project_id')
         if project_id:
@@ -59,19 +65,51 @@ class TaskView(generics.ListCreateAPIView):
 
 
 
-class TaskUpdate(generics.RetrieveUpdateDestroyAPIView):
+class TaskBulk(APIView):
+    """Пачка операций над задачами (create/update/transition) в одной транзакции."""
+    permission_classes = (IsAuthenticated, )
+    throttle_scope = 'tasks'
+
+    def post(self, request):
+        serializer = TaskBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results, ok = apply_task_operations(serializer.validated_data['operations'])
+        return Response({'results': results}, status=200 if ok else 400)
+
+
+class SyncView(APIView):
+    """
+    Дельта-синхронизация проектов, задач и комментариев: ?since=<cursor> отдаёт
+    только изменённые строки и id удалённых (deleted), без since — полный снимок.
+    """
+    permission_classes = (IsAuthenticated, )
+
+    def get(self, request):
+        serializer = SyncQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        return Response(get_changes(since=params.get('since'), project_id=params.get('project')))
+
+
+class TaskUpdate(SparseFieldsetMixin, ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Task.objects.all()
     serializer_class = TaskSerializer
     permission_classes = (IsAuthenticatedOrReadOnly, )
+    throttle_scope = 'tasks'
 
-class CommentView(generics.ListCreateAPIView):
+class CommentView(SparseFieldsetMixin, ExpandMixin, ConditionalGetMixin, generics.ListCreateAPIView):
+    # ?expand=task,task.executor,task.project
     serializer_class = CommentSerializer
+    filterset_class = CommentFilter
+    throttle_scope = 'comments'
+
     def get_queryset(self):
         task_id = self.kwargs.get('task_id')
         if task_id:
             return Comment.objects.filter(task_id=task_id)
         return Comment.objects.all()
 
-class CommentUpdate(generics.RetrieveUpdateDestroyAPIView):
+class CommentUpdate(SparseFieldsetMixin, ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Comment.objects.all()
-    serializer_class = CommentSerializer
\ No newline at end of file
+    serializer_class = CommentSerializer
+    throttle_scope = 'comments'
\ No newline at end of file
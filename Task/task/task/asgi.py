@@ -1,14 +1,23 @@
 import os
 from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
-from user_messages import routing  # Замените на ваш путь к routing.py
+from django.urls import re_path
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'task.settings')
 
+# Django должен быть настроен до импорта consumers (они импортируют модели)
+django_asgi_app = get_asgi_application()
+
+from user_messages import routing  # noqa: E402
+from user_messages.middleware import JWTAuthMiddlewareStack  # noqa: E402
+
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
-    "websocket": AuthMiddlewareStack(
+    # Потоки SSE (user_messages.routing.http_urlpatterns) не занимают поток воркера Django
+    "http": URLRouter([
+        *routing.http_urlpatterns,
+        re_path(r'', django_asgi_app),
+    ]),
+    "websocket": JWTAuthMiddlewareStack(
         URLRouter(
             routing.websocket_urlpatterns
         )
@@ -0,0 +1,61 @@
+import hashlib
+from calendar import timegm
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+class ConditionalGetMixin:
+    """
+    ETag и Last-Modified для GET на generic-view.
+
+    Валидаторы считаются одним индексным запросом без сериализатора:
+    для детального view — значение поля update по первичному ключу,
+    для списка — max(update) и count() по тому же отфильтрованному queryset.
+    Если клиент прислал совпадающий If-None-Match / If-Modified-Since,
+    сразу отвечаем 304.
+    """
+    last_modified_field = 'update'
+
+    def get(self, request, *args, **kwargs):
+        validators = self.get_validators()
+        if validators is None:
+            return super().get(request, *args, **kwargs)
+
+        etag, last_modified = validators
+        timestamp = timegm(last_modified.utctimetuple()) if last_modified else None
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+        return response
+
+    def is_detail(self):
+        return (self.lookup_url_kwarg or self.lookup_field) in self.kwargs
+
+    def get_validators(self):
+        queryset = self.filter_queryset(self.get_queryset()).order_by()
+        field = self.last_modified_field
+        if self.is_detail():
+            lookup = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+            row = queryset.filter(**{self.lookup_field: lookup}).values_list('pk', field).first()
+            if row is None:
+                return None
+            pk, last_modified = row
+            parts = ['detail', pk, last_modified.isoformat()]
+        else:
+            aggregate = queryset.aggregate(last_modified=Max(field), count=Count('pk'))
+            last_modified = aggregate['last_modified']
+            parts = ['list', aggregate['count'], last_modified.isoformat() if last_modified else '']
+        return self.make_etag(parts), last_modified
+
+    def make_etag(self, parts):
+        # Представление зависит и от параметров запроса (пагинация, фильтры),
+        # поэтому они тоже входят в ETag.
+        query = sorted(self.request.query_params.lists())
+        source = repr([self.get_queryset().model._meta.label, *parts, query])
+        return quote_etag(hashlib.sha1(source.encode()).hexdigest())
@@ -0,0 +1,109 @@
+from rest_framework.exceptions import ValidationError
+
+# Разворачивание связанных объектов в списках: ?expand=task,task.executor.
+# Вместо id связи в ответ попадает вложенный объект, а queryset получает
+# select_related по всем путям (и prefetch_related для их M2M), поэтому
+# число запросов не зависит от размера страницы.
+
+
+def parse_expand(value):
+    """'task.executor,owner' -> {'task', 'task.executor', 'owner'}: путь включает всех своих предков."""
+    paths = set()
+    for item in value.split(','):
+        parts = [part for part in item.strip().split('.') if part]
+        for depth in range(1, len(parts) + 1):
+            paths.add('.'.join(parts[:depth]))
+    return paths
+
+
+def get_expandable(serializer_class, path):
+    """Класс сериализатора для пути развёртывания или None, если путь не разрешён."""
+    for name in path.split('.'):
+        serializer_class = getattr(serializer_class, 'expandable_fields', {}).get(name)
+        if serializer_class is None:
+            return None
+    return serializer_class
+
+
+def expand_queryset(queryset, serializer_class, expand):
+    """select_related по путям expand (все они — прямые FK) и prefetch_related для M2M их сериализаторов."""
+    if not expand:
+        return queryset
+    prefetch = []
+    for path in expand:
+        lookup = path.replace('.', '__')
+        nested = get_expandable(serializer_class, path)
+        model = nested.Meta.model
+        fields = nested().fields
+        prefetch.extend(
+            f'{lookup}__{field.name}' for field in model._meta.many_to_many if field.name in fields
+        )
+    return queryset.select_related(*(path.replace('.', '__') for path in expand)).prefetch_related(*prefetch)
+
+
+class ExpandableSerializerMixin:
+    """
+    Сериализатор с разворачиваемыми связями: expandable_fields = {имя FK: класс сериализатора}.
+    Набор путей берётся из аргумента expand (для вложенных) или из context['expand'] (для корня).
+    """
+    expandable_fields = {}
+
+    def __init__(self, *args, expand=None, **kwargs):
+        self.expand = expand
+        super().__init__(*args, **kwargs)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        expand = self.expand if self.expand is not None else self.context.get('expand', set())
+        for name, serializer_class in self.expandable_fields.items():
+            if name not in expand:
+                continue
+            nested = {path[len(name) + 1:] for path in expand if path.startswith(f'{name}.')}
+            if issubclass(serializer_class, ExpandableSerializerMixin):
+                fields[name] = serializer_class(read_only=True, expand=nested)
+            else:
+                fields[name] = serializer_class(read_only=True)
+        return fields
+
+
+class ExpandMixin:
+    """
+    Для списков: разбирает ?expand=, проверяет пути по expandable_fields
+    сериализатора и применяет select_related/prefetch_related. Развёртывание
+    действует только на чтение: при создании связь по-прежнему передаётся id.
+    """
+    max_expand_depth = 3
+
+    def get_expand(self):
+        if not hasattr(self, '_expand'):
+            expand = set()
+            if self.request.method in ('GET', 'HEAD'):
+                expand = parse_expand(self.request.query_params.get('expand', ''))
+            serializer_class = self.get_serializer_class()
+            unknown = sorted(
+                path for path in expand
+                if path.count('.') >= self.max_expand_depth or get_expandable(serializer_class, path) is None
+            )
+            if unknown:
+                raise ValidationError({'expand': [f'Нельзя развернуть: {", ".join(unknown)}.']})
+            self._expand = expand
+        return self._expand
+
+    def filter_queryset(self, queryset):
+        # filter_queryset, а не get_queryset: представления переопределяют get_queryset сами
+        return expand_queryset(super().filter_queryset(queryset), self.get_serializer_class(), self.get_expand())
+
+    def get_serializer_context(self):
+        return {**super().get_serializer_context(), 'expand': self.get_expand()}
+
+    # ETag (ConditionalGetMixin) и области кэша ответов (ResponseCacheMixin)
+    # следят только за корневыми строками: правка развёрнутого исполнителя,
+    # проекта или задачи их не меняет. Ответы с expand не валидируются и не кэшируются.
+
+    def get_validators(self):
+        if self.get_expand():
+            return None
+        return super().get_validators()
+
+    def is_response_cacheable(self, request):
+        return not self.get_expand() and super().is_response_cacheable(request)
@@ -0,0 +1,123 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import ListSerializer
+
+# Разреженные наборы полей: ?fields=id,title,executor. В ответе остаются только
+# перечисленные поля, queryset читает из базы только их колонки (.only()), а
+# prefetch_related делается только для запрошенных M2M — клиент не платит за
+# то, что не показывает. Вложенные (развёрнутые через ?expand=) объекты не
+# урезаются.
+
+
+def parse_fields(value):
+    """'id, title,,id' -> ['id', 'title']"""
+    return list(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+
+
+def project_queryset(queryset, fields, selected, dependencies=None):
+    """
+    .only() по колонкам полей selected сериализатора (fields — его .fields) и
+    prefetch_related их M2M. dependencies — {поле: колонки}, которые полю нужны
+    помимо его source. Если поле нельзя сопоставить с колонками (метод
+    сериализатора или свойство модели без dependencies), колонки не
+    ограничиваются: иначе отложенные поля грузились бы запросом на строку.
+    """
+    dependencies = dependencies or {}
+    opts = queryset.model._meta
+    annotations = queryset.query.annotations
+    columns = {opts.pk.name}
+    prefetch = []
+    restrict = True
+    for name in selected:
+        columns.update(dependencies.get(name, ()))
+        source = fields[name].source
+        if source == '*':
+            restrict = restrict and name in dependencies
+            continue
+        source = source.split('.')[0]
+        if source in annotations:
+            continue
+        try:
+            model_field = opts.get_field(source)
+        except FieldDoesNotExist:
+            restrict = restrict and name in dependencies
+            continue
+        if model_field.many_to_many or model_field.one_to_many:
+            prefetch.append(source)
+        elif model_field.concrete:
+            columns.add(model_field.name)
+
+    # Связи из select_related (в том числе ?expand=) нельзя откладывать
+    select_related = queryset.query.select_related
+    if select_related is True:
+        restrict = False
+    elif select_related:
+        columns.update(select_related)
+    if restrict:
+        queryset = queryset.only(*columns)
+    return queryset.prefetch_related(*prefetch) if prefetch else queryset
+
+
+class SparseFieldsetSerializerMixin:
+    """
+    Сериализатор с разреженным набором полей: context['fields'] (его кладёт
+    SparseFieldsetMixin) оставляет в ответе корневого сериализатора только эти поля.
+    field_dependencies = {поле: (колонки модели)} — что ещё читает поле, кроме своего source.
+    """
+    field_dependencies = {}
+
+    def is_root_serializer(self):
+        return self.parent is None or (isinstance(self.parent, ListSerializer) and self.parent.parent is None)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selected = self.context.get('fields')
+        if selected is None or not self.is_root_serializer():
+            return fields
+        return {name: field for name, field in fields.items() if name in selected}
+
+
+class SparseFieldsetMixin:
+    """
+    Для generic-view: разбирает ?fields= на GET, проверяет имена по полям
+    сериализатора и урезает queryset. default_fields — поля ответа без ?fields=
+    (None — все поля сериализатора). Запись (POST/PUT/PATCH) работает с полным набором.
+    """
+    default_fields = None
+
+    def get_sparse_fields(self):
+        if not hasattr(self, '_sparse_fields'):
+            selected = None
+            if self.request.method in ('GET', 'HEAD'):
+                value = self.request.query_params.get('fields')
+                selected = parse_fields(value) if value else self.default_fields
+            if selected is not None:
+                available = self.get_available_fields()
+                unknown = [name for name in selected if name not in available]
+                if unknown:
+                    raise ValidationError({'fields': [f'Неизвестные поля: {", ".join(unknown)}.']})
+                selected = set(selected)
+            self._sparse_fields = selected
+        return self._sparse_fields
+
+    def get_available_fields(self):
+        if not hasattr(self, '_available_fields'):
+            serializer = self.get_serializer_class()(context={'request': self.request, 'view': self})
+            self._available_fields = serializer.fields
+        return self._available_fields
+
+    def filter_queryset(self, queryset):
+        # Как и ExpandMixin — filter_queryset: get_queryset представления переопределяют сами
+        queryset = super().filter_queryset(queryset)
+        selected = self.get_sparse_fields()
+        if selected is None:
+            return queryset
+        dependencies = getattr(self.get_serializer_class(), 'field_dependencies', {})
+        return project_queryset(queryset, self.get_available_fields(), selected, dependencies)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        selected = self.get_sparse_fields()
+        if selected is not None:
+            context['fields'] = selected
+        return context
@@ -0,0 +1,54 @@
+from django.db.models.lookups import Exact
+from django_filters import OrderingFilter
+
+
+class IndexedOrderingFilter(OrderingFilter):
+    """
+    Сортировка только по ключам, которые обслуживаются индексом.
+
+    indexed    — {ключ: поля}: ключ используется, если запрос сужен равенством
+                 хотя бы по одному из полей (пустой кортеж — индекс по самому ключу);
+    downgraded — ключи, которые принимаются, но без индекса и поэтому
+                 заменяются сортировкой по умолчанию.
+    Остальные ключи отклоняются с ошибкой 400. К сортировке всегда
+    добавляется id, чтобы порядок был детерминированным для пагинации.
+    """
+    tiebreaker = 'id'
+
+    def __init__(self, *args, indexed=None, downgraded=(), default=None, **kwargs):
+        self.indexed = dict(indexed or {})
+        self.indexed.setdefault(self.tiebreaker, ())
+        self.downgraded = tuple(downgraded)
+        self.default = tuple(default or (self.tiebreaker,))
+        kwargs.setdefault('fields', [*self.indexed, *self.downgraded])
+        super().__init__(*args, **kwargs)
+
+    def filter(self, qs, value):
+        pinned = self.get_pinned_fields(qs)
+        ordering = [
+            self.get_ordering_value(param)
+            for param in value or []
+            if param and self.is_indexed(param.lstrip('-'), pinned)
+        ]
+        return qs.order_by(*self.with_tiebreaker(ordering or list(self.default)))
+
+    def is_indexed(self, param, pinned):
+        if param not in self.indexed:
+            return False
+        scope = self.indexed[param]
+        return not scope or any(name in pinned for name in scope)
+
+    def with_tiebreaker(self, ordering):
+        if any(key.lstrip('-') in (self.tiebreaker, 'pk') for key in ordering):
+            return ordering
+        descending = ordering[-1].startswith('-')
+        return [*ordering, ('-' if descending else '') + self.tiebreaker]
+
+    @staticmethod
+    def get_pinned_fields(qs):
+        # Поля, по которым запрос уже сужен условием равенства (WHERE field = ...)
+        return {
+            child.lhs.target.name
+            for child in qs.query.where.children
+            if isinstance(child, Exact) and hasattr(child.lhs, 'target')
+        }
@@ -0,0 +1,179 @@
+import base64
+import json
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset-пагинация по (поля сортировки..., id) с непрозрачным курсором.
+
+    Включается только если клиент передал ?page_size= или ?cursor=,
+    иначе список отдаётся целиком, как и раньше. Следующая страница
+    выбирается условием WHERE (field, id) > (последнее значение), поэтому
+    глубокие страницы стоят столько же, сколько первая (в отличие от OFFSET).
+
+    NULL в полях с null=True стоят в конце при сортировке по возрастанию и в
+    начале по убыванию (как по умолчанию в PostgreSQL, но явно — для любой
+    СУБД), и условие курсора учитывает их через isnull.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = api_settings.PAGE_SIZE or 50
+    max_page_size = 500
+    tiebreaker = 'id'
+    invalid_cursor_message = 'Некорректный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.next_cursor = None
+        params = request.query_params
+        if self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+
+        self.page_size = self.get_page_size(request)
+        self.model = queryset.model
+        self.ordering = self.get_ordering(queryset)
+        queryset = queryset.order_by(*self.get_order_by())
+
+        encoded = params.get(self.cursor_query_param)
+        if encoded:
+            queryset = queryset.filter(self.build_filter(self.decode_cursor(encoded)))
+
+        results = list(queryset[:self.page_size + 1])
+        if len(results) > self.page_size:
+            results = results[:self.page_size]
+            self.next_cursor = self.encode_cursor(results[-1])
+        return results
+
+    def get_page_size(self, request):
+        value = request.query_params.get(self.page_size_query_param)
+        if value is None:
+            return self.page_size
+        try:
+            page_size = int(value)
+        except ValueError:
+            raise ValidationError({self.page_size_query_param: 'Ожидается целое число.'})
+        if page_size <= 0:
+            raise ValidationError({self.page_size_query_param: 'Ожидается положительное число.'})
+        return min(page_size, self.max_page_size)
+
+    def get_ordering(self, queryset):
+        ordering = [key for key in queryset.query.order_by if isinstance(key, str)]
+        if len(ordering) != len(queryset.query.order_by):
+            raise ValidationError({'ordering': 'Сортировка не поддерживается курсорной пагинацией.'})
+        if not ordering:
+            ordering = list(queryset.model._meta.ordering)
+
+        keys = []
+        for key in ordering:
+            name = key.lstrip('-')
+            field = self.get_field(name)
+            if field.primary_key:
+                name = self.tiebreaker
+            keys.append(('-' if key.startswith('-') else '') + name)
+            if name == self.tiebreaker:
+                return keys
+
+        # id повторяет направление последнего ключа, чтобы хватало одного индекса
+        descending = bool(keys) and keys[-1].startswith('-')
+        keys.append(('-' if descending else '') + self.tiebreaker)
+        return keys
+
+    def get_order_by(self):
+        order_by = []
+        for key in self.ordering:
+            field = self.get_field(key.lstrip('-'))
+            if not field.null:
+                order_by.append(key)
+            elif key.startswith('-'):
+                order_by.append(F(field.attname).desc(nulls_first=True))
+            else:
+                order_by.append(F(field.attname).asc(nulls_last=True))
+        return order_by
+
+    def get_field(self, name):
+        if name == 'pk':
+            return self.model._meta.pk
+        try:
+            return self.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            raise ValidationError({'ordering': f'Сортировка по "{name}" не поддерживается курсорной пагинацией.'})
+
+    def build_filter(self, values):
+        if len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        conditions = []
+        equal = Q()
+        for key, raw in zip(self.ordering, values):
+            name = key.lstrip('-')
+            field = self.get_field(name)
+            try:
+                value = field.to_python(raw)
+            except Exception:
+                raise NotFound(self.invalid_cursor_message)
+            descending = key.startswith('-')
+            if value is None:
+                if not field.null:
+                    raise NotFound(self.invalid_cursor_message)
+                # По возрастанию после NULL ничего нет, по убыванию дальше идут все не-NULL
+                if descending:
+                    conditions.append(equal & Q(**{f'{field.attname}__isnull': False}))
+                equal &= Q(**{f'{field.attname}__isnull': True})
+                continue
+            after = Q(**{f'{field.attname}__{"lt" if descending else "gt"}': value})
+            if field.null and not descending:
+                after |= Q(**{f'{field.attname}__isnull': True})
+            conditions.append(equal & after)
+            equal &= Q(**{field.attname: value})
+        return reduce(or_, conditions)
+
+    def encode_cursor(self, instance):
+        values = []
+        for key in self.ordering:
+            field = self.get_field(key.lstrip('-'))
+            value = getattr(instance, field.attname)
+            values.append(None if value is None else field.value_to_string(instance))
+        data = json.dumps(values, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+    def decode_cursor(self, encoded):
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list):
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.page_size_query_param, self.page_size)
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,142 @@
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from rest_framework.response import Response
+
+DEFAULTS = {
+    'ENABLED': False,
+    'ALIAS': 'default',
+    'TIMEOUT': 300,
+    'KEY_PREFIX': 'respcache',
+}
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'RESPONSE_CACHE', {})}
+
+
+def get_cache(config=None):
+    return caches[(config or get_config())['ALIAS']]
+
+
+def get_stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.update(hits=0, misses=0)
+
+
+def _record(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def _version_key(config, scope):
+    return f"{config['KEY_PREFIX']}:v:{scope}"
+
+
+def _new_version():
+    # Новая версия всегда больше любой выданной ранее, поэтому после вытеснения
+    # ключа версии из кэша старые ответы не оживают.
+    return time.time_ns()
+
+
+def get_versions(scopes):
+    config = get_config()
+    cache = get_cache(config)
+    keys = [_version_key(config, scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _new_version(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def _bump(scopes):
+    config = get_config()
+    cache = get_cache(config)
+    for scope in scopes:
+        key = _version_key(config, scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_version(), timeout=None)
+
+
+def bump(*scopes):
+    """
+    Инвалидирует все закэшированные ответы указанных областей за O(1).
+
+    Версия повышается сразу и ещё раз после коммита: иначе параллельный
+    запрос мог бы успеть положить в кэш данные до коммита под новой версией.
+    """
+    scopes = [scope for scope in scopes if scope]
+    if not scopes:
+        return
+    _bump(scopes)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: _bump(scopes))
+
+
+class ResponseCacheMixin:
+    """
+    Кэш GET-ответов generic-view поверх Django cache framework.
+
+    Ключ: путь, нормализованные параметры запроса, пользователь и версии
+    областей из get_cache_scopes(). Включается настройкой RESPONSE_CACHE['ENABLED'].
+    """
+    cached_headers = ('ETag', 'Last-Modified')
+
+    def get_cache_scopes(self):
+        raise NotImplementedError
+
+    def is_response_cacheable(self, request):
+        return True
+
+    def get_response_cache_key(self, request, config):
+        user = request.user.pk if request.user and request.user.is_authenticated else 'anon'
+        query = sorted(request.query_params.lists())
+        versions = get_versions(self.get_cache_scopes())
+        source = repr([request.get_host(), request.path, user, query, versions])
+        return f"{config['KEY_PREFIX']}:r:{hashlib.sha1(source.encode()).hexdigest()}"
+
+    def get(self, request, *args, **kwargs):
+        config = get_config()
+        if not config['ENABLED'] or not self.is_response_cacheable(request):
+            return super().get(request, *args, **kwargs)
+
+        cache = get_cache(config)
+        key = self.get_response_cache_key(request, config)
+        cached = cache.get(key)
+        if cached is not None:
+            _record('hits')
+            data, headers = cached
+            last_modified = parse_http_date_safe(headers.get('Last-Modified', ''))
+            response = get_conditional_response(request, etag=headers.get('ETag'), last_modified=last_modified)
+            if response is None:
+                response = Response(data)
+            for name, value in headers.items():
+                response[name] = value
+            response['X-Cache'] = 'HIT'
+            return response
+
+        _record('misses')
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == 200:
+            headers = {name: response[name] for name in self.cached_headers if name in response}
+            cache.set(key, (response.data, headers), config['TIMEOUT'])
+        response['X-Cache'] = 'MISS'
+        return response
@@ -47,6 +47,7 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
 
     'rest_framework',
+    'django_filters',
     'corsheaders',
     'main.apps.MainConfig',
     'users.apps.UsersConfig',
@@ -64,12 +65,46 @@ CHANNEL_LAYERS = {
     },
 }
 
+# InMemoryChannelLayer не передаёт сообщения между процессами: при нескольких
+# воркерах daphne нужен общий слой (user_messages/channel_layer.py)
+if env.str('CHANNEL_LAYER', 'memory') == 'postgres':
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'user_messages.channel_layer.PostgresChannelLayer',
+            'CONFIG': {
+                'group_expiry': 86400,
+                'batch_delay': 0.002,
+            },
+        },
+    }
+
 AUTH_USER_MODEL = 'users.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+        # JWTAuthentication с кэшем пользователей (users/authentication.py)
+        'users.authentication.CachedJWTAuthentication',
+    ),
+    # Keyset-пагинация включается параметрами ?page_size= / ?cursor=
+    'DEFAULT_PAGINATION_CLASS': 'task.pagination.KeysetPagination',
+    'PAGE_SIZE': 50,
+    # Фильтры и белые списки сортировки объявляются во FilterSet каждого view
+    'DEFAULT_FILTER_BACKENDS': ('django_filters.rest_framework.DjangoFilterBackend',),
+    # Token bucket на запись (task/throttling.py) в CACHES['default']: view включает его через throttle_scope.
+    # '<scope>' — на пользователя, '<scope>_ip' — на IP; 'N/период:ёмкость', без ёмкости она равна N.
+    # При нескольких процессах нужен общий кэш с атомарным incr (Redis, Memcached)
+    'DEFAULT_THROTTLE_CLASSES': (
+        'task.throttling.UserTokenBucketThrottle',
+        'task.throttling.IPTokenBucketThrottle',
+    ),
+    'DEFAULT_THROTTLE_RATES': {
+        'projects': '30/min', 'projects_ip': '60/min',
+        'tasks': '120/min', 'tasks_ip': '240/min',
+        'comments': '60/min', 'comments_ip': '120/min',
+        'messages': '120/min', 'messages_ip': '240/min',
+        # Вход: на логин и на IP (users.views.CustomTokenObtainPairView)
+        'token': '10/min:5', 'token_ip': '30/min:10',
+    },
 }
 
 MIDDLEWARE = [
@@ -212,5 +247,96 @@ DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 SERVER_EMAIL = EMAIL_HOST_USER
 EMAIL_ADMIN = EMAIL_HOST_USER
 
+# При нескольких процессах нужен общий бэкенд (например, DatabaseCache),
+# иначе версии кэша ответов инвалидируются только в своём процессе.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+# Пользователи для JWT-аутентификации (users/authentication.py): LRU процесса на LOCAL_TTL сек
+# и общий кэш CACHES[ALIAS] на TTL сек; STATELESS — TokenUser из claims токена без базы и кэша.
+# Кэш сбрасывают сигналы User; QuerySet.update(is_active=False) их не шлёт и действует через TTL
+AUTH_USER_CACHE = {
+    'ALIAS': 'default',
+    'TTL': 60,
+    'LOCAL_TTL': 5,
+    'LOCAL_SIZE': 1024,
+    'STATELESS': env.bool('AUTH_STATELESS', False),
+}
+
+# Хэширование паролей (users/hashing.py): пул из WORKERS потоков, в работе и очереди не больше MAX_PENDING задач;
+# задача, прождавшая в очереди дольше QUEUE_TIMEOUT сек, отклоняется — 503 с Retry-After: RETRY_AFTER;
+# регистрация и смена пароля (синхронные) в очередь не встают: нет свободного потока — сразу 503;
+# потоки пула работают с nice NICE. По умолчанию WORKERS — половина ядер, остальные остаются API
+PASSWORD_HASHING = {
+    'WORKERS': env.int('PASSWORD_HASHING_WORKERS', max(1, (os.cpu_count() or 2) // 2)),
+    'MAX_PENDING': 64,
+    'QUEUE_TIMEOUT': 2.0,
+    'RETRY_AFTER': 1,
+    'NICE': 10,
+}
+
+# Кэш GET-ответов списков (task/response_cache.py); версии и ответы хранятся в CACHES[ALIAS]
+RESPONSE_CACHE = {
+    'ENABLED': env.bool('RESPONSE_CACHE_ENABLED', False),
+    'ALIAS': 'default',
+    'TIMEOUT': 300,
+}
+
+# Outbox писем (user_messages.outbox, manage.py send_outbox_emails)
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_BACKOFF_BASE = 30
+OUTBOX_BACKOFF_MAX = 3600
+OUTBOX_LEASE = 300
+
+# Срок хранения сообщений (manage.py purge_messages): прочитанные и непрочитанные — отдельно
+MESSAGE_RETENTION = {
+    'READ_DAYS': env.int('MESSAGE_RETENTION_READ_DAYS', 30),
+    'UNREAD_DAYS': env.int('MESSAGE_RETENTION_UNREAD_DAYS', 180),
+    'BATCH_SIZE': 1000,
+    'BATCH_PAUSE': 0.05,
+    'ARCHIVE_DIR': os.path.join(BASE_DIR, 'archive', 'messages'),
+}
+
+# Дельта-синхронизация (/api/v1/sync/): сколько дней хранятся надгробия удалённых строк
+# и сколько изменений отдаётся дельтой, прежде чем клиенту придётся загрузить снимок заново
+SYNC = {
+    'TOMBSTONE_DAYS': env.int('SYNC_TOMBSTONE_DAYS', 30),
+    'MAX_CHANGES': 5000,
+}
+
+# WebSocket-уведомления (ws/notifications/): сколько пропущенных сообщений отдавать за один resume
+NOTIFICATIONS_RESUME_LIMIT = 100
+# Обновления одной задачи для одного владельца в пределах окна (сек) склеиваются в одно сообщение; 0 — отключить
+NOTIFICATIONS_COALESCE_WINDOW = env.int('NOTIFICATIONS_COALESCE_WINDOW', 60)
+# SSE-поток (api/v1/messages/stream/): heartbeat и время жизни потока в секундах, retry для EventSource в мс
+NOTIFICATIONS_SSE_HEARTBEAT = 15
+NOTIFICATIONS_SSE_MAX_DURATION = 300
+NOTIFICATIONS_SSE_RETRY = 3000
+
+# Исходящая очередь WebSocket-соединения (user_messages/backpressure.py): не больше LIMIT событий,
+# при переполнении POLICY = drop_oldest | coalesce | disconnect; до BATCH_SIZE событий за BATCH_DELAY сек — один кадр
+WEBSOCKET_OUTBOUND = {
+    'LIMIT': env.int('WEBSOCKET_OUTBOUND_LIMIT', 100),
+    'POLICY': env.str('WEBSOCKET_OUTBOUND_POLICY', 'drop_oldest'),
+    'BATCH_SIZE': 50,
+    'BATCH_DELAY': 0.005,
+}
+
+# Аватары (users/avatars.py): загрузка в фоне режется в квадраты SIZES (px) формата FORMAT (WEBP, без поддержки — JPEG)
+# и сохраняется в media/avatars/<xx>/ под именем по хэшу содержимого — эти файлы можно отдавать с
+# Cache-Control: public, max-age=31536000, immutable. BACKGROUND=False — обработка сразу после коммита
+AVATARS = {
+    'SIZES': {'small': 64, 'medium': 128, 'large': 256},
+    'DEFAULT_SIZE': 'medium',
+    'FORMAT': 'WEBP',
+    'QUALITY': 80,
+    'WORKERS': 1,
+    'BACKGROUND': True,
+}
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
@@ -0,0 +1,48 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryPlanMixin:
+    """
+    Помощник для тестов на планы запросов (только PostgreSQL).
+
+    Выполняет запрос к эндпоинту, находит в нём основной SELECT по таблице
+    и прогоняет его через EXPLAIN. Последовательное сканирование отключается,
+    чтобы на маленьком тестовом наборе данных план показывал, может ли
+    запрос вообще обслуживаться индексом.
+    """
+    index_scan_nodes = ('Index Scan', 'Index Only Scan', 'Bitmap Index Scan')
+
+    def analyze(self, *tables):
+        with connection.cursor() as cursor:
+            for table in tables:
+                cursor.execute(f'ANALYZE "{table}"')
+
+    def capture_main_query(self, table, url, params=None):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200)
+        for query in captured.captured_queries:
+            sql = query['sql']
+            if sql.startswith('SELECT') and f'FROM "{table}"' in sql:
+                return sql
+        self.fail(f'Запрос к таблице {table} не найден')
+
+    def explain(self, sql, params=None):
+        with connection.cursor() as cursor:
+            cursor.execute('SET enable_seqscan = off')
+            cursor.execute(f'EXPLAIN {sql}', params)
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+            cursor.execute('RESET enable_seqscan')
+        return plan
+
+    def explain_queryset(self, queryset):
+        return self.explain(*queryset.query.sql_with_params())
+
+    def assertUsesIndex(self, table, url, params=None, index=None):
+        plan = self.explain(self.capture_main_query(table, url, params))
+        self.assertTrue(any(node in plan for node in self.index_scan_nodes), plan)
+        self.assertNotIn(f'Seq Scan on {table}', plan)
+        if index:
+            self.assertIn(index, plan)
+        return plan
@@ -0,0 +1,144 @@
+import hashlib
+import math
+import time
+
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+# Ограничение частоты записи: token bucket (в форме GCRA) в общем кэше.
+#
+# Состояние бакета — одно целое число в кэше: TAT, время в мс, когда бакет
+# снова будет полон. Каждый запрос — один атомарный incr на интервал T между
+# токенами; запрос проходит, если старый TAT опережает текущее время не больше
+# чем на (burst - 1) * T. Отказ возвращает T обратно (decr), поэтому
+# отклонённые запросы токенов не тратят. В отличие от SimpleRateThrottle DRF,
+# который хранит список меток времени (его размер растёт со ставкой) и
+# перезаписывает его без блокировки, здесь значение фиксированного размера и
+# нет гонки чтение-запись.
+#
+# Если TAT отстал от текущего времени (бакет простаивал и полон), он
+# переставляется на now + T через set: одновременные запросы в этот момент
+# могут пройти все, но не больше, чем их было. Ключ живёт key_timeout секунд
+# с последнего set/add (incr срок не продлевает), но не меньше, чем бакет
+# наполняется с нуля: иначе при ставках /h и /d ключ истекал бы раньше, и
+# клиент получал бы полный бакет досрочно.
+#
+# Нужен кэш с атомарным incr: LocMemCache (только в пределах процесса),
+# Redis, Memcached. DatabaseCache и FileBasedCache делают incr через get+set.
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """'120/min' -> (120, 60, 120): запросов, за сколько секунд, ёмкость бакета; '120/min:20' — ёмкость 20."""
+    rate, _, burst = rate.partition(':')
+    num, period = rate.split('/')
+    num = int(num)
+    return num, PERIODS[period[0]], int(burst) if burst else num
+
+
+class TokenBucket:
+    def __init__(self, cache, key, rate, timeout):
+        num, period, burst = parse_rate(rate)
+        self.cache = cache
+        self.key = key
+        self.interval = max(1, round(period * 1000 / num))
+        self.tolerance = self.interval * (burst - 1)
+        # TAT опережает текущее время не больше чем на tolerance + interval
+        self.timeout = max(timeout, period, math.ceil((self.tolerance + self.interval) / 1000))
+
+    def consume(self, now):
+        """Берёт токен в момент now (мс). None — запрос разрешён, иначе через сколько секунд повторить."""
+        try:
+            tat = self.cache.incr(self.key, self.interval)
+        except ValueError:
+            # Ключа нет: бакет полон
+            if self.cache.add(self.key, now + self.interval, self.timeout):
+                return None
+            tat = self.cache.incr(self.key, self.interval)
+        previous = tat - self.interval
+        if previous < now:
+            self.cache.set(self.key, now + self.interval, self.timeout)
+            return None
+        if previous - now > self.tolerance:
+            self.cache.decr(self.key, self.interval)
+            return (previous - self.tolerance - now) / 1000
+        return None
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Базовый класс: бакет на (view.throttle_scope, идентификатор клиента).
+    Ставка берётся из DEFAULT_THROTTLE_RATES[throttle_scope + rate_suffix];
+    view без throttle_scope или без ставки не ограничивается. Ограничивается
+    только запись — GET/HEAD/OPTIONS проходят всегда.
+    """
+    rate_suffix = ''
+    cache_alias = 'default'
+    key_timeout = 3600
+    timer = time.time
+
+    def __init__(self):
+        self.wait_seconds = None
+
+    def get_rate(self, scope):
+        rates = api_settings.DEFAULT_THROTTLE_RATES or {}
+        rate = rates.get(f'{scope}{self.rate_suffix}')
+        if rate is not None:
+            try:
+                parse_rate(rate)
+            except (KeyError, ValueError):
+                raise ImproperlyConfigured(f'Некорректная ставка throttle для {scope}{self.rate_suffix}: {rate!r}')
+        return rate
+
+    def get_ident_key(self, request, view):
+        """Идентификатор клиента для ключа бакета; None — не ограничивать."""
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        self.wait_seconds = None
+        scope = getattr(view, 'throttle_scope', None)
+        if not scope or request.method in SAFE_METHODS:
+            return True
+        rate = self.get_rate(scope)
+        ident = self.get_ident_key(request, view) if rate else None
+        if ident is None:
+            return True
+        key = f'throttle:{scope}{self.rate_suffix}:{ident}'
+        bucket = TokenBucket(caches[self.cache_alias], key, rate, self.key_timeout)
+        self.wait_seconds = bucket.consume(int(self.timer() * 1000))
+        return self.wait_seconds is None
+
+    def wait(self):
+        # DRF пишет Retry-After целым числом секунд с округлением вниз, поэтому округляем вверх здесь
+        return None if self.wait_seconds is None else max(1, math.ceil(self.wait_seconds))
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """Бакет на пользователя; анонимные запросы ограничивает только IPTokenBucketThrottle."""
+
+    def get_ident_key(self, request, view):
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            return None
+        return f'user:{user.pk}'
+
+
+class IPTokenBucketThrottle(TokenBucketThrottle):
+    """Бакет на IP (X-Forwarded-For учитывается по NUM_PROXIES), ставка <scope>_ip."""
+    rate_suffix = '_ip'
+
+    def get_ident_key(self, request, view):
+        return f'ip:{self.get_ident(request)}'
+
+
+class UsernameTokenBucketThrottle(TokenBucketThrottle):
+    """Для входа: бакет на логин, под которым пытаются войти (view.throttle_username), с любых IP."""
+
+    def get_ident_key(self, request, view):
+        username = getattr(view, 'throttle_username', None)
+        # Логин может содержать символы, недопустимые в ключах memcached
+        return f'username:{hashlib.md5(username.encode()).hexdigest()}' if username else None
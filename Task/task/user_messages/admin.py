@@ -1,5 +1,11 @@
 from django.contrib import admin
-from .models import Message
+from .models import Message, OutboxEmail
 # Register your models here.
 
-admin.site.register(Message)
\ No newline at end of file
+admin.site.register(Message)
+
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ['recipient', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at']
+    list_filter = ['status']
\ No newline at end of file
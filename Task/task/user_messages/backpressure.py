@@ -0,0 +1,185 @@
+import asyncio
+import itertools
+import json
+import logging
+import time
+from collections import OrderedDict, deque
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DROP_OLDEST = 'drop_oldest'
+COALESCE = 'coalesce'
+DISCONNECT = 'disconnect'
+POLICIES = (DROP_OLDEST, COALESCE, DISCONNECT)
+
+DEFAULTS = {
+    'LIMIT': 100,
+    'POLICY': DROP_OLDEST,
+    'BATCH_SIZE': 50,
+    'BATCH_DELAY': 0.005,
+}
+
+
+def get_outbound_options():
+    return {**DEFAULTS, **getattr(settings, 'WEBSOCKET_OUTBOUND', {})}
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+class OutboundStats:
+    """Метрики исходящей очереди одного соединения; задержки — время от постановки в очередь до отправки."""
+
+    def __init__(self, window=1000):
+        self.max_queued = 0
+        self.frames = 0
+        self.events = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.delays = deque(maxlen=window)
+
+    def as_dict(self, queued, lag):
+        delays = list(self.delays)
+        return {
+            'queued': queued,
+            'max_queued': self.max_queued,
+            'lag_ms': round(lag * 1000, 3),
+            'frames': self.frames,
+            'events': self.events,
+            'dropped': self.dropped,
+            'coalesced': self.coalesced,
+            'delay_p50_ms': None if not delays else round(percentile(delays, 0.5) * 1000, 3),
+            'delay_p99_ms': None if not delays else round(percentile(delays, 0.99) * 1000, 3),
+            'delay_max_ms': None if not delays else round(max(delays) * 1000, 3),
+        }
+
+
+class OutboundQueueMixin:
+    """
+    Ограниченная исходящая очередь для consumers на AsyncWebsocketConsumer.
+
+    Обработчики событий не ждут send(): queue_send() кладёт событие в очередь
+    соединения и сразу возвращается, а отдельная задача отправляет накопленное
+    пачками — до batch_size событий одним кадром, собирая их в течение
+    batch_delay секунд. Медленный клиент поэтому не задерживает приём из слоя
+    каналов, а память на соединение ограничена outbound_limit событиями.
+
+    При переполнении действует overflow_policy:
+      drop_oldest — отбрасывается самое старое событие;
+      coalesce    — событие с тем же ключом заменяет стоящее в очереди
+                    (на своём месте), иначе отбрасывается самое старое;
+      disconnect  — соединение закрывается с кодом overflow_close_code,
+                    клиент переподключается и догружает пропущенное.
+
+    Значения по умолчанию берутся из settings.WEBSOCKET_OUTBOUND.
+    """
+    outbound_limit = None
+    overflow_policy = None
+    batch_size = None
+    batch_delay = None
+    overflow_close_code = 4008
+
+    def setup_outbound(self):
+        options = get_outbound_options()
+        for name, option in (('outbound_limit', 'LIMIT'), ('overflow_policy', 'POLICY'),
+                             ('batch_size', 'BATCH_SIZE'), ('batch_delay', 'BATCH_DELAY')):
+            if getattr(self, name) is None:
+                setattr(self, name, options[option])
+        if self.overflow_policy not in POLICIES:
+            raise ValueError(f'Неизвестная политика переполнения: {self.overflow_policy}')
+        # ключ -> (время постановки, событие); порядок словаря — порядок отправки
+        self.outbound = OrderedDict()
+        self.outbound_keys = itertools.count()
+        self.outbound_ready = asyncio.Event()
+        self.outbound_task = None
+        self.outbound_closed = False
+        self.outbound_stats = OutboundStats()
+
+    async def queue_send(self, event, key=None):
+        """Ставит событие в очередь; key — ключ склейки для политики coalesce."""
+        if not hasattr(self, 'outbound'):
+            self.setup_outbound()
+        if self.outbound_closed:
+            return
+        stats = self.outbound_stats
+        if key is not None and self.overflow_policy == COALESCE and key in self.outbound:
+            # Время постановки остаётся прежним: задержка считается от первой версии события
+            self.outbound[key] = (self.outbound[key][0], event)
+            stats.coalesced += 1
+            return
+        if len(self.outbound) >= self.outbound_limit:
+            if self.overflow_policy == DISCONNECT:
+                await self.overflow_disconnect()
+                return
+            self.outbound.popitem(last=False)
+            stats.dropped += 1
+        if key is None or key in self.outbound:
+            key = ('auto', next(self.outbound_keys))
+        self.outbound[key] = (time.monotonic(), event)
+        stats.max_queued = max(stats.max_queued, len(self.outbound))
+        self.outbound_ready.set()
+        if self.outbound_task is None:
+            self.outbound_task = asyncio.ensure_future(self.drain_outbound())
+
+    async def drain_outbound(self):
+        while not self.outbound_closed:
+            await self.outbound_ready.wait()
+            if self.batch_delay:
+                # Микропачка: события, пришедшие за batch_delay, уйдут одним кадром
+                await asyncio.sleep(self.batch_delay)
+            while self.outbound and not self.outbound_closed:
+                batch = [self.outbound.popitem(last=False)[1] for _ in range(min(self.batch_size, len(self.outbound)))]
+                try:
+                    await self.send(text_data=self.encode_batch([event for _, event in batch]))
+                except Exception:
+                    logger.exception('websocket: не удалось отправить пачку, соединение закрывается')
+                    self.outbound_closed = True
+                    return
+                now = time.monotonic()
+                self.outbound_stats.frames += 1
+                self.outbound_stats.events += len(batch)
+                self.outbound_stats.delays.extend(now - enqueued for enqueued, _ in batch)
+            self.outbound_ready.clear()
+
+    def encode_batch(self, events):
+        """Текст кадра для пачки событий; consumers переопределяют под свой протокол."""
+        return json.dumps({'type': 'batch', 'events': events})
+
+    async def overflow_disconnect(self):
+        stats = self.outbound_stats
+        stats.dropped += len(self.outbound) + 1
+        self.outbound.clear()
+        self.outbound_closed = True
+        logger.warning('websocket: исходящая очередь переполнена (%s), соединение закрыто', self.outbound_limit)
+        await self.close(code=self.overflow_close_code)
+
+    def outbound_metrics(self):
+        if not hasattr(self, 'outbound'):
+            self.setup_outbound()
+        lag = 0.0
+        if self.outbound:
+            lag = time.monotonic() - next(iter(self.outbound.values()))[0]
+        return self.outbound_stats.as_dict(len(self.outbound), lag)
+
+    async def stop_outbound(self):
+        if not hasattr(self, 'outbound'):
+            return
+        self.outbound_closed = True
+        self.outbound.clear()
+        if self.outbound_task is not None:
+            self.outbound_task.cancel()
+            try:
+                await self.outbound_task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self.outbound_task = None
+
+    async def websocket_disconnect(self, message):
+        await self.stop_outbound()
+        await super().websocket_disconnect(message)
@@ -0,0 +1,346 @@
+import asyncio
+import copy
+import itertools
+import json
+import logging
+import time
+import uuid
+import weakref
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+from channels.layers import BaseChannelLayer
+from django.db import connections
+
+from .models import ChannelGroupMember, ChannelSpill
+
+logger = logging.getLogger(__name__)
+
+
+class PostgresChannelLayer(BaseChannelLayer):
+    """
+    Слой каналов поверх PostgreSQL LISTEN/NOTIFY для нескольких процессов без Redis.
+
+    Каждый процесс слушает свой канал NOTIFY (process_name); имена каналов
+    consumers имеют вид "<process_name>!<id>", поэтому по имени сразу видно,
+    какому процессу отправлять. Участники групп хранятся в таблице
+    ChannelGroupMember и истекают через group_expiry секунд. Сообщения больше
+    spill_threshold байт (лимит NOTIFY — 8000) пишутся в ChannelSpill, а в
+    NOTIFY уходит только их id. Уведомления, отправленные в пределах
+    batch_delay, объединяются в один SELECT pg_notify(...), pg_notify(...).
+
+    Поддерживаются только каналы, созданные new_channel(): именно их
+    используют consumers; общие очереди для воркеров этот слой не реализует.
+
+    Если соединение LISTEN оборвалось (рестарт PostgreSQL, разрыв по простою),
+    слой переподключается и снова выполняет LISTEN с паузами от reconnect_delay
+    до max_reconnect_delay секунд. NOTIFY не хранятся: сообщения, отправленные
+    процессу, пока он не слушал, теряются.
+    """
+    extensions = ['groups', 'flush']
+    reconnect_delay = 0.1
+    max_reconnect_delay = 5.0
+    # Для LISTEN: обрыв без FIN (NAT, балансировщик) обнаруживается по keepalive
+    listener_options = {'keepalives': 1, 'keepalives_idle': 60, 'keepalives_interval': 10, 'keepalives_count': 3}
+
+    def __init__(self, alias='default', expiry=60, group_expiry=86400, capacity=100, channel_capacity=None,
+                 batch_delay=0.002, batch_size=200, spill_threshold=7000, cleanup_interval=60):
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity)
+        self.channel_capacity = self.compile_capacities(self.channel_capacity)
+        self.alias = alias
+        self.group_expiry = group_expiry
+        self.batch_delay = batch_delay
+        self.batch_size = batch_size
+        self.spill_threshold = spill_threshold
+        self.cleanup_interval = cleanup_interval
+        self.process_name = f'chl_{uuid.uuid4().hex}'
+        self.members_table = ChannelGroupMember._meta.db_table
+        self.spill_table = ChannelSpill._meta.db_table
+
+        # Все запросы идут через одно соединение в отдельном потоке
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pg-channel-layer')
+        self.sender = None
+        self.batches = weakref.WeakKeyDictionary()
+        self.sequence = itertools.count()
+        self.last_cleanup = 0.0
+
+        self.listener = None
+        self.listener_fd = None
+        self.listener_loop = None
+        self.listener_lock = None
+        self.dispatcher = None
+        self.reconnecting = None
+        self.inbox = None
+        self.queues = {}
+        self.receiving = defaultdict(int)
+        self.last_prune = 0.0
+
+        self.stats = {'round_trips': 0, 'notifies': 0, 'spilled': 0, 'delivered': 0, 'dropped': 0, 'reconnects': 0}
+
+    # Соединения и запросы
+
+    def connect(self, **options):
+        connection = psycopg2.connect(**{**connections[self.alias].get_connection_params(), **options})
+        connection.autocommit = True
+        return connection
+
+    def run_query(self, sql, params=(), fetch=False):
+        if self.sender is None or self.sender.closed:
+            self.sender = self.connect()
+        with self.sender.cursor() as cursor:
+            cursor.execute(sql, params)
+            self.stats['round_trips'] += 1
+            return cursor.fetchall() if fetch else None
+
+    async def execute(self, sql, params=(), fetch=False):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.run_query, sql, params, fetch)
+
+    async def cleanup(self):
+        now = time.monotonic()
+        if now - self.last_cleanup < self.cleanup_interval:
+            return
+        self.last_cleanup = now
+        await self.execute(f'DELETE FROM {self.members_table} WHERE expires < now(); '
+                           f'DELETE FROM {self.spill_table} WHERE expires < now()')
+
+    # Отправка
+
+    def process_of(self, channel):
+        if '!' not in channel:
+            raise ValueError(f'PostgresChannelLayer поддерживает только каналы из new_channel(): {channel}')
+        return channel[:channel.index('!')]
+
+    async def new_channel(self, prefix='specific'):
+        return f'{self.process_name}!{prefix}.{uuid.uuid4().hex}'
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), 'message is not a dict'
+        self.require_valid_channel_name(channel)
+        await self.deliver({self.process_of(channel): [channel]}, message)
+
+    async def group_add(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        await self.execute(
+            f'INSERT INTO {self.members_table} (group_name, channel_name, process, expires) '
+            f"VALUES (%s, %s, %s, now() + %s * interval '1 second') "
+            f'ON CONFLICT (group_name, channel_name) DO UPDATE SET expires = EXCLUDED.expires',
+            [group, channel, self.process_of(channel), self.group_expiry],
+        )
+        await self.cleanup()
+
+    async def group_discard(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        await self.execute(f'DELETE FROM {self.members_table} WHERE group_name = %s AND channel_name = %s',
+                           [group, channel])
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), 'message is not a dict'
+        self.require_valid_group_name(group)
+        rows = await self.execute(
+            f'SELECT process, channel_name FROM {self.members_table} WHERE group_name = %s AND expires > now()',
+            [group], fetch=True,
+        )
+        targets = defaultdict(list)
+        for process, channel in rows:
+            targets[process].append(channel)
+        if targets:
+            await self.deliver(targets, message)
+
+    async def deliver(self, targets, message):
+        """Отправляет сообщение каналам {процесс: [каналы]}: одно уведомление на процесс."""
+        body = json.dumps(message, separators=(',', ':'))
+        expires = time.time() + self.expiry
+        key = 'm'
+        if len(body.encode()) > self.spill_threshold:
+            rows = await self.execute(
+                f"INSERT INTO {self.spill_table} (payload, expires) VALUES (%s, now() + %s * interval '1 second') "
+                f'RETURNING id',
+                [body, self.expiry], fetch=True,
+            )
+            self.stats['spilled'] += 1
+            key, body = 's', str(rows[0][0])
+
+        notifies = []
+        for process, channels in targets.items():
+            for chunk in self.chunk_channels(channels, len(body)):
+                # n делает payload уникальным: одинаковые NOTIFY в одной транзакции Postgres схлопывает
+                payload = (f'{{"c":{json.dumps(chunk, separators=(",", ":"))},"e":{expires},'
+                           f'"n":{next(self.sequence)},"{key}":{body}}}')
+                notifies.append(self.notify(process, payload))
+        await asyncio.gather(*notifies)
+
+    def chunk_channels(self, channels, body_size):
+        limit = max(self.spill_threshold - body_size, 0) + 256
+        chunk, size = [], 0
+        for channel in channels:
+            if chunk and size + len(channel) + 3 > limit:
+                yield chunk
+                chunk, size = [], 0
+            chunk.append(channel)
+            size += len(channel) + 3
+        if chunk:
+            yield chunk
+
+    async def notify(self, process, payload):
+        loop = asyncio.get_running_loop()
+        batch = self.batches.get(loop)
+        if batch is None:
+            batch = self.batches[loop] = []
+            loop.create_task(self.flush_batch(loop, batch))
+        future = loop.create_future()
+        batch.append((process, payload, future))
+        if len(batch) >= self.batch_size:
+            # Пачка заполнена: следующие уведомления соберутся в новую
+            self.batches.pop(loop, None)
+        await future
+
+    async def flush_batch(self, loop, batch):
+        await asyncio.sleep(self.batch_delay)
+        if self.batches.get(loop) is batch:
+            del self.batches[loop]
+        sql = 'SELECT ' + ', '.join(['pg_notify(%s, %s)'] * len(batch))
+        params = [value for process, payload, _ in batch for value in (process, payload)]
+        try:
+            await self.execute(sql, params)
+        except Exception as exc:
+            for *_, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        self.stats['notifies'] += len(batch)
+        for *_, future in batch:
+            if not future.done():
+                future.set_result(None)
+
+    # Приём
+
+    async def receive(self, channel):
+        self.require_valid_channel_name(channel)
+        if self.process_of(channel) != self.process_name:
+            raise ValueError(f'Канал {channel} принадлежит другому процессу')
+        await self.ensure_listener()
+        queue = self.queues.setdefault(channel, asyncio.Queue())
+        self.receiving[channel] += 1
+        try:
+            while True:
+                expires, message = await queue.get()
+                if expires >= time.time():
+                    return message
+        finally:
+            self.receiving[channel] -= 1
+            if not self.receiving[channel]:
+                del self.receiving[channel]
+
+    async def ensure_listener(self):
+        if self.listener_lock is None:
+            self.listener_lock = asyncio.Lock()
+        async with self.listener_lock:
+            if self.listener is not None:
+                return
+            loop = asyncio.get_running_loop()
+            listener = await loop.run_in_executor(self.executor, lambda: self.connect(**self.listener_options))
+            with listener.cursor() as cursor:
+                cursor.execute(f'LISTEN "{self.process_name}"')
+            # Очередь и разборщик переживают переподключение: полученное до обрыва не теряется
+            if self.inbox is None:
+                self.inbox = asyncio.Queue()
+            # Дескриптор запоминается: у оборванного соединения fileno() уже недоступен
+            self.listener_fd = listener.fileno()
+            loop.add_reader(self.listener_fd, self.on_notify)
+            self.listener, self.listener_loop = listener, loop
+            if self.dispatcher is None or self.dispatcher.done():
+                self.dispatcher = loop.create_task(self.dispatch())
+
+    def on_notify(self):
+        try:
+            self.listener.poll()
+        except psycopg2.Error:
+            logger.warning('channel layer: соединение LISTEN потеряно, переподключение', exc_info=True)
+            self.drop_listener()
+            self.reconnecting = self.listener_loop.create_task(self.reconnect())
+            return
+        while self.listener.notifies:
+            self.inbox.put_nowait(self.listener.notifies.pop(0).payload)
+
+    def drop_listener(self):
+        listener, self.listener = self.listener, None
+        # До close(): иначе новое соединение может получить тот же номер дескриптора
+        self.listener_loop.remove_reader(self.listener_fd)
+        listener.close()
+
+    async def reconnect(self):
+        delay = self.reconnect_delay
+        while self.listener is None:
+            try:
+                await self.ensure_listener()
+            except (psycopg2.Error, OSError):
+                logger.warning('channel layer: не удалось восстановить LISTEN, повтор через %.1f с', delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+        self.stats['reconnects'] += 1
+
+    async def dispatch(self):
+        # Уведомления разбираются по одному, чтобы сохранить порядок и для вынесенных в ChannelSpill
+        while True:
+            payload = json.loads(await self.inbox.get())
+            try:
+                if 's' in payload:
+                    rows = await self.execute(f'SELECT payload FROM {self.spill_table} WHERE id = %s',
+                                              [payload['s']], fetch=True)
+                    if not rows:
+                        continue
+                    message = json.loads(rows[0][0])
+                else:
+                    message = payload['m']
+            except Exception:
+                logger.exception('channel layer: не удалось получить сообщение %s', payload.get('s'))
+                continue
+            for index, channel in enumerate(payload['c']):
+                self.put(channel, payload['e'], message if index == 0 else copy.deepcopy(message))
+            self.prune_queues()
+
+    def put(self, channel, expires, message):
+        queue = self.queues.setdefault(channel, asyncio.Queue())
+        if queue.qsize() >= self.get_capacity(channel):
+            self.stats['dropped'] += 1
+            logger.warning('channel layer: канал %s переполнен, сообщение отброшено', channel)
+            return
+        queue.put_nowait((expires, message))
+        self.stats['delivered'] += 1
+
+    def prune_queues(self):
+        # Очереди каналов, которые никто не читает (consumer отключился), удаляются после истечения сообщений
+        now = time.time()
+        if now - self.last_prune < self.expiry:
+            return
+        self.last_prune = now
+        for channel, queue in list(self.queues.items()):
+            if channel in self.receiving:
+                continue
+            while not queue.empty() and queue._queue[0][0] < now:
+                queue.get_nowait()
+            if queue.empty():
+                del self.queues[channel]
+
+    # Обслуживание
+
+    async def flush(self):
+        self.queues.clear()
+        await self.execute(f'DELETE FROM {self.members_table}; DELETE FROM {self.spill_table}')
+
+    async def close(self):
+        if self.reconnecting is not None:
+            self.reconnecting.cancel()
+            self.reconnecting = None
+        if self.listener is not None:
+            self.drop_listener()
+        if self.dispatcher is not None:
+            self.dispatcher.cancel()
+            self.dispatcher = None
+        if self.sender is not None:
+            self.executor.submit(self.sender.close).result()
+            self.sender = None
@@ -1,7 +1,72 @@
-from channels.generic.websocket import AsyncWebsocketConsumer
+from channels.db import database_sync_to_async
+from channels.exceptions import StopConsumer
+from channels.generic.http import AsyncHttpConsumer
+from channels.generic.websocket import AsyncJsonWebsocketConsumer, AsyncWebsocketConsumer
+from urllib.parse import parse_qs
+import asyncio
 import json
+import re
+import time
+
+from corsheaders.conf import conf as cors_conf
+
+from .backpressure import OutboundQueueMixin
+from .models import Message
+from .notifications import get_resume_limit, get_stream_options, message_payload, user_group
+
+
+@database_sync_to_async
+def get_missed(user_id, after, key='sequence'):
+    """
+    Сообщения пользователя с key больше after (не больше лимита) и признак, что остались ещё.
+
+    По sequence возвращаются и сообщения, дополненные склейкой после after;
+    key='id' оставлен для клиентов, продолжающих по last_id.
+    """
+    limit = get_resume_limit()
+    messages = list(Message.objects.filter(owner_id=user_id, **{f'{key}__gt': after}).order_by(key)[:limit + 1])
+    return [message_payload(message) for message in messages[:limit]], len(messages) > limit
+
+
+def is_resumed(resumed, payload):
+    """Живое уведомление уже отправлено догрузкой в той же или более новой версии."""
+    return resumed.get(payload['id'], 0) >= payload['sequence']
+
+
+def cors_headers(scope, preflight=False, extra_headers=()):
+    """
+    Заголовки CORS для HTTP-consumer по тем же настройкам, что и у corsheaders:
+    маршруты channels минуют middleware Django. Пусто, если Origin нет или он не разрешён.
+    """
+    origin = dict(scope.get('headers', [])).get(b'origin', b'').decode('latin1')
+    if not origin or not re.match(cors_conf.CORS_URLS_REGEX, scope.get('path', '')):
+        return []
+    allowed = (
+        cors_conf.CORS_ALLOW_ALL_ORIGINS
+        or origin in cors_conf.CORS_ALLOWED_ORIGINS
+        or any(re.match(pattern, origin) for pattern in cors_conf.CORS_ALLOWED_ORIGIN_REGEXES)
+    )
+    if not allowed:
+        return []
+    if cors_conf.CORS_ALLOW_ALL_ORIGINS and not cors_conf.CORS_ALLOW_CREDENTIALS:
+        headers = [(b'Access-Control-Allow-Origin', b'*')]
+    else:
+        headers = [(b'Access-Control-Allow-Origin', origin.encode('latin1')), (b'Vary', b'Origin')]
+    if cors_conf.CORS_ALLOW_CREDENTIALS:
+        headers.append((b'Access-Control-Allow-Credentials', b'true'))
+    if preflight:
+        headers += [
+            (b'Access-Control-Allow-Headers', ', '.join([*cors_conf.CORS_ALLOW_HEADERS, *extra_headers]).encode()),
+            (b'Access-Control-Allow-Methods', ', '.join(cors_conf.CORS_ALLOW_METHODS).encode()),
+        ]
+        if cors_conf.CORS_PREFLIGHT_MAX_AGE:
+            headers.append((b'Access-Control-Max-Age', str(cors_conf.CORS_PREFLIGHT_MAX_AGE).encode()))
+    return headers
+
 
 class YourConsumer(AsyncWebsocketConsumer):
+    # Эхо-сокет ws/some_path/ отвечает кадром {"message": ...} на каждое сообщение
+    # клиента: очередь OutboundQueueMixin склеивала бы их в пачки и меняла протокол
     async def connect(self):
         await self.accept()
 
@@ -14,4 +79,188 @@ class YourConsumer(AsyncWebsocketConsumer):
 
         await self.send(text_data=json.dumps({
             'message': message
-        }))
\ No newline at end of file
+        }))
+
+
+class NotificationConsumer(OutboundQueueMixin, AsyncJsonWebsocketConsumer):
+    """
+    Новые уведомления пользователя в реальном времени.
+
+    Сокет подписывается на группу пользователя, куда push_messages() отправляет
+    сообщения после коммита. Чтобы не потерять сообщения за время разрыва,
+    клиент передаёт sequence последнего полученного сообщения (?last_sequence=
+    при подключении или {"type": "resume", "last_sequence": N}) и получает
+    пропущенные, в том числе дополненные склейкой. Прежний last_id продолжает
+    работать, но склейки в уже полученные сообщения по нему не догружаются.
+
+    Живые уведомления идут через ограниченную очередь (OutboundQueueMixin):
+    несколько событий склеиваются в один кадр "messages", новая версия того
+    же сообщения (склейка обновлений задачи) заменяет стоящую в очереди.
+    {"type": "stats"} возвращает метрики очереди соединения.
+    """
+    unauthorized_code = 4401
+    overflow_policy = 'coalesce'
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.close(code=self.unauthorized_code)
+            return
+        self.user_id = user.id
+        self.group_name = user_group(user.id)
+        # id -> sequence, уже отправленные при догрузке: их не нужно дублировать из группы
+        self.resumed = {}
+        # Подписка до догрузки, чтобы не пропустить сообщения, закоммиченные между ними
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        for key in ('sequence', 'id'):
+            if query.get(f'last_{key}'):
+                await self.resume(query[f'last_{key}'][0], key)
+                break
+
+    async def disconnect(self, close_code):
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def receive_json(self, content):
+        if isinstance(content, dict) and content.get('type') == 'resume':
+            if 'last_id' in content and 'last_sequence' not in content:
+                await self.resume(content['last_id'], 'id')
+            else:
+                await self.resume(content.get('last_sequence'))
+        elif isinstance(content, dict) and content.get('type') == 'stats':
+            await self.send_json({'type': 'stats', 'outbound': self.outbound_metrics()})
+        else:
+            await self.send_json({'type': 'error', 'detail': 'Неизвестный тип сообщения.'})
+
+    async def resume(self, after, key='sequence'):
+        try:
+            after = int(after)
+        except (TypeError, ValueError):
+            await self.send_json({'type': 'error', 'detail': f'last_{key} должен быть целым числом.'})
+            return
+        payloads, more = await get_missed(self.user_id, after, key)
+        self.resumed.update((payload['id'], payload['sequence']) for payload in payloads)
+        # more=True: пропущено больше лимита, клиент повторяет resume с последним sequence (id)
+        await self.send_json({'type': 'messages', 'messages': payloads, 'more': more})
+
+    async def notification_messages(self, event):
+        for payload in event['messages']:
+            # Склейка в уже догруженное сообщение приходит с большим sequence и не отбрасывается
+            if not is_resumed(self.resumed, payload):
+                await self.queue_send(payload, key=payload['id'])
+
+    def encode_batch(self, events):
+        return json.dumps({'type': 'messages', 'messages': events})
+
+
+
+class NotificationStreamConsumer(AsyncHttpConsumer):
+    """
+    Поток уведомлений в формате Server-Sent Events для клиентов за прокси без WebSocket.
+
+    Работает как NotificationConsumer: подписка на группу пользователя до
+    догрузки, затем пропущенные сообщения после Last-Event-ID (или ?last_id=)
+    и новые из группы. id события — Message.sequence, поэтому EventSource сам
+    продолжает с последнего полученного при переподключении и получает
+    сообщения, дополненные склейкой за время разрыва. Пока событий нет,
+    раз в heartbeat секунд уходит комментарий, чтобы прокси не закрыл
+    соединение. Через max_duration секунд поток завершается, и клиент
+    переподключается: так не копятся потоки клиентов, пропавших без закрытия.
+
+    CORS (фронтенд на другом origin) отдаётся здесь же по настройкам
+    corsheaders: его middleware до consumers channels не доходит.
+    """
+    # Полифилы EventSource передают Last-Event-ID заголовком, и для него нужен preflight
+    cors_extra_headers = ('last-event-id', )
+
+    async def http_request(self, message):
+        # В отличие от AsyncHttpConsumer ответ не завершается после handle():
+        # consumer продолжает принимать события группы до http.disconnect
+        if 'body' in message:
+            self.body.append(message['body'])
+        if not message.get('more_body'):
+            await self.handle(b''.join(self.body))
+
+    async def handle(self, body):
+        cors = cors_headers(self.scope)
+        if self.scope['method'] == 'OPTIONS':
+            await self.send_response(200, b'', headers=cors_headers(
+                self.scope, preflight=True, extra_headers=self.cors_extra_headers,
+            ))
+            raise StopConsumer()
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.send_response(401, json.dumps({'detail': 'Учетные данные не были предоставлены.'}).encode(),
+                                     headers=[(b'Content-Type', b'application/json'), *cors])
+            raise StopConsumer()
+        self.user_id = user.id
+        self.group_name = user_group(user.id)
+        self.options = get_stream_options()
+        self.resumed = {}
+        self.finished = False
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.send_headers(headers=[
+            (b'Content-Type', b'text/event-stream'),
+            (b'Cache-Control', b'no-cache'),
+            # nginx не должен буферизовать поток
+            (b'X-Accel-Buffering', b'no'),
+            *cors,
+        ])
+        await self.send_body(f"retry: {self.options['retry']}\n\n".encode(), more_body=True)
+
+        last_sequence = self.get_last_event_id()
+        if last_sequence is not None:
+            more = True
+            while more:
+                payloads, more = await get_missed(self.user_id, last_sequence)
+                if payloads:
+                    self.resumed.update((payload['id'], payload['sequence']) for payload in payloads)
+                    last_sequence = payloads[-1]['sequence']
+                    await self.send_events(payloads)
+        self.heartbeat_task = asyncio.ensure_future(self.heartbeat())
+
+    def get_last_event_id(self):
+        headers = dict(self.scope.get('headers', []))
+        value = headers.get(b'last-event-id', b'').decode()
+        if not value:
+            value = parse_qs(self.scope.get('query_string', b'').decode()).get('last_id', [''])[0]
+        try:
+            return int(value)
+        except ValueError:
+            return None
+
+    async def send_events(self, payloads):
+        chunk = ''.join(
+            f'id: {payload["sequence"]}\nevent: message\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n'
+            for payload in payloads
+        )
+        await self.send_body(chunk.encode(), more_body=True)
+
+    async def heartbeat(self):
+        deadline = time.monotonic() + self.options['max_duration']
+        while True:
+            await asyncio.sleep(min(self.options['heartbeat'], max(deadline - time.monotonic(), 0)))
+            if time.monotonic() >= deadline:
+                break
+            await self.send_body(b': heartbeat\n\n', more_body=True)
+        self.finished = True
+        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        await self.send_body(b'')
+
+    async def notification_messages(self, event):
+        if getattr(self, 'finished', True):
+            return
+        payloads = [payload for payload in event['messages'] if not is_resumed(self.resumed, payload)]
+        if payloads:
+            await self.send_events(payloads)
+
+    async def disconnect(self):
+        task = getattr(self, 'heartbeat_task', None)
+        if task is not None and not task.done():
+            task.cancel()
+        if hasattr(self, 'group_name') and not self.finished:
+            self.finished = True
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
@@ -0,0 +1,21 @@
+import django_filters
+
+from task.filters import IndexedOrderingFilter
+from .models import Message
+
+
+class MessageFilter(django_filters.FilterSet):
+    # NumberFilter вместо ModelChoiceFilter: не нужен лишний запрос на проверку id
+    owner = django_filters.NumberFilter(field_name='owner')
+    project = django_filters.NumberFilter(field_name='project')
+    task = django_filters.NumberFilter(field_name='task')
+    # ?unread=true: read_at IS NULL, обслуживается индексом (owner, read_at, created)
+    unread = django_filters.BooleanFilter(field_name='read_at', lookup_expr='isnull')
+    ordering = IndexedOrderingFilter(
+        indexed={'created': ('owner', 'project', 'task')},
+        downgraded=('title',),
+    )
+
+    class Meta:
+        model = Message
+        fields = ['owner', 'project', 'task']
@@ -0,0 +1,111 @@
+from collections import Counter
+from functools import reduce
+from operator import or_
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import serializers
+
+from task.response_cache import bump
+from .models import Message, UnreadCounter
+
+MAX_SELECTION = 1000
+
+
+def adjust_unread(deltas):
+    """
+    Меняет счётчики непрочитанных {user_id: delta}. Увеличения — upsert,
+    уменьшения — UPDATE с нижней границей 0, как в main.counters.apply_delta.
+    """
+    deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    table = connection.ops.quote_name(UnreadCounter._meta.db_table)
+    increments = [(user_id, delta) for user_id, delta in deltas.items() if delta > 0]
+    decrements = [(user_id, delta) for user_id, delta in deltas.items() if delta < 0]
+    with transaction.atomic(), connection.cursor() as cursor:
+        if increments:
+            rows = ', '.join(['(%s, %s)'] * len(increments))
+            cursor.execute(
+                f'INSERT INTO {table} (user_id, unread) VALUES {rows} '
+                f'ON CONFLICT (user_id) DO UPDATE SET unread = {table}.unread + EXCLUDED.unread',
+                [value for row in increments for value in row],
+            )
+        if decrements:
+            rows = ', '.join(['(%s, %s)'] * len(decrements))
+            cursor.execute(
+                f'UPDATE {table} SET unread = GREATEST({table}.unread + d.delta, 0) '
+                f'FROM (VALUES {rows}) AS d (user_id, delta) WHERE {table}.user_id = d.user_id',
+                [value for row in decrements for value in row],
+            )
+
+
+def forget_messages(rows):
+    """Обновляет счётчики непрочитанных и версии кэша после удаления сообщений (словари из values())."""
+    deltas = Counter()
+    for row in rows:
+        if row['read_at'] is None:
+            deltas[row['owner_id']] -= 1
+    adjust_unread(deltas)
+    bump('messages', *{f"user:{row['owner_id']}" for row in rows}, *{f"project:{row['project_id']}" for row in rows})
+
+
+def get_unread(user_id):
+    return UnreadCounter.objects.filter(user_id=user_id).values_list('unread', flat=True).first() or 0
+
+
+class MessageSelectionSerializer(serializers.Serializer):
+    """Выбор сообщений: отдельные id и/или включительные диапазоны [от, до]."""
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, max_length=MAX_SELECTION)
+    ranges = serializers.ListField(
+        child=serializers.ListField(child=serializers.IntegerField(), min_length=2, max_length=2),
+        required=False, max_length=100,
+    )
+
+    def validate_ranges(self, value):
+        for start, end in value:
+            if start > end:
+                raise serializers.ValidationError(f'Некорректный диапазон: [{start}, {end}].')
+        return value
+
+    def validate(self, attrs):
+        if not attrs.get('ids') and not attrs.get('ranges'):
+            raise serializers.ValidationError('Нужно передать ids или ranges.')
+        return attrs
+
+    def get_filter(self):
+        conditions = [Q(id__range=(start, end)) for start, end in self.validated_data.get('ranges', [])]
+        if self.validated_data.get('ids'):
+            conditions.append(Q(id__in=self.validated_data['ids']))
+        return reduce(or_, conditions)
+
+
+@transaction.atomic
+def mark_read(user_id, selection):
+    """Отмечает прочитанными непрочитанные сообщения пользователя из selection (Q); возвращает их число."""
+    count = (Message.objects.filter(selection, owner_id=user_id, read_at__isnull=True)
+             .update(read_at=timezone.now()))
+    if count:
+        adjust_unread({user_id: -count})
+        bump('messages', f'user:{user_id}')
+    return count
+
+
+@transaction.atomic
+def delete_messages(user_id, selection):
+    """
+    Удаляет сообщения пользователя из selection одним DELETE ... RETURNING,
+    без загрузки объектов и сигналов на каждую строку; возвращает их число.
+    """
+    ids = Message.objects.filter(selection, owner_id=user_id).values('id')
+    sql, params = ids.query.sql_with_params()
+    table = connection.ops.quote_name(Message._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE id IN ({sql}) RETURNING read_at IS NULL', params)
+        rows = cursor.fetchall()
+    unread = sum(1 for row in rows if row[0])
+    if rows:
+        adjust_unread({user_id: -unread})
+        bump('messages', f'user:{user_id}')
+    return len(rows)
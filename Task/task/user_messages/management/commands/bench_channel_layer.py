@@ -0,0 +1,100 @@
+import asyncio
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from user_messages.channel_layer import PostgresChannelLayer
+
+GROUP = 'bench'
+
+
+def run_worker(channels, messages, ready, results, timeout):
+    async def main():
+        layer = PostgresChannelLayer(capacity=messages)
+        names = [await layer.new_channel() for _ in range(channels)]
+        for name in names:
+            await layer.group_add(GROUP, name)
+        await layer.ensure_listener()
+        ready.put(True)
+
+        async def consume(name):
+            received, last = 0, None
+            try:
+                for _ in range(messages):
+                    await asyncio.wait_for(layer.receive(name), timeout)
+                    received += 1
+                    last = time.time()
+            except asyncio.TimeoutError:
+                pass
+            return received, last
+
+        try:
+            counts = await asyncio.gather(*(consume(name) for name in names))
+        finally:
+            for name in names:
+                await layer.group_discard(GROUP, name)
+            await layer.close()
+        results.put((sum(received for received, _ in counts), max((last or 0 for _, last in counts), default=0)))
+
+    asyncio.run(main())
+
+
+class Command(BaseCommand):
+    help = 'Замеряет пропускную способность PostgresChannelLayer (сообщений/с) на нескольких процессах'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Число процессов-получателей')
+        parser.add_argument('--channels', type=int, default=5, help='Каналов в группе на процесс')
+        parser.add_argument('--messages', type=int, default=1000, help='Сколько group_send отправить')
+        parser.add_argument('--size', type=int, default=200, help='Размер текста сообщения, байт')
+        parser.add_argument('--concurrency', type=int, default=50, help='Одновременных group_send')
+        parser.add_argument('--timeout', type=float, default=10.0)
+
+    def handle(self, *args, workers, channels, messages, size, concurrency, timeout, **options):
+        # Дочерние процессы открывают свои соединения
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        ready, results = context.Queue(), context.Queue()
+        processes = [
+            context.Process(target=run_worker, args=(channels, messages, ready, results, timeout))
+            for _ in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        for _ in processes:
+            ready.get(timeout=30)
+
+        layer = PostgresChannelLayer()
+        text = 'x' * size
+
+        async def send_all():
+            started = time.time()
+            for offset in range(0, messages, concurrency):
+                await asyncio.gather(*(
+                    layer.group_send(GROUP, {'type': 'bench.message', 'i': i, 'text': text})
+                    for i in range(offset, min(offset + concurrency, messages))
+                ))
+            sent = time.time()
+            await layer.close()
+            return started, sent
+
+        started, sent = asyncio.run(send_all())
+        reports = [results.get(timeout=timeout * 2 + messages) for _ in processes]
+        for process in processes:
+            process.join()
+
+        delivered = sum(received for received, _ in reports)
+        finished = max((last for _, last in reports if last), default=sent)
+        expected = workers * channels * messages
+        elapsed = max(finished - started, 1e-9)
+        self.stdout.write(
+            f'workers={workers} channels={workers * channels} group_send={messages} size={size}\n'
+            f'send: {messages / max(sent - started, 1e-9):.0f} group_send/s, '
+            f'round_trips={layer.stats["round_trips"]} notifies={layer.stats["notifies"]} '
+            f'spilled={layer.stats["spilled"]}\n'
+            f'delivered: {delivered}/{expected} in {elapsed:.3f}s = {delivered / elapsed:.0f} messages/s'
+        )
+        if delivered < expected:
+            self.stdout.write(self.style.WARNING('Часть сообщений не доставлена (переполнение или таймаут)'))
@@ -0,0 +1,152 @@
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from autobahn.asyncio.websocket import WebSocketClientFactory, WebSocketClientProtocol
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from user_messages.backpressure import percentile
+from user_messages.channel_layer import PostgresChannelLayer
+from user_messages.notifications import user_group
+from users.models import User
+
+
+class LoadClient(WebSocketClientProtocol):
+    def onOpen(self):
+        self.factory.report.opened += 1
+
+    def onMessage(self, payload, is_binary):
+        received = time.time()
+        frame = json.loads(payload)
+        report = self.factory.report
+        report.frames += 1
+        for message in frame.get('messages', []):
+            # created — время отправки group_send в процессе нагрузочного теста
+            report.latencies.append(received - datetime.fromisoformat(message['created']).timestamp())
+
+    def onClose(self, was_clean, code, reason):
+        if self.factory.report.running:
+            self.factory.report.closed += 1
+
+
+class Report:
+    def __init__(self):
+        self.opened = 0
+        self.closed = 0
+        self.frames = 0
+        self.latencies = []
+        self.running = True
+
+
+def wait_for_port(host, port, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise CommandError(f'daphne не поднялся на {host}:{port} за {timeout} с')
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный тест ws/notifications/: открывает тысячи локальных соединений к daphne, '
+            'рассылает уведомления через PostgresChannelLayer и считает задержку доставки (p50/p99)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=1000)
+        parser.add_argument('--messages', type=int, default=100, help='Сколько group_send отправить')
+        parser.add_argument('--rate', type=float, default=50.0, help='group_send в секунду')
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--no-spawn', action='store_true',
+                            help='Не запускать daphne: сервер уже работает с CHANNEL_LAYER=postgres')
+        parser.add_argument('--connect-concurrency', type=int, default=200)
+        parser.add_argument('--timeout', type=float, default=30.0)
+
+    def handle(self, *args, connections, messages, rate, host, port, no_spawn, connect_concurrency, timeout,
+               **options):
+        user, _ = User.objects.get_or_create(username='loadtest', defaults={'email': 'loadtest@example.com'})
+        token = str(AccessToken.for_user(user))
+        server = None
+        if not no_spawn:
+            # Уведомления публикуются из этого процесса, поэтому daphne должен слушать общий слой
+            env = {**os.environ, 'CHANNEL_LAYER': 'postgres'}
+            server = subprocess.Popen(
+                [sys.executable, '-m', 'daphne', '-b', host, '-p', str(port), settings.ASGI_APPLICATION.replace(
+                    '.application', ':application')],
+                cwd=settings.BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+        try:
+            wait_for_port(host, port, timeout)
+            report = asyncio.run(self.run(user.id, token, connections, messages, rate, host, port,
+                                          connect_concurrency, timeout))
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+        expected = report.opened * messages
+        latencies = report.latencies
+        self.stdout.write(
+            f'connections={connections} opened={report.opened} closed={report.closed} '
+            f'group_send={messages} rate={rate:.0f}/s\n'
+            f'delivered: {len(latencies)}/{expected} in {report.frames} frames'
+        )
+        if latencies:
+            self.stdout.write(
+                'latency ms: '
+                f'p50={percentile(latencies, 0.5) * 1000:.1f} p95={percentile(latencies, 0.95) * 1000:.1f} '
+                f'p99={percentile(latencies, 0.99) * 1000:.1f} max={max(latencies) * 1000:.1f}'
+            )
+        if len(latencies) < expected:
+            self.stdout.write(self.style.WARNING('Часть уведомлений не доставлена (переполнение или таймаут)'))
+
+    async def run(self, user_id, token, connections, messages, rate, host, port, connect_concurrency, timeout):
+        loop = asyncio.get_running_loop()
+        report = Report()
+        factory = WebSocketClientFactory(f'ws://{host}:{port}/ws/notifications/?token={token}')
+        factory.protocol = LoadClient
+        factory.report = report
+        semaphore = asyncio.Semaphore(connect_concurrency)
+
+        async def open_connection():
+            async with semaphore:
+                _, protocol = await loop.create_connection(factory, host, port)
+                await protocol.is_open
+                return protocol
+
+        results = await asyncio.gather(*(open_connection() for _ in range(connections)), return_exceptions=True)
+        protocols = [result for result in results if not isinstance(result, BaseException)]
+        # Подписка на группу происходит до accept, но даём серверу закончить рукопожатия
+        await asyncio.sleep(1)
+
+        layer = PostgresChannelLayer()
+        group = user_group(user_id)
+        interval = 1 / rate if rate else 0
+        for i in range(messages):
+            await layer.group_send(group, {
+                'type': 'notification.messages',
+                'messages': [{'id': i + 1, 'title': f'Load {i}', 'project': None, 'task': None,
+                              'created': datetime.now().astimezone().isoformat()}],
+            })
+            if interval:
+                await asyncio.sleep(interval)
+        await layer.close()
+
+        expected = len(protocols) * messages
+        deadline = time.monotonic() + timeout
+        while len(report.latencies) < expected and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        report.running = False
+        for protocol in protocols:
+            protocol.sendClose()
+        await asyncio.sleep(0.5)
+        return report
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from user_messages.partitioning import convert_to_partitioned, ensure_partitions, is_partitioned
+
+
+class Command(BaseCommand):
+    help = ('Помесячное секционирование таблицы сообщений (PostgreSQL): --convert переводит таблицу, '
+            'без него создаются секции на будущие месяцы (запускать по расписанию)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--convert', action='store_true', help='Перевести таблицу на секции (блокирует её)')
+        parser.add_argument('--months-ahead', type=int, default=3)
+
+    def handle(self, *args, convert=False, months_ahead=3, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Секционирование поддерживается только на PostgreSQL')
+        if convert:
+            if convert_to_partitioned(months_ahead=months_ahead):
+                self.stdout.write(self.style.SUCCESS('Таблица сообщений переведена на секции'))
+            else:
+                self.stdout.write('Таблица уже секционирована')
+            return
+        if not is_partitioned():
+            raise CommandError('Таблица не секционирована: запустите с --convert')
+        created = ensure_partitions(months_ahead=months_ahead)
+        self.stdout.write(self.style.SUCCESS(f'Создано секций: {len(created)}'))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from user_messages.retention import MessageArchive, count_expired, get_policy, purge_expired
+
+
+class Command(BaseCommand):
+    help = ('Удаляет сообщения старше срока хранения (MESSAGE_RETENTION) пачками в коротких транзакциях, '
+            'предварительно сохраняя их в gzip JSONL')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--max-batches', type=int, default=None, help='Остановиться после N пачек')
+        parser.add_argument('--pause', type=float, default=None, help='Пауза между пачками, сек')
+        parser.add_argument('--archive-dir', default=None, help='Каталог архива (по умолчанию ARCHIVE_DIR)')
+        parser.add_argument('--no-archive', action='store_true', help='Удалять без архивации')
+        parser.add_argument('--dry-run', action='store_true', help='Только посчитать устаревшие сообщения')
+
+    def handle(self, *args, batch_size=None, max_batches=None, pause=None, archive_dir=None, no_archive=False,
+               dry_run=False, **options):
+        if dry_run:
+            self.stdout.write(f'expired: {count_expired()}')
+            return
+
+        if no_archive:
+            stats = purge_expired(batch_size=batch_size, max_batches=max_batches, pause=pause)
+        else:
+            with MessageArchive(archive_dir or get_policy()['ARCHIVE_DIR']) as archive:
+                stats = purge_expired(batch_size=batch_size, max_batches=max_batches, pause=pause, archive=archive)
+            self.stdout.write(f'archive: {archive.path}')
+        self.stdout.write(self.style.SUCCESS(f'total: {stats}'))
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from user_messages.outbox import OutboxStats, deliver_batch
+
+
+class Command(BaseCommand):
+    help = 'Отправляет письма из outbox пачками через одно SMTP-соединение на пачку'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--loop', action='store_true', help='Работать постоянно, опрашивая outbox')
+        parser.add_argument('--interval', type=float, default=5.0, help='Пауза между опросами пустого outbox, сек')
+
+    def handle(self, *args, batch_size=None, loop=False, interval=5.0, **options):
+        total = OutboxStats()
+        while True:
+            stats = deliver_batch(batch_size=batch_size)
+            total += stats
+            if stats.claimed:
+                self.stdout.write(f'batch: {stats}')
+                continue
+            if not loop:
+                break
+            time.sleep(interval)
+        self.stdout.write(self.style.SUCCESS(f'total: {total}'))
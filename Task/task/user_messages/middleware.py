@@ -0,0 +1,49 @@
+from urllib.parse import parse_qs
+
+from channels.auth import AuthMiddlewareStack
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from users.authentication import CachedJWTAuthentication
+
+
+@database_sync_to_async
+def get_jwt_user(raw_token):
+    authentication = CachedJWTAuthentication()
+    try:
+        return authentication.get_user(authentication.get_validated_token(raw_token))
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return AnonymousUser()
+
+
+def get_raw_token(scope):
+    token = parse_qs(scope.get('query_string', b'').decode()).get('token')
+    if token:
+        return token[0]
+    for name, value in scope.get('headers', []):
+        if name == b'authorization':
+            parts = value.decode().split()
+            if len(parts) == 2 and parts[0] == 'Bearer':
+                return parts[1]
+    return None
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Аутентификация WebSocket и потоков SSE по access-токену из ?token= (браузер
+    не может передать заголовок Authorization ни при открытии сокета, ни из
+    EventSource) или из заголовка Authorization: Bearer. Без токена остаётся
+    пользователь сессии, выставленный AuthMiddlewareStack.
+    """
+
+    async def __call__(self, scope, receive, send):
+        token = get_raw_token(scope)
+        if token:
+            scope = dict(scope, user=await get_jwt_user(token))
+        return await super().__call__(scope, receive, send)
+
+
+def JWTAuthMiddlewareStack(inner):
+    return AuthMiddlewareStack(JWTAuthMiddleware(inner))
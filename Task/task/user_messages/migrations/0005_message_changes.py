@@ -0,0 +1,18 @@
+# Generated by Django 4.2.11 on 2026-10-18 19:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_messages', '0004_outboxemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='changes',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
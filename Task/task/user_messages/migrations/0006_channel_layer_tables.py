@@ -0,0 +1,38 @@
+# Generated by Django 4.2.11 on 2026-10-18 19:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_messages', '0005_message_changes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChannelSpill',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payload', models.TextField()),
+                ('expires', models.DateTimeField(db_index=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ChannelGroupMember',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('group_name', models.CharField(max_length=100)),
+                ('channel_name', models.CharField(max_length=100)),
+                ('process', models.CharField(max_length=63)),
+                ('expires', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['expires'], name='channel_group_expires_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='channelgroupmember',
+            constraint=models.UniqueConstraint(fields=('group_name', 'channel_name'), name='channel_group_member_unique'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.11 on 2026-10-18 19:51
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_unread(apps, schema_editor):
+    # Все существующие сообщения считаются непрочитанными
+    Message = apps.get_model('user_messages', 'Message')
+    UnreadCounter = apps.get_model('user_messages', 'UnreadCounter')
+    UnreadCounter.objects.bulk_create(
+        UnreadCounter(user_id=row['owner_id'], unread=row['count'])
+        for row in Message.objects.values('owner_id').annotate(count=models.Count('id')).order_by()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('user_messages', '0006_channel_layer_tables'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnreadCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='unread_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('unread', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='read_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['owner', 'read_at', 'created'], name='message_owner_read_idx'),
+        ),
+        migrations.RunPython(populate_unread, migrations.RunPython.noop),
+    ]
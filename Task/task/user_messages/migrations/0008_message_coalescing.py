@@ -0,0 +1,23 @@
+# Generated by Django 4.2.11 on 2026-10-18 20:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_messages', '0007_inbox_read_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='coalesce_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='updates',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,40 @@
+from django.db import migrations, models
+import user_messages.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_messages', '0008_message_coalescing'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE SEQUENCE user_messages_message_sequence',
+            'DROP SEQUENCE user_messages_message_sequence',
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='sequence',
+            field=user_messages.models.SequenceField(null=True, sequence='user_messages_message_sequence'),
+        ),
+        # У существующих сообщений номер совпадает с id: сохранённые клиентами
+        # last_id и Last-Event-ID остаются верными точками продолжения
+        migrations.RunSQL(
+            """
+            UPDATE user_messages_message SET sequence = id;
+            SELECT setval('user_messages_message_sequence', COALESCE(MAX(id), 0) + 1, false)
+            FROM user_messages_message;
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.AlterField(
+            model_name='message',
+            name='sequence',
+            field=user_messages.models.SequenceField(sequence='user_messages_message_sequence'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['owner', 'sequence'], name='message_owner_sequence_idx'),
+        ),
+    ]
@@ -1,18 +1,144 @@
 from django.utils import timezone
 
-from django.db import models
+from django.db import DEFAULT_DB_ALIAS, connections, models
 from users.models import User
 from main.models import Project, Task
+from .signals import messages_created
 # Create your models here.
 
+class MessageQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        messages_created.send(sender=self.model, messages=objs)
+        return objs
+
+
+class SequenceField(models.BigIntegerField):
+    """
+    Номер из последовательности Postgres, выдаваемый заново при каждом сохранении поля.
+
+    При вставке nextval() вычисляется в самом INSERT и возвращается через
+    RETURNING (db_returning), в том числе из bulk_create; при обновлении номер
+    берётся отдельным запросом, чтобы он сразу был в экземпляре.
+    """
+    db_returning = True
+
+    def __init__(self, *args, sequence, **kwargs):
+        self.sequence = sequence
+        kwargs.setdefault('editable', False)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['sequence'] = self.sequence
+        kwargs.pop('editable', None)
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        if add:
+            return models.Func(models.Value(self.sequence), function='nextval', output_field=models.BigIntegerField())
+        with connections[model_instance._state.db or DEFAULT_DB_ALIAS].cursor() as cursor:
+            cursor.execute('SELECT nextval(%s)', [self.sequence])
+            value = cursor.fetchone()[0]
+        setattr(model_instance, self.attname, value)
+        return value
+
+
 class Message(models.Model):
 
     title = models.CharField(max_length=150)
     text = models.TextField()
-    owner = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Одиночные индексы по FK заменены составными индексами (fk, -created) ниже
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
+    created = models.DateTimeField(auto_now_add=True)
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, db_index=False)
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, null=True, blank=True, db_index=False)
+    # Поля задачи, изменённые обновлением, о котором это уведомление
+    changes = models.JSONField(default=list, blank=True)
+    # Сколько обновлений склеено в это сообщение и до какого момента к нему можно добавлять
+    # новые (main.notifications.UpdateCoalescer); у прочих уведомлений окна нет
+    updates = models.PositiveIntegerField(default=1)
+    coalesce_until = models.DateTimeField(null=True, blank=True)
+    # Меняется только через user_messages.inbox.mark_read, который ведёт UnreadCounter
+    read_at = models.DateTimeField(null=True, blank=True)
+    # Растёт при создании и при каждой склейке обновлений: по нему клиенты догружают
+    # пропущенное (resume, Last-Event-ID), включая изменения уже полученных сообщений
+    sequence = SequenceField(sequence='user_messages_message_sequence')
+
+    objects = MessageQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', '-created'], name='message_owner_created_idx'),
+            # Непрочитанные пользователя (owner, read_at IS NULL) по дате без обращения к сортировке
+            models.Index(fields=['owner', 'read_at', 'created'], name='message_owner_read_idx'),
+            models.Index(fields=['project', '-created'], name='message_project_created_idx'),
+            models.Index(fields=['task', '-created'], name='message_task_created_idx'),
+            models.Index(fields=['owner', 'sequence'], name='message_owner_sequence_idx'),
+        ]
+
+    def __str__(self):
+        return self.title
+
+
+class UnreadCounter(models.Model):
+    """Денормализованное число непрочитанных сообщений пользователя (user_messages/inbox.py)."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='unread_counter')
+    unread = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.user_id}: {self.unread}'
+
+
+class OutboxEmail(models.Model):
+    """Письмо, записанное в той же транзакции, что и изменение; отправляется командой send_outbox_emails."""
+
+    class Status(models.TextChoices):
+        PENDING = 'PN', 'Pending'
+        SENT = 'ST', 'Sent'
+        FAILED = 'FL', 'Failed'
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255)
+    recipient = models.EmailField()
+    status = models.CharField(max_length=2, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
     created = models.DateTimeField(auto_now_add=True)
-    project = models.ForeignKey(Project, on_delete=models.CASCADE)
-    task = models.ForeignKey(Task, on_delete=models.CASCADE, null=True, blank=True  )
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Очередь воркера: только неотправленные письма по времени следующей попытки
+            models.Index(fields=['next_attempt_at'], condition=models.Q(status='PN'), name='outbox_pending_idx'),
+        ]
 
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return f'{self.recipient}: {self.subject}'
+
+class ChannelGroupMember(models.Model):
+    """Участник группы слоя каналов PostgresChannelLayer; запись истекает через group_expiry."""
+    group_name = models.CharField(max_length=100)
+    channel_name = models.CharField(max_length=100)
+    # Имя канала LISTEN процесса, которому принадлежит channel_name
+    process = models.CharField(max_length=63)
+    expires = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['group_name', 'channel_name'], name='channel_group_member_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['expires'], name='channel_group_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.group_name}: {self.channel_name}'
+
+
+class ChannelSpill(models.Model):
+    """Сообщение слоя каналов, не поместившееся в NOTIFY (лимит 8000 байт); в NOTIFY уходит только id."""
+    payload = models.TextField()
+    expires = models.DateTimeField(db_index=True)
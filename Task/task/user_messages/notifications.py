@@ -0,0 +1,57 @@
+from collections import defaultdict
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+
+def user_group(user_id):
+    return f'notifications.user.{user_id}'
+
+
+def message_payload(message):
+    """Компактное представление уведомления для WebSocket: без текста, только ссылки."""
+    payload = {
+        'id': message.id,
+        'sequence': message.sequence,
+        'title': message.title,
+        'project': message.project_id,
+        'task': message.task_id,
+        'created': message.created.isoformat() if message.created else None,
+    }
+    if message.changes:
+        payload['changes'] = message.changes
+    if message.updates > 1:
+        payload['updates'] = message.updates
+    return payload
+
+
+def get_resume_limit():
+    return getattr(settings, 'NOTIFICATIONS_RESUME_LIMIT', 100)
+
+
+def get_stream_options():
+    """Настройки SSE-потока: интервал heartbeat (с), время жизни потока (с) и retry для EventSource (мс)."""
+    return {
+        'heartbeat': getattr(settings, 'NOTIFICATIONS_SSE_HEARTBEAT', 15),
+        'max_duration': getattr(settings, 'NOTIFICATIONS_SSE_MAX_DURATION', 300),
+        'retry': getattr(settings, 'NOTIFICATIONS_SSE_RETRY', 3000),
+    }
+
+
+def push_messages(messages):
+    """
+    Рассылает уведомления в группы владельцев, по одному group_send на пользователя.
+    Вызывается из transaction.on_commit, поэтому клиент не увидит откаченных сообщений.
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    by_owner = defaultdict(list)
+    for message in messages:
+        by_owner[message.owner_id].append(message_payload(message))
+    for owner_id, payloads in by_owner.items():
+        async_to_sync(channel_layer.group_send)(user_group(owner_id), {
+            'type': 'notification.messages',
+            'messages': payloads,
+        })
@@ -0,0 +1,120 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_emails(subject, body, recipients, from_email=None):
+    """Кладёт письма в outbox; вызывать внутри транзакции, которая меняет данные."""
+    from_email = from_email or settings.DEFAULT_FROM_EMAIL
+    return OutboxEmail.objects.bulk_create(
+        OutboxEmail(subject=subject, body=body, from_email=from_email, recipient=recipient)
+        for recipient in dict.fromkeys(recipients)
+        if recipient
+    )
+
+
+def get_backoff(attempts):
+    base = getattr(settings, 'OUTBOX_BACKOFF_BASE', 30)
+    limit = getattr(settings, 'OUTBOX_BACKOFF_MAX', 3600)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), limit))
+
+
+class OutboxStats:
+    def __init__(self):
+        self.claimed = 0
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.elapsed = 0.0
+
+    def __iadd__(self, other):
+        self.claimed += other.claimed
+        self.sent += other.sent
+        self.retried += other.retried
+        self.failed += other.failed
+        self.elapsed += other.elapsed
+        return self
+
+    def __str__(self):
+        return (f'claimed={self.claimed} sent={self.sent} retried={self.retried} '
+                f'failed={self.failed} elapsed={self.elapsed:.3f}s')
+
+
+def claim_batch(batch_size, now):
+    # Письма «арендуются» на OUTBOX_LEASE секунд: отправка идёт вне транзакции,
+    # а если воркер упадёт, письма снова станут доступны после истечения аренды.
+    lease = timedelta(seconds=getattr(settings, 'OUTBOX_LEASE', 300))
+    with transaction.atomic():
+        emails = list(
+            OutboxEmail.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=OutboxEmail.Status.PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at')[:batch_size]
+        )
+        if emails:
+            OutboxEmail.objects.filter(id__in=[email.id for email in emails]).update(next_attempt_at=now + lease)
+    return emails
+
+
+def deliver_batch(batch_size=None, now=None, connection=None):
+    """Отправляет одну пачку писем через одно SMTP-соединение и возвращает OutboxStats."""
+    batch_size = batch_size or getattr(settings, 'OUTBOX_BATCH_SIZE', 100)
+    max_attempts = getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 5)
+    now = now or timezone.now()
+    stats = OutboxStats()
+    started = time.monotonic()
+
+    emails = claim_batch(batch_size, now)
+    stats.claimed = len(emails)
+    if not emails:
+        return stats
+
+    connection = connection or get_connection()
+    try:
+        connection.open()
+    except Exception as exc:
+        # SMTP недоступен: вся пачка уходит на повтор
+        errors = {email.id: exc for email in emails}
+    else:
+        errors = {}
+        try:
+            for email in emails:
+                message = EmailMessage(email.subject, email.body, email.from_email, [email.recipient],
+                                       connection=connection)
+                try:
+                    connection.send_messages([message])
+                except Exception as exc:
+                    errors[email.id] = exc
+        finally:
+            connection.close()
+
+    for email in emails:
+        email.attempts += 1
+        error = errors.get(email.id)
+        if error is None:
+            email.status = OutboxEmail.Status.SENT
+            email.sent_at = now
+            email.last_error = ''
+            stats.sent += 1
+        elif email.attempts >= max_attempts:
+            email.status = OutboxEmail.Status.FAILED
+            email.last_error = repr(error)
+            stats.failed += 1
+        else:
+            email.next_attempt_at = now + get_backoff(email.attempts)
+            email.last_error = repr(error)
+            stats.retried += 1
+    OutboxEmail.objects.bulk_update(emails, ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at'])
+
+    stats.elapsed = time.monotonic() - started
+    logger.info('outbox batch: %s', stats)
+    return stats
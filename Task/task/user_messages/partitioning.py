@@ -0,0 +1,187 @@
+from datetime import datetime
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .inbox import forget_messages
+from .models import Message
+
+# Помесячное секционирование таблицы сообщений по created (только PostgreSQL).
+# Таблица становится PARTITION BY RANGE (created) с первичным ключом (id, created);
+# на сообщения никто не ссылается внешними ключами, поэтому составной ключ безопасен.
+# Старые секции целиком архивируются и удаляются DROP вместо построчного DELETE.
+
+
+def quote(name):
+    return connection.ops.quote_name(name)
+
+
+def check_deferred_constraints(cursor):
+    # ALTER TABLE невозможен, пока в транзакции есть отложенные проверки FK
+    cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+    cursor.execute('SET CONSTRAINTS ALL DEFERRED')
+
+
+def month_start(value):
+    value = timezone.localtime(value) if timezone.is_aware(value) else value
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(value, months):
+    index = value.year * 12 + value.month - 1 + months
+    return value.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(start):
+    return f'{Message._meta.db_table}_p{start:%Y%m}'
+
+
+def is_partitioned():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = %s',
+            [Message._meta.db_table],
+        )
+        return cursor.fetchone() is not None
+
+
+def get_partitions():
+    """Секции таблицы: [(имя, начало, конец)] по возрастанию; секция по умолчанию не включается."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i '
+            'JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent '
+            "WHERE p.relname = %s AND pg_get_expr(c.relpartbound, c.oid) <> 'DEFAULT'",
+            [Message._meta.db_table],
+        )
+        rows = cursor.fetchall()
+    partitions = []
+    for name, bound in rows:
+        # FOR VALUES FROM ('2024-01-01 00:00:00+00') TO ('2024-02-01 00:00:00+00')
+        start, end = (part.split("'")[1] for part in bound.split(' TO '))
+        partitions.append((name, datetime.fromisoformat(start), datetime.fromisoformat(end)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def ensure_partitions(months_ahead=3, now=None, months_back=0):
+    """Создаёт недостающие месячные секции от now - months_back до now + months_ahead; возвращает их имена."""
+    table = Message._meta.db_table
+    first = add_months(month_start(now or timezone.now()), -months_back)
+    created = []
+    with connection.cursor() as cursor:
+        for offset in range(months_back + months_ahead + 1):
+            start = add_months(first, offset)
+            name = partition_name(start)
+            cursor.execute('SELECT to_regclass(%s)', [name])
+            if cursor.fetchone()[0] is not None:
+                continue
+            cursor.execute(
+                f'CREATE TABLE {quote(name)} PARTITION OF {quote(table)} FOR VALUES FROM (%s) TO (%s)',
+                [start, add_months(start, 1)],
+            )
+            created.append(name)
+    return created
+
+
+@transaction.atomic
+def convert_to_partitioned(months_ahead=3, now=None):
+    """
+    Переводит таблицу сообщений на помесячные секции, копируя существующие строки.
+
+    Выполняется одной транзакцией и на время копирования блокирует таблицу,
+    поэтому запускать её стоит в окно обслуживания.
+    """
+    if is_partitioned():
+        return False
+    table = Message._meta.db_table
+    old = f'{table}_unpartitioned'
+    with connection.cursor() as cursor:
+        check_deferred_constraints(cursor)
+        cursor.execute(f'LOCK TABLE {quote(table)} IN ACCESS EXCLUSIVE MODE')
+        cursor.execute(f'SELECT min(created) FROM {quote(table)}')
+        oldest = cursor.fetchone()[0]
+        cursor.execute(f'ALTER TABLE {quote(table)} RENAME TO {quote(old)}')
+        cursor.execute(f'ALTER TABLE {quote(old)} RENAME CONSTRAINT {quote(table + "_pkey")} TO {quote(old + "_pkey")}')
+        # Индексы старой таблицы удаляются вместе с ней, а имена нужны новой
+        for index in Message._meta.indexes:
+            cursor.execute(f'ALTER INDEX IF EXISTS {quote(index.name)} RENAME TO {quote(index.name + "_old")}')
+        cursor.execute(
+            f'CREATE TABLE {quote(table)} (LIKE {quote(old)} INCLUDING DEFAULTS INCLUDING IDENTITY '
+            f'INCLUDING CONSTRAINTS) PARTITION BY RANGE (created)'
+        )
+        cursor.execute(f'ALTER TABLE {quote(table)} ADD PRIMARY KEY (id, created)')
+        for field in Message._meta.concrete_fields:
+            if field.remote_field is None:
+                continue
+            target = field.target_field
+            cursor.execute(
+                f'ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(f"{table}_{field.column}_fk")} '
+                f'FOREIGN KEY ({quote(field.column)}) '
+                f'REFERENCES {quote(target.model._meta.db_table)} ({quote(target.column)}) '
+                f'DEFERRABLE INITIALLY DEFERRED'
+            )
+        cursor.execute(f'CREATE TABLE {quote(table + "_default")} PARTITION OF {quote(table)} DEFAULT')
+
+    now = now or timezone.now()
+    months_back = 0
+    if oldest is not None:
+        start, current = month_start(oldest), month_start(now)
+        months_back = max((current.year - start.year) * 12 + current.month - start.month, 0)
+    ensure_partitions(months_ahead=months_ahead, now=now, months_back=months_back)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'INSERT INTO {quote(table)} OVERRIDING SYSTEM VALUE SELECT * FROM {quote(old)}')
+        cursor.execute(f'DROP TABLE {quote(old)}')
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence(%s, 'id'), coalesce(max(id), 0) + 1, false) FROM {quote(table)}",
+            [table],
+        )
+        check_deferred_constraints(cursor)
+    # Индексы строятся после копирования: так быстрее, чем обновлять их на каждую строку
+    with connection.schema_editor(atomic=False) as editor:
+        for index in Message._meta.indexes:
+            editor.add_index(Message, index)
+    return True
+
+
+def drop_partition(name, start, end, archive=None, batch_size=1000):
+    """Архивирует строки секции, вычитает её непрочитанные из счётчиков и удаляет секцию целиком."""
+    rows = Message.objects.filter(created__gte=start, created__lt=end).order_by('created', 'id')
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            # Новые строки в секцию больше не попадут, а читатели не увидят её частично удалённой
+            cursor.execute(f'LOCK TABLE {quote(name)} IN ACCESS EXCLUSIVE MODE')
+        batch = []
+        count = 0
+        for row in rows.values().iterator(chunk_size=batch_size):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                count += flush_rows(batch, archive)
+                batch = []
+        count += flush_rows(batch, archive)
+        with connection.cursor() as cursor:
+            check_deferred_constraints(cursor)
+            cursor.execute(f'ALTER TABLE {quote(Message._meta.db_table)} DETACH PARTITION {quote(name)}')
+            cursor.execute(f'DROP TABLE {quote(name)}')
+    return count
+
+
+def flush_rows(rows, archive):
+    if not rows:
+        return 0
+    if archive is not None:
+        archive.write(rows)
+    forget_messages(rows)
+    return len(rows)
+
+
+def drop_expired_partitions(cutoff, archive=None):
+    """Удаляет секции, все строки которых старше cutoff; возвращает [(имя, число строк)]."""
+    dropped = []
+    for name, start, end in get_partitions():
+        if end > cutoff:
+            break
+        dropped.append((name, drop_partition(name, start, end, archive)))
+    return dropped
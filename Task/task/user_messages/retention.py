@@ -0,0 +1,147 @@
+import gzip
+import json
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .inbox import forget_messages
+from .models import Message
+from .partitioning import drop_expired_partitions, is_partitioned
+
+DEFAULTS = {
+    'READ_DAYS': 30,
+    'UNREAD_DAYS': 180,
+    'BATCH_SIZE': 1000,
+    'BATCH_PAUSE': 0.0,
+    'ARCHIVE_DIR': 'archive',
+}
+
+
+def get_policy():
+    return {**DEFAULTS, **getattr(settings, 'MESSAGE_RETENTION', {})}
+
+
+def get_cutoffs(now=None, policy=None):
+    policy = policy or get_policy()
+    now = now or timezone.now()
+    return now - timedelta(days=policy['READ_DAYS']), now - timedelta(days=policy['UNREAD_DAYS'])
+
+
+def expired_filter(now=None, policy=None):
+    """Условие на устаревшие сообщения: прочитанные старше READ_DAYS, непрочитанные старше UNREAD_DAYS."""
+    read_cutoff, unread_cutoff = get_cutoffs(now, policy)
+    return (Q(read_at__isnull=False, created__lt=read_cutoff)
+            | Q(read_at__isnull=True, created__lt=unread_cutoff))
+
+
+class MessageArchive:
+    """Архив удалённых сообщений: один gzip-файл JSONL на запуск, строка — сообщение."""
+
+    def __init__(self, directory, now=None):
+        os.makedirs(directory, exist_ok=True)
+        stamp = (now or timezone.now()).strftime('%Y%m%dT%H%M%S')
+        self.path = os.path.join(directory, f'messages-{stamp}.jsonl.gz')
+        self.file = gzip.open(self.path, 'at', encoding='utf-8')
+        self.count = 0
+
+    def write(self, rows):
+        for row in rows:
+            self.file.write(json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False))
+            self.file.write('\n')
+            self.count += 1
+        # Строки архива должны попасть на диск до коммита удаления
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class PurgeStats:
+    def __init__(self):
+        self.batches = 0
+        self.deleted = 0
+        self.archived = 0
+        self.partitions = 0
+        self.elapsed = 0.0
+
+    def __str__(self):
+        return (f'batches={self.batches} deleted={self.deleted} archived={self.archived} '
+                f'partitions={self.partitions} elapsed={self.elapsed:.3f}s')
+
+
+def purge_batch(condition, batch_size, archive=None):
+    """
+    Удаляет одну пачку устаревших сообщений в короткой транзакции и возвращает их число.
+
+    Строки блокируются с SKIP LOCKED, поэтому пачка не ждёт чужих транзакций,
+    а блокировки держатся только до конца пачки. Обход идёт по первичному ключу
+    от самых старых строк: отдельный индекс по created сбивал бы планировщик
+    на страницах входящих (он предпочитал его индексу (owner, created)).
+    """
+    with transaction.atomic():
+        batch = (Message.objects.filter(condition).order_by('id')
+                 .select_for_update(skip_locked=True)[:batch_size])
+        rows = list(batch.values())
+        if not rows:
+            return 0
+        if archive is not None:
+            archive.write(rows)
+        # Одна команда DELETE без загрузки объектов и сигналов на каждую строку;
+        # диапазон created позволяет секционированной таблице читать только нужные секции
+        table = connection.ops.quote_name(Message._meta.db_table)
+        created = [row['created'] for row in rows]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {table} WHERE id = ANY(%s) AND created BETWEEN %s AND %s',
+                [[row['id'] for row in rows], min(created), max(created)],
+            )
+        forget_messages(rows)
+    return len(rows)
+
+
+def purge_expired(now=None, batch_size=None, archive=None, max_batches=None, pause=None, stats=None):
+    """Удаляет все устаревшие сообщения пачками по batch_size; между пачками — пауза pause сек."""
+    policy = get_policy()
+    batch_size = batch_size or policy['BATCH_SIZE']
+    pause = policy['BATCH_PAUSE'] if pause is None else pause
+    stats = stats or PurgeStats()
+    started = time.monotonic()
+    condition = expired_filter(now, policy)
+
+    if is_partitioned():
+        # Секции, целиком старше обеих границ, удаляются DROP без построчного DELETE
+        for _, count in drop_expired_partitions(min(get_cutoffs(now, policy)), archive):
+            stats.partitions += 1
+            stats.deleted += count
+
+    while max_batches is None or stats.batches < max_batches:
+        deleted = purge_batch(condition, batch_size, archive)
+        if not deleted:
+            break
+        stats.batches += 1
+        stats.deleted += deleted
+        if deleted < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+
+    if archive is not None:
+        stats.archived = archive.count
+    stats.elapsed += time.monotonic() - started
+    return stats
+
+
+def count_expired(now=None):
+    return Message.objects.filter(expired_filter(now)).count()
@@ -1,6 +1,13 @@
 from django.urls import path
 from . import consumers
+from .middleware import JWTAuthMiddlewareStack
 
 websocket_urlpatterns = [
     path('ws/some_path/', consumers.YourConsumer.as_asgi()),
+    path('ws/notifications/', consumers.NotificationConsumer.as_asgi()),
+]
+
+# Потоки SSE обслуживает channels, остальные HTTP-запросы — Django (task/asgi.py)
+http_urlpatterns = [
+    path('api/v1/messages/stream/', JWTAuthMiddlewareStack(consumers.NotificationStreamConsumer.as_asgi())),
 ]
\ No newline at end of file
@@ -1,7 +1,14 @@
 from rest_framework import serializers
 from .models import Message
+from main.serializers import ProjectSerializer, TaskSerializer
+from task.expand import ExpandableSerializerMixin
+from task.fieldsets import SparseFieldsetSerializerMixin
+from users.serializers import UserBriefSerializer
+
+class MessageSerializer(SparseFieldsetSerializerMixin, ExpandableSerializerMixin, serializers.ModelSerializer):
+    expandable_fields = {'owner': UserBriefSerializer, 'project': ProjectSerializer, 'task': TaskSerializer}
 
-class MessageSerializer(serializers.ModelSerializer):
     class Meta:
         model = Message
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+        read_only_fields = ('read_at', )
\ No newline at end of file
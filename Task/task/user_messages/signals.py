@@ -0,0 +1,65 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from task.response_cache import bump
+from .notifications import push_messages
+
+# Отправляется Message.objects.bulk_create(): bulk_create не шлёт post_save
+messages_created = Signal()
+
+
+def message_scopes(message):
+    return ('messages', f'project:{message.project_id}', f'user:{message.owner_id}')
+
+
+@receiver(post_save, sender='user_messages.Message')
+@receiver(post_delete, sender='user_messages.Message')
+def invalidate_message(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump(*message_scopes(instance))
+
+
+@receiver(messages_created)
+def invalidate_created_messages(sender, messages, **kwargs):
+    bump(*{scope for message in messages for scope in message_scopes(message)})
+
+
+# Счётчики непрочитанных (user_messages/inbox.py). Модели импортируют этот модуль,
+# поэтому inbox импортируется внутри обработчиков.
+
+@receiver(post_save, sender='user_messages.Message')
+def count_created_message(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and instance.read_at is None:
+        from .inbox import adjust_unread
+        adjust_unread({instance.owner_id: 1})
+
+
+@receiver(messages_created)
+def count_created_messages(sender, messages, **kwargs):
+    from .inbox import adjust_unread
+    adjust_unread(Counter(message.owner_id for message in messages if message.read_at is None))
+
+
+@receiver(post_delete, sender='user_messages.Message')
+def uncount_deleted_message(sender, instance, **kwargs):
+    if instance.read_at is None:
+        from .inbox import adjust_unread
+        adjust_unread({instance.owner_id: -1})
+
+
+# Push-уведомления по WebSocket (user_messages/consumers.py) уходят только после коммита
+
+@receiver(post_save, sender='user_messages.Message')
+def push_created_message(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        transaction.on_commit(lambda: push_messages([instance]))
+
+
+@receiver(messages_created)
+def push_created_messages(sender, messages, **kwargs):
+    messages = list(messages)
+    if messages:
+        transaction.on_commit(lambda: push_messages(messages))
@@ -1,9 +1,42 @@
+import asyncio
+import gzip
+import json
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import skipUnless
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.routing import URLRouter
+from channels.testing import ApplicationCommunicator, WebsocketCommunicator
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Q
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
-from rest_framework.test import APITestCase
-from .models import Message
+from rest_framework.test import APITestCase, APITransactionTestCase
+from rest_framework_simplejwt.tokens import AccessToken
+from task.testing import QueryPlanMixin
+from .backpressure import OutboundQueueMixin
+from .channel_layer import PostgresChannelLayer
+from .inbox import get_unread, mark_read
+from .middleware import JWTAuthMiddlewareStack
+from .models import Message, OutboxEmail
+from .outbox import deliver_batch, enqueue_emails
+from .partitioning import convert_to_partitioned, is_partitioned
+from .retention import MessageArchive, purge_expired
+from .routing import http_urlpatterns, websocket_urlpatterns
 from users.models import User
 from main.models import Project, Task
+from main.notifications import UpdateCoalescer
 
 class MessageViewTests(APITestCase):
     def setUp(self):
@@ -117,4 +150,859 @@ class MessageViewTests(APITestCase):
         response = self.client.get(url, {'ordering': 'created'})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data[0]['title'], 'Message 1')
-        self.assertEqual(response.data[1]['title'], 'Message 2')
\ No newline at end of file
+        self.assertEqual(response.data[1]['title'], 'Message 2')
+
+@skipUnless(connection.vendor == 'postgresql', 'EXPLAIN-тесты рассчитаны на PostgreSQL')
+class MessageQueryPlanTests(QueryPlanMixin, APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.client.force_authenticate(user=self.user)
+        self.project = Project.objects.create(title='Test Project', description='Test Description')
+
+        users = [self.user] + User.objects.bulk_create(User(username=f'user{i}') for i in range(20))
+        Message.objects.bulk_create(
+            Message(title=f'Message {i}', text='Text', owner=users[i % len(users)], project=self.project)
+            for i in range(2000)
+        )
+        self.analyze('user_messages_message')
+
+    def test_message_page_uses_index(self):
+        """
+        Страница сообщений читается по индексу, а не полным сканированием.
+        """
+        self.assertUsesIndex('user_messages_message', reverse('message-list'), {'page_size': 20})
+
+    def test_owner_inbox_uses_owner_created_index(self):
+        """
+        Последние сообщения пользователя читаются по (owner, created DESC).
+        """
+        queryset = Message.objects.filter(owner=self.user).order_by('-created')[:20]
+        plan = self.explain_queryset(queryset)
+        self.assertIn('message_owner_created_idx', plan)
+
+    def test_owner_page_uses_owner_created_index(self):
+        """
+        Сообщения пользователя, отсортированные по created, читаются по (owner, created DESC).
+        """
+        self.assertUsesIndex('user_messages_message', reverse('message-list'), {
+            'owner': self.user.id, 'ordering': '-created', 'page_size': 20,
+        }, index='message_owner_created_idx')
+
+    def test_unread_page_uses_owner_read_index(self):
+        """
+        Непрочитанные пользователя читаются по (owner, read_at, created).
+        """
+        # Как в реальных входящих: прочитано почти всё
+        Message.objects.filter(id__in=Message.objects.order_by('-id').values('id')[100:]).update(read_at=timezone.now())
+        self.analyze('user_messages_message')
+        self.assertUsesIndex('user_messages_message', reverse('message-list'), {
+            'unread': 'true', 'ordering': '-created', 'page_size': 20,
+        }, index='message_owner_read_idx')
+
+
+class CountingBackend(locmem.EmailBackend):
+    opened = 0
+
+    def open(self):
+        CountingBackend.opened += 1
+
+
+class FlakyBackend(locmem.EmailBackend):
+    def send_messages(self, messages):
+        if any('bad@example.com' in message.to for message in messages):
+            raise ConnectionError('SMTP недоступен')
+        return super().send_messages(messages)
+
+
+class OutboxTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass', email='testuser@example.com')
+        self.client.force_authenticate(user=self.user)
+
+    def test_project_create_enqueues_emails(self):
+        """
+        Создание проекта пишет письма в outbox и не ходит в SMTP.
+        """
+        other = User.objects.create_user(username='other', password='testpass', email='other@example.com')
+        data = {'title': 'New Project', 'description': 'Description', 'project_users': [self.user.id, other.id]}
+        response = self.client.post(reverse('project-list'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(
+            set(OutboxEmail.objects.filter(status=OutboxEmail.Status.PENDING).values_list('recipient', flat=True)),
+            {'testuser@example.com', 'other@example.com'},
+        )
+
+    @override_settings(EMAIL_BACKEND='user_messages.tests.CountingBackend')
+    def test_batch_uses_single_connection(self):
+        """
+        Пачка писем отправляется через одно соединение.
+        """
+        CountingBackend.opened = 0
+        enqueue_emails('Тема', 'Текст', [f'user{i}@example.com' for i in range(3)])
+        now = timezone.now()
+        stats = deliver_batch(now=now)
+        self.assertEqual((stats.claimed, stats.sent), (3, 3))
+        self.assertEqual(CountingBackend.opened, 1)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertFalse(OutboxEmail.objects.exclude(status=OutboxEmail.Status.SENT).exists())
+
+    @override_settings(EMAIL_BACKEND='user_messages.tests.FlakyBackend', OUTBOX_BACKOFF_BASE=30)
+    def test_failed_email_is_retried_with_backoff(self):
+        """
+        Неудачная отправка переносится с экспоненциальной задержкой.
+        """
+        enqueue_emails('Тема', 'Текст', ['good@example.com', 'bad@example.com'])
+        now = timezone.now()
+        stats = deliver_batch(now=now)
+        self.assertEqual((stats.sent, stats.retried), (1, 1))
+
+        bad = OutboxEmail.objects.get(recipient='bad@example.com')
+        self.assertEqual(bad.status, OutboxEmail.Status.PENDING)
+        self.assertEqual(bad.attempts, 1)
+        self.assertEqual(bad.next_attempt_at, now + timedelta(seconds=30))
+
+        self.assertEqual(deliver_batch(now=now + timedelta(seconds=10)).claimed, 0)
+        deliver_batch(now=now + timedelta(seconds=30))
+        bad.refresh_from_db()
+        self.assertEqual(bad.attempts, 2)
+        self.assertEqual(bad.next_attempt_at, now + timedelta(seconds=90))
+
+    @override_settings(EMAIL_BACKEND='user_messages.tests.FlakyBackend', OUTBOX_MAX_ATTEMPTS=1)
+    def test_email_fails_after_max_attempts(self):
+        """
+        После исчерпания попыток письмо помечается как неотправленное.
+        """
+        enqueue_emails('Тема', 'Текст', ['bad@example.com'])
+        now = timezone.now()
+        stats = deliver_batch(now=now)
+        self.assertEqual(stats.failed, 1)
+        self.assertEqual(OutboxEmail.objects.get().status, OutboxEmail.Status.FAILED)
+
+    def test_command_drains_outbox(self):
+        """
+        Команда send_outbox_emails отправляет все готовые письма и печатает метрики.
+        """
+        enqueue_emails('Тема', 'Текст', [f'user{i}@example.com' for i in range(5)])
+        out = StringIO()
+        call_command('send_outbox_emails', batch_size=2, stdout=out)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertIn('sent=5', out.getvalue())
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class NotificationConsumerTests(APITransactionTestCase):
+    # Нужны настоящие коммиты: уведомления отправляются из transaction.on_commit
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.other = User.objects.create_user(username='other', password='testpass')
+        self.project = Project.objects.create(title='Test Project', description='Test Description')
+
+    def connect(self, user=None, query=''):
+        communicator = WebsocketCommunicator(JWTAuthMiddlewareStack(URLRouter(websocket_urlpatterns)),
+                                             f'/ws/notifications/{query}')
+        if user is not None:
+            communicator.scope['user'] = user
+        return communicator
+
+    def create_messages(self, owner, count=1):
+        return Message.objects.bulk_create(
+            Message(title=f'Message {i}', text='Text', owner=owner, project=self.project)
+            for i in range(count)
+        )
+
+    async def test_push_after_commit(self):
+        """
+        Новое сообщение приходит владельцу сразу после коммита, другим — нет.
+        """
+        communicator = self.connect(self.user)
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        other = self.connect(self.other)
+        await other.connect()
+
+        def create_in_transaction():
+            with transaction.atomic():
+                Message.objects.create(title='Hello', text='Text', owner=self.user, project=self.project)
+                # До коммита уведомление не отправляется
+                self.assertTrue(async_to_sync(communicator.receive_nothing)())
+
+        await database_sync_to_async(create_in_transaction)()
+
+        event = await communicator.receive_json_from()
+        self.assertEqual(event['type'], 'messages')
+        self.assertEqual([message['title'] for message in event['messages']], ['Hello'])
+        self.assertNotIn('text', event['messages'][0])
+        self.assertTrue(await other.receive_nothing())
+        await communicator.disconnect()
+        await other.disconnect()
+
+    async def test_bulk_messages_are_pushed_once(self):
+        """
+        Пачка сообщений уходит пользователю одним событием.
+        """
+        communicator = self.connect(self.user)
+        await communicator.connect()
+        await database_sync_to_async(self.create_messages)(self.user, 3)
+        event = await communicator.receive_json_from()
+        self.assertEqual(len(event['messages']), 3)
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+    @override_settings(WEBSOCKET_OUTBOUND={'BATCH_DELAY': 0.2})
+    async def test_events_share_frame_and_report_stats(self):
+        """
+        События, пришедшие подряд, уходят одним кадром; stats возвращает метрики очереди.
+        """
+        communicator = self.connect(self.user)
+        await communicator.connect()
+        # Две транзакции — два group_send, но кадр один
+        def create_twice():
+            self.create_messages(self.user, 1)
+            self.create_messages(self.user, 2)
+
+        await database_sync_to_async(create_twice)()
+        event = await communicator.receive_json_from()
+        self.assertEqual(len(event['messages']), 3)
+
+        await communicator.send_json_to({'type': 'stats'})
+        event = await communicator.receive_json_from()
+        self.assertEqual(event['type'], 'stats')
+        self.assertEqual((event['outbound']['frames'], event['outbound']['events']), (1, 3))
+        self.assertEqual(event['outbound']['queued'], 0)
+        await communicator.disconnect()
+
+    @override_settings(NOTIFICATIONS_RESUME_LIMIT=2)
+    async def test_resume_from_last_id(self):
+        """
+        Клиент получает сообщения, пропущенные после last_id, порциями не больше лимита.
+        """
+        messages = await database_sync_to_async(self.create_messages)(self.user, 4)
+        await database_sync_to_async(self.create_messages)(self.other, 1)
+
+        communicator = self.connect(self.user, f'?last_id={messages[0].id}')
+        await communicator.connect()
+        event = await communicator.receive_json_from()
+        self.assertEqual([message['id'] for message in event['messages']], [messages[1].id, messages[2].id])
+        self.assertTrue(event['more'])
+
+        await communicator.send_json_to({'type': 'resume', 'last_id': messages[2].id})
+        event = await communicator.receive_json_from()
+        self.assertEqual([message['id'] for message in event['messages']], [messages[3].id])
+        self.assertFalse(event['more'])
+        await communicator.disconnect()
+
+    async def test_resume_then_merge(self):
+        """
+        Склейка в уже догруженное сообщение приходит живым событием и догружается по last_sequence.
+        """
+        merger = UpdateCoalescer(window=60)
+        task = await database_sync_to_async(Task.objects.create)(
+            title='Task', description='Description', project=self.project, executor=self.user,
+            term='2023-12-31', responsible_for_test='Tester')
+        first = await database_sync_to_async(merger.task_updated)(task, ['title'])
+
+        communicator = self.connect(self.user, f'?last_sequence={first.sequence - 1}')
+        await communicator.connect()
+        event = await communicator.receive_json_from()
+        self.assertEqual([(message['id'], message['sequence']) for message in event['messages']],
+                         [(first.id, first.sequence)])
+
+        merged = await database_sync_to_async(merger.task_updated)(task, ['status'])
+        self.assertEqual(merged.id, first.id)
+        self.assertGreater(merged.sequence, first.sequence)
+        event = await communicator.receive_json_from()
+        self.assertEqual([(message['id'], message['updates']) for message in event['messages']], [(first.id, 2)])
+        await communicator.disconnect()
+
+        # Клиент, пропустивший склейку, получает её при переподключении
+        communicator = self.connect(self.user, f'?last_sequence={first.sequence}')
+        await communicator.connect()
+        event = await communicator.receive_json_from()
+        self.assertEqual([(message['id'], message['sequence'], message['updates']) for message in event['messages']],
+                         [(first.id, merged.sequence, 2)])
+        await communicator.disconnect()
+
+    async def test_rejects_anonymous(self):
+        """
+        Без аутентификации подключение отклоняется.
+        """
+        communicator = self.connect(query='?token=invalid')
+        connected, _ = await communicator.connect()
+        self.assertFalse(connected)
+
+    async def test_jwt_token_in_query_string(self):
+        """
+        Access-токен в ?token= аутентифицирует сокет.
+        """
+        token = str(AccessToken.for_user(self.user))
+        communicator = self.connect(query=f'?token={token}')
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        await database_sync_to_async(self.create_messages)(self.user)
+        event = await communicator.receive_json_from()
+        self.assertEqual(len(event['messages']), 1)
+        await communicator.disconnect()
+
+    async def test_echo_socket_frames(self):
+        """
+        ws/some_path/ отвечает на каждое сообщение отдельным кадром {"message": ...}, без пачек.
+        """
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), '/ws/some_path/')
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        for text in ('first', 'second'):
+            await communicator.send_json_to({'message': text})
+        self.assertEqual(await communicator.receive_json_from(), {'message': 'first'})
+        self.assertEqual(await communicator.receive_json_from(), {'message': 'second'})
+        await communicator.disconnect()
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Слой каналов работает только на PostgreSQL')
+class PostgresChannelLayerTests(APITransactionTestCase):
+    # Слой ходит в базу своими соединениями, поэтому нужны настоящие коммиты
+
+    def setUp(self):
+        self.layers = []
+
+    def make_layer(self, **kwargs):
+        layer = PostgresChannelLayer(**kwargs)
+        self.layers.append(layer)
+        return layer
+
+    async def close_layers(self):
+        for layer in self.layers:
+            await layer.close()
+
+    async def receive(self, layer, channel):
+        return await asyncio.wait_for(layer.receive(channel), timeout=5)
+
+    async def test_group_send_across_processes(self):
+        """
+        Сообщение группы доходит до каналов обоих «процессов» (экземпляров слоя).
+        """
+        first, second = self.make_layer(), self.make_layer()
+        try:
+            channels = [await first.new_channel(), await second.new_channel(), await second.new_channel()]
+            layers = [first, second, second]
+            for layer, channel in zip(layers, channels):
+                await layer.group_add('room', channel)
+                await layer.ensure_listener()
+
+            await first.group_send('room', {'type': 'chat.message', 'text': 'hello'})
+            for layer, channel in zip(layers, channels):
+                self.assertEqual((await self.receive(layer, channel))['text'], 'hello')
+            # Два канала второго процесса получили сообщение одним NOTIFY
+            self.assertEqual(first.stats['notifies'], 2)
+
+            await second.group_discard('room', channels[1])
+            await first.send(channels[2], {'type': 'direct'})
+            await first.group_send('room', {'type': 'chat.message', 'text': 'again'})
+            self.assertEqual((await self.receive(second, channels[2]))['type'], 'direct')
+            self.assertEqual((await self.receive(second, channels[2]))['text'], 'again')
+            self.assertEqual(second.queues[channels[1]].qsize(), 0)
+        finally:
+            await self.close_layers()
+
+    async def test_large_message_is_spilled(self):
+        """
+        Сообщение больше лимита NOTIFY передаётся через таблицу ChannelSpill.
+        """
+        sender, receiver = self.make_layer(spill_threshold=1000), self.make_layer()
+        try:
+            channel = await receiver.new_channel()
+            await receiver.ensure_listener()
+            text = 'x' * 20000
+            await sender.send(channel, {'type': 'big', 'text': text})
+            self.assertEqual((await self.receive(receiver, channel))['text'], text)
+            self.assertEqual(sender.stats['spilled'], 1)
+        finally:
+            await self.close_layers()
+
+    async def test_expired_membership_is_skipped(self):
+        """
+        Истёкшее участие в группе не получает сообщений.
+        """
+        layer = self.make_layer(group_expiry=-1)
+        try:
+            channel = await layer.new_channel()
+            await layer.group_add('room', channel)
+            await layer.ensure_listener()
+            await layer.group_send('room', {'type': 'lost'})
+            self.assertEqual(layer.stats['notifies'], 0)
+        finally:
+            await self.close_layers()
+
+    async def test_notifies_are_batched(self):
+        """
+        Одновременные отправки объединяются в один запрос pg_notify.
+        """
+        sender, receiver = self.make_layer(batch_delay=0.01), self.make_layer()
+        try:
+            channel = await receiver.new_channel()
+            await receiver.ensure_listener()
+            await asyncio.gather(*(sender.send(channel, {'type': 'n', 'i': i}) for i in range(20)))
+            self.assertEqual(sender.stats['round_trips'], 1)
+            # Одинаковые сообщения не схлопываются и приходят по порядку
+            received = [(await self.receive(receiver, channel))['i'] for _ in range(20)]
+            self.assertEqual(received, list(range(20)))
+        finally:
+            await self.close_layers()
+
+    async def test_listener_reconnects_after_backend_loss(self):
+        """
+        После обрыва соединения LISTEN (pg_terminate_backend) слой переподключается,
+        и доставка возобновляется.
+        """
+        sender, receiver = self.make_layer(), self.make_layer()
+        try:
+            channel = await receiver.new_channel()
+            await receiver.ensure_listener()
+            await sender.send(channel, {'type': 'before'})
+            self.assertEqual((await self.receive(receiver, channel))['type'], 'before')
+
+            pid = receiver.listener.get_backend_pid()
+            await sender.execute('SELECT pg_terminate_backend(%s)', [pid])
+            # Отправленное до восстановления LISTEN теряется: шлём, пока не дойдёт
+            for attempt in range(50):
+                await sender.send(channel, {'type': 'after', 'attempt': attempt})
+                try:
+                    message = await asyncio.wait_for(receiver.receive(channel), timeout=0.2)
+                    break
+                except asyncio.TimeoutError:
+                    continue
+            else:
+                self.fail('доставка не возобновилась')
+            self.assertEqual(message['type'], 'after')
+            self.assertEqual(receiver.stats['reconnects'], 1)
+            self.assertNotEqual(receiver.listener.get_backend_pid(), pid)
+        finally:
+            await self.close_layers()
+
+
+
+class InboxTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.other = User.objects.create_user(username='other', password='testpass')
+        self.client.force_authenticate(user=self.user)
+        self.project = Project.objects.create(title='Test Project', description='Test Description')
+        self.messages = self.create_messages(self.user, 5)
+        self.foreign = self.create_messages(self.other, 2)
+
+    def create_messages(self, owner, count):
+        return Message.objects.bulk_create(
+            Message(title=f'Message {i}', text='Text', owner=owner, project=self.project)
+            for i in range(count)
+        )
+
+    def get_unread(self):
+        response = self.client.get(reverse('message-unread'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['unread']
+
+    def test_expand_query_count_is_fixed(self):
+        """
+        ?expand=task,project,owner не добавляет запросов на каждое сообщение.
+        """
+        task = Task.objects.create(title='Task', description='Description', project=self.project, executor=self.user,
+                                   term='2023-12-31', responsible_for_test='Tester')
+        url = reverse('message-list')
+        params = {'expand': 'task.executor,project,owner'}
+
+        def count():
+            cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return len(captured), response.data
+
+        small, _ = count()
+        Message.objects.bulk_create(
+            Message(title=f'Task message {i}', text='Text', owner=self.user, project=self.project, task=task)
+            for i in range(10)
+        )
+        large, data = count()
+        self.assertEqual(small, large)
+        expanded = [row for row in data if row['task'] is not None]
+        self.assertEqual(len(expanded), 10)
+        self.assertEqual(expanded[0]['task']['executor']['username'], 'testuser')
+        self.assertEqual(data[0]['owner']['id'], self.user.id)
+
+    def test_list_is_scoped_to_user(self):
+        """
+        Пользователь видит только свои сообщения, даже с чужим owner в параметрах.
+        """
+        url = reverse('message-list')
+        self.assertEqual(len(self.client.get(url).data), 5)
+        self.assertEqual(len(self.client.get(url, {'owner': self.other.id}).data), 0)
+        response = self.client.delete(reverse('message-delete', args=[self.foreign[0].id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_anonymous_has_no_inbox(self):
+        """
+        Без аутентификации входящие недоступны.
+        """
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.client.get(reverse('message-list')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_unread_counter(self):
+        """
+        Счётчик непрочитанных учитывает create, bulk_create и удаление и читается одним запросом.
+        """
+        self.assertEqual(self.get_unread(), 5)
+        Message.objects.create(title='One more', text='Text', owner=self.user, project=self.project)
+        self.messages[0].delete()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get_unread(), 5)
+        self.client.force_authenticate(user=self.other)
+        self.assertEqual(self.get_unread(), 2)
+
+    def test_mark_read_by_ranges(self):
+        """
+        Отметка прочитанными по диапазонам и id уменьшает счётчик и не трогает чужие сообщения.
+        """
+        ids = [message.id for message in self.messages]
+        data = {'ranges': [[ids[0], ids[1]], [self.foreign[0].id, self.foreign[1].id]], 'ids': [ids[3]]}
+        response = self.client.post(reverse('message-read'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'updated': 3, 'unread': 2})
+        # Повторная отметка ничего не меняет
+        response = self.client.post(reverse('message-read'), data, format='json')
+        self.assertEqual(response.data, {'updated': 0, 'unread': 2})
+
+        unread = self.client.get(reverse('message-list'), {'unread': 'true'}).data
+        self.assertEqual(sorted(message['id'] for message in unread), [ids[2], ids[4]])
+        self.assertFalse(Message.objects.filter(owner=self.other, read_at__isnull=False).exists())
+
+    def test_bulk_delete(self):
+        """
+        Удаление по диапазону учитывает, сколько удалённых было непрочитанными.
+        """
+        ids = [message.id for message in self.messages]
+        self.client.post(reverse('message-read'), {'ids': [ids[0]]}, format='json')
+        data = {'ranges': [[ids[0], ids[2]]], 'ids': [self.foreign[0].id]}
+        response = self.client.post(reverse('message-bulk-delete'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'deleted': 3, 'unread': 2})
+        self.assertEqual(Message.objects.filter(owner=self.other).count(), 2)
+
+    def test_invalid_selection(self):
+        """
+        Пустой выбор и перевёрнутый диапазон отклоняются.
+        """
+        for data in ({}, {'ranges': [[5, 1]]}, {'ranges': [[1]]}):
+            response = self.client.post(reverse('message-read'), data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(MESSAGE_RETENTION={'READ_DAYS': 30, 'UNREAD_DAYS': 180, 'BATCH_SIZE': 100, 'BATCH_PAUSE': 0})
+class MessageRetentionTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.client.force_authenticate(user=self.user)
+        self.project = Project.objects.create(title='Test Project', description='Test Description')
+        self.now = timezone.now()
+        self.archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.archive_dir)
+
+    def create_message(self, title, days, read=False):
+        message = Message.objects.create(title=title, text='Text', owner=self.user, project=self.project)
+        created = self.now - timedelta(days=days)
+        Message.objects.filter(id=message.id).update(created=created)
+        if read:
+            mark_read(self.user.id, Q(id=message.id))
+        return message
+
+    def read_archive(self, path):
+        with gzip.open(path, 'rt', encoding='utf-8') as file:
+            return [json.loads(line) for line in file]
+
+    def test_purge_respects_policy(self):
+        """
+        Прочитанные удаляются после READ_DAYS, непрочитанные — после UNREAD_DAYS; удалённые попадают в архив.
+        """
+        self.create_message('old read', 40, read=True)
+        self.create_message('old unread', 40)
+        self.create_message('ancient unread', 200)
+        self.create_message('new read', 5, read=True)
+
+        with MessageArchive(self.archive_dir) as archive:
+            stats = purge_expired(archive=archive)
+        self.assertEqual(stats.deleted, 2)
+        self.assertEqual(sorted(Message.objects.values_list('title', flat=True)), ['new read', 'old unread'])
+        self.assertEqual(sorted(row['title'] for row in self.read_archive(archive.path)),
+                         ['ancient unread', 'old read'])
+        self.assertEqual(get_unread(self.user.id), 1)
+
+    def test_purge_in_bounded_batches(self):
+        """
+        Удаление идёт пачками: одна команда DELETE на пачку, а не на строку.
+        """
+        for i in range(5):
+            self.create_message(f'old {i}', 200)
+        with CaptureQueriesContext(connection) as captured:
+            stats = purge_expired(batch_size=2)
+        deletes = [query for query in captured.captured_queries if query['sql'].startswith('DELETE')]
+        self.assertEqual((stats.batches, stats.deleted, len(deletes)), (3, 5, 3))
+        self.assertEqual(Message.objects.count(), 0)
+
+    def test_command(self):
+        """
+        Команда purge_messages считает устаревшие в --dry-run и удаляет с архивом.
+        """
+        self.create_message('old', 200)
+        out = StringIO()
+        call_command('purge_messages', dry_run=True, stdout=out)
+        self.assertIn('expired: 1', out.getvalue())
+        call_command('purge_messages', archive_dir=self.archive_dir, stdout=out)
+        self.assertIn('deleted=1', out.getvalue())
+        self.assertEqual(Message.objects.count(), 0)
+
+    @skipUnless(connection.vendor == 'postgresql', 'Секционирование только на PostgreSQL')
+    def test_partitioned_table(self):
+        """
+        После перевода на секции данные сохраняются, а устаревшие секции удаляются целиком.
+        """
+        self.create_message('ancient unread', 250)
+        self.create_message('ancient read', 240, read=True)
+        recent = self.create_message('recent', 1)
+        self.assertTrue(convert_to_partitioned(months_ahead=1, now=self.now))
+        self.assertTrue(is_partitioned())
+        self.assertEqual(Message.objects.count(), 3)
+
+        message = Message.objects.create(title='after', text='Text', owner=self.user, project=self.project)
+        self.assertGreater(message.id, recent.id)
+
+        with MessageArchive(self.archive_dir) as archive:
+            stats = purge_expired(now=self.now, archive=archive)
+        self.assertGreaterEqual(stats.partitions, 1)
+        self.assertEqual(stats.deleted, 2)
+        self.assertEqual(sorted(Message.objects.values_list('title', flat=True)), ['after', 'recent'])
+        self.assertEqual(len(self.read_archive(archive.path)), 2)
+        self.assertEqual(get_unread(self.user.id), 2)
+
+
+class SlowSocket(OutboundQueueMixin):
+    """Соединение, отправка которого ждёт открытия gate: имитирует медленного клиента."""
+    batch_delay = 0
+
+    def __init__(self, **options):
+        for name, value in options.items():
+            setattr(self, name, value)
+        self.frames = []
+        self.closed = None
+        self.gate = asyncio.Event()
+        self.sending = asyncio.Event()
+
+    async def send(self, text_data=None, bytes_data=None, close=False):
+        self.sending.set()
+        await self.gate.wait()
+        self.frames.append(json.loads(text_data)['events'])
+
+    async def close(self, code=None):
+        self.closed = code
+
+    async def wait_sent(self, count):
+        for _ in range(100):
+            if len(self.frames) >= count:
+                return
+            await asyncio.sleep(0.001)
+
+
+class OutboundQueueTests(SimpleTestCase):
+    async def fill(self, socket, events):
+        # Первое событие забирает задача отправки и застревает на gate
+        await socket.queue_send(events[0][0], key=events[0][1])
+        await asyncio.wait_for(socket.sending.wait(), 1)
+        for event, key in events[1:]:
+            await socket.queue_send(event, key=key)
+
+    async def test_drop_oldest(self):
+        """
+        При переполнении drop_oldest отбрасывает самые старые события и считает их.
+        """
+        socket = SlowSocket(outbound_limit=3, overflow_policy='drop_oldest', batch_size=10)
+        await self.fill(socket, [(i, None) for i in range(6)])
+        metrics = socket.outbound_metrics()
+        self.assertEqual((metrics['queued'], metrics['dropped']), (3, 2))
+        self.assertGreaterEqual(metrics['lag_ms'], 0)
+
+        socket.gate.set()
+        await socket.wait_sent(2)
+        self.assertEqual(socket.frames, [[0], [3, 4, 5]])
+        await socket.stop_outbound()
+
+    async def test_coalesce_replaces_same_key(self):
+        """
+        coalesce заменяет стоящее в очереди событие с тем же ключом на его месте.
+        """
+        socket = SlowSocket(outbound_limit=3, overflow_policy='coalesce', batch_size=10)
+        await self.fill(socket, [('a1', 'a'), ('b1', 'b'), ('c1', 'c'), ('b2', 'b'), ('d1', 'd')])
+        socket.gate.set()
+        await socket.wait_sent(2)
+        self.assertEqual(socket.frames, [['a1'], ['b2', 'c1', 'd1']])
+        metrics = socket.outbound_metrics()
+        self.assertEqual((metrics['coalesced'], metrics['dropped'], metrics['events']), (1, 0, 4))
+        await socket.stop_outbound()
+
+    async def test_disconnect_on_overflow(self):
+        """
+        disconnect закрывает соединение при переполнении и больше ничего не ставит в очередь.
+        """
+        socket = SlowSocket(outbound_limit=2, overflow_policy='disconnect', batch_size=10)
+        await self.fill(socket, [(i, None) for i in range(4)])
+        self.assertEqual(socket.closed, socket.overflow_close_code)
+        await socket.queue_send(5)
+        self.assertEqual(socket.outbound_metrics()['queued'], 0)
+        await socket.stop_outbound()
+
+    async def test_events_are_batched(self):
+        """
+        События, пришедшие за batch_delay, уходят одним кадром, но не больше batch_size.
+        """
+        socket = SlowSocket(outbound_limit=100, overflow_policy='drop_oldest', batch_size=4, batch_delay=0.01)
+        socket.gate.set()
+        for i in range(6):
+            await socket.queue_send(i)
+        await socket.wait_sent(2)
+        self.assertEqual(socket.frames, [[0, 1, 2, 3], [4, 5]])
+        metrics = socket.outbound_metrics()
+        self.assertEqual((metrics['frames'], metrics['events']), (2, 6))
+        self.assertIsNotNone(metrics['delay_p99_ms'])
+        await socket.stop_outbound()
+
+
+class NotificationStreamTests(APITransactionTestCase):
+    # Как и для WebSocket, нужны настоящие коммиты: события отправляются из transaction.on_commit
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.project = Project.objects.create(title='Test Project', description='Test Description')
+
+    def open_stream(self, user=None, headers=(), method='GET'):
+        headers = list(headers)
+        if user is not None:
+            headers.append((b'authorization', f'Bearer {AccessToken.for_user(user)}'.encode()))
+        return ApplicationCommunicator(URLRouter(http_urlpatterns), {
+            'type': 'http',
+            'http_version': '1.1',
+            'method': method,
+            'path': '/api/v1/messages/stream/',
+            'query_string': b'',
+            'headers': headers,
+        })
+
+    async def start(self, communicator):
+        await communicator.send_input({'type': 'http.request', 'body': b''})
+        return await communicator.receive_output()
+
+    async def read_events(self, communicator, count):
+        body = ''
+        while body.count('\n\n') < count:
+            body += (await communicator.receive_output())['body'].decode()
+        return [
+            dict(line.split(': ', 1) for line in block.split('\n'))
+            for block in body.strip().split('\n\n')
+        ]
+
+    async def close(self, communicator):
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait()
+
+    def create_messages(self, count=1):
+        return Message.objects.bulk_create(
+            Message(title=f'Message {i}', text='Text', owner=self.user, project=self.project)
+            for i in range(count)
+        )
+
+    async def test_rejects_anonymous(self):
+        """
+        Без токена поток не открывается: 401.
+        """
+        communicator = self.open_stream()
+        start = await self.start(communicator)
+        self.assertEqual(start['status'], 401)
+        await communicator.wait()
+
+    @override_settings(CORS_ALLOW_ALL_ORIGINS=False, CORS_ALLOWED_ORIGINS=['http://localhost:3000'])
+    async def test_cors_for_allowed_origin(self):
+        """
+        Разрешённый Origin получает Access-Control-Allow-Origin на поток и на preflight OPTIONS,
+        чужой — нет.
+        """
+        origin = (b'origin', b'http://localhost:3000')
+        communicator = self.open_stream(self.user, [origin])
+        start = await self.start(communicator)
+        self.assertEqual(start['status'], 200)
+        self.assertIn((b'Access-Control-Allow-Origin', b'http://localhost:3000'), start['headers'])
+        await self.close(communicator)
+
+        communicator = self.open_stream(headers=[origin, (b'access-control-request-method', b'GET')], method='OPTIONS')
+        start = await self.start(communicator)
+        self.assertEqual(start['status'], 200)
+        headers = dict(start['headers'])
+        self.assertEqual(headers[b'Access-Control-Allow-Origin'], b'http://localhost:3000')
+        self.assertIn(b'last-event-id', headers[b'Access-Control-Allow-Headers'])
+        self.assertIn(b'GET', headers[b'Access-Control-Allow-Methods'])
+        await communicator.wait()
+
+        communicator = self.open_stream(self.user, [(b'origin', b'http://evil.example')])
+        start = await self.start(communicator)
+        self.assertNotIn(b'Access-Control-Allow-Origin', dict(start['headers']))
+        await self.close(communicator)
+
+    @override_settings(NOTIFICATIONS_RESUME_LIMIT=1)
+    async def test_resume_from_last_event_id_then_live(self):
+        """
+        Пропущенные после Last-Event-ID сообщения приходят страницами, затем — новые; id события — Message.sequence.
+        """
+        messages = await database_sync_to_async(self.create_messages)(3)
+        communicator = self.open_stream(self.user, [(b'last-event-id', str(messages[0].sequence).encode())])
+        start = await self.start(communicator)
+        self.assertEqual(start['status'], 200)
+        self.assertIn((b'Content-Type', b'text/event-stream'), start['headers'])
+
+        retry, *events = await self.read_events(communicator, 3)
+        self.assertEqual(retry, {'retry': '3000'})
+        self.assertEqual([int(event['id']) for event in events], [messages[1].sequence, messages[2].sequence])
+        self.assertEqual(json.loads(events[0]['data'])['title'], 'Message 1')
+
+        new = await database_sync_to_async(self.create_messages)(1)
+        event, = await self.read_events(communicator, 1)
+        self.assertEqual((event['event'], int(event['id'])), ('message', new[0].sequence))
+        await self.close(communicator)
+
+    async def test_resume_merge_into_older_message(self):
+        """
+        Склейка в сообщение, полученное до разрыва, догружается по Last-Event-ID с новым id события.
+        """
+        merger = UpdateCoalescer(window=60)
+        task = await database_sync_to_async(Task.objects.create)(
+            title='Task', description='Description', project=self.project, executor=self.user,
+            term='2023-12-31', responsible_for_test='Tester')
+        first = await database_sync_to_async(merger.task_updated)(task, ['title'])
+        later = await database_sync_to_async(self.create_messages)(1)
+        merged = await database_sync_to_async(merger.task_updated)(task, ['status'])
+
+        communicator = self.open_stream(self.user, [(b'last-event-id', str(later[0].sequence).encode())])
+        await self.start(communicator)
+        _, event = await self.read_events(communicator, 2)
+        self.assertEqual(int(event['id']), merged.sequence)
+        data = json.loads(event['data'])
+        self.assertEqual((data['id'], data['updates']), (first.id, 2))
+        await self.close(communicator)
+
+    @override_settings(NOTIFICATIONS_SSE_HEARTBEAT=0.05, NOTIFICATIONS_SSE_MAX_DURATION=0.2)
+    async def test_heartbeat_and_max_duration(self):
+        """
+        Без событий уходит heartbeat, по истечении времени жизни поток завершается.
+        """
+        communicator = self.open_stream(self.user)
+        await self.start(communicator)
+        await communicator.receive_output()
+        body = await communicator.receive_output()
+        self.assertEqual(body['body'], b': heartbeat\n\n')
+        while body.get('more_body'):
+            body = await communicator.receive_output()
+        self.assertEqual(body['body'], b'')
+        await self.close(communicator)
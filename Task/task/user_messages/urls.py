@@ -1,7 +1,10 @@
 from django.urls import path
-from .views import MessageList, MessageDelete
+from .views import MessageList, MessageDelete, MessageUnread, MessageMarkRead, MessageBulkDelete
 
 urlpatterns = [
     path('', MessageList.as_view(), name='message-list'),
-    path('delete/<int:pk>', MessageDelete.as_view(), name='message-delete')
+    path('delete/<int:pk>', MessageDelete.as_view(), name='message-delete'),
+    path('unread/', MessageUnread.as_view(), name='message-unread'),
+    path('read/', MessageMarkRead.as_view(), name='message-read'),
+    path('delete/', MessageBulkDelete.as_view(), name='message-bulk-delete'),
 ]
\ No newline at end of file
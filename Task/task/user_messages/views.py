@@ -1,16 +1,67 @@
 from .models import Message
 from .serializers import MessageSerializer
+from .filters import MessageFilter
+from .inbox import MessageSelectionSerializer, delete_messages, get_unread, mark_read
+from task.expand import ExpandMixin
+from task.fieldsets import SparseFieldsetMixin
+from task.response_cache import ResponseCacheMixin
 from rest_framework import generics
-from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
 # Create your views here.
 
-class MessageList(generics.ListCreateAPIView):
-    queryset = Message.objects.all()
+class MessageList(SparseFieldsetMixin, ExpandMixin, ResponseCacheMixin, generics.ListCreateAPIView):
+    # Входящие текущего пользователя; ?unread=true — только непрочитанные;
+    # ?expand=task,project,owner разворачивает связи без запроса на каждую строку
     serializer_class = MessageSerializer
-    permission_classes = (IsAuthenticatedOrReadOnly, )
+    permission_classes = (IsAuthenticated, )
+    filterset_class = MessageFilter
+    throttle_scope = 'messages'
+
+    def get_queryset(self):
+        return Message.objects.filter(owner_id=self.request.user.pk)
+
+    def get_cache_scopes(self):
+        return [f'user:{self.request.user.pk}']
 
 class MessageDelete(generics.DestroyAPIView):
-    queryset = Message.objects.all()
     serializer_class = MessageSerializer
-    permission_classes = (IsAuthenticatedOrReadOnly, )
\ No newline at end of file
+    permission_classes = (IsAuthenticated, )
+    throttle_scope = 'messages'
+
+    def get_queryset(self):
+        return Message.objects.filter(owner_id=self.request.user.pk)
+
+
+class MessageUnread(APIView):
+    """Счётчик непрочитанных для бейджа: одна строка UnreadCounter по первичному ключу."""
+    permission_classes = (IsAuthenticated, )
+
+    def get(self, request):
+        return Response({'unread': get_unread(request.user.pk)})
+
+
+class MessageMarkRead(APIView):
+    """Отмечает прочитанными сообщения по списку id и диапазонам id."""
+    permission_classes = (IsAuthenticated, )
+    throttle_scope = 'messages'
+
+    def post(self, request):
+        serializer = MessageSelectionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        updated = mark_read(request.user.pk, serializer.get_filter())
+        return Response({'updated': updated, 'unread': get_unread(request.user.pk)})
+
+
+class MessageBulkDelete(APIView):
+    """Удаляет сообщения по списку id и диапазонам id."""
+    permission_classes = (IsAuthenticated, )
+    throttle_scope = 'messages'
+
+    def post(self, request):
+        serializer = MessageSelectionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        deleted = delete_messages(request.user.pk, serializer.get_filter())
+        return Response({'deleted': deleted, 'unread': get_unread(request.user.pk)})
\ No newline at end of file
@@ -0,0 +1,148 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+DEFAULTS = {
+    'ALIAS': 'default',
+    'TTL': 60,
+    'LOCAL_TTL': 5,
+    'LOCAL_SIZE': 1024,
+    'STATELESS': False,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'AUTH_USER_CACHE', {})}
+
+
+class UserCache:
+    """
+    Пользователи для аутентификации по JWT в два уровня: LRU в памяти процесса
+    (LOCAL_TTL секунд, LOCAL_SIZE записей) и общий кэш CACHES[ALIAS] (TTL секунд).
+
+    В кэше лежат только поля, нужные аутентификации и правам (fields), и
+    md5 хэша пароля для CHECK_REVOKE_TOKEN — не хэш пароля и не весь профиль.
+    Каждый запрос получает новый объект User, собранный из них; остальные
+    поля отложены (как у .only()) и читаются из базы при обращении.
+
+    Сигналы User (users/signals.py) удаляют запись из общего кэша и из LRU
+    своего процесса; в других процессах запись живёт не дольше LOCAL_TTL.
+    QuerySet.update (например, update(is_active=False)) сигналов не шлёт:
+    такая деактивация действует через TTL, поэтому он короткий — или после
+    user_cache.invalidate(id).
+    """
+    fields = ('username', 'is_active', 'is_staff', 'is_superuser')
+
+    def __init__(self):
+        self.local = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {'local_hits': 0, 'shared_hits': 0, 'misses': 0}
+
+    def key(self, user_id):
+        return f'auth:user:{user_id}'
+
+    def pack(self, user):
+        return {
+            'pk': user.pk,
+            **{name: getattr(user, name) for name in self.fields},
+            'password_digest': get_md5_hash_password(user.password),
+        }
+
+    def unpack(self, data):
+        """(User только с полями fields, md5 хэша пароля)."""
+        model = get_user_model()
+        values = {model._meta.pk.attname: data['pk'], **{name: data[name] for name in self.fields}}
+        # from_db ждёт значения в порядке полей модели
+        names = [field.attname for field in model._meta.concrete_fields if field.attname in values]
+        user = model.from_db(DEFAULT_DB_ALIAS, names, [values[name] for name in names])
+        return user, data['password_digest']
+
+    def get(self, user_id):
+        """(user, md5 хэша пароля) или None, если пользователя нет в кэше."""
+        config = get_config()
+        now = time.monotonic()
+        with self.lock:
+            entry = self.local.get(user_id)
+            if entry is not None and entry[0] > now:
+                self.local.move_to_end(user_id)
+                self.stats['local_hits'] += 1
+                return self.unpack(entry[1])
+        data = caches[config['ALIAS']].get(self.key(user_id))
+        if data is None:
+            self.stats['misses'] += 1
+            return None
+        self.stats['shared_hits'] += 1
+        self.remember(user_id, data, config)
+        return self.unpack(data)
+
+    def set(self, user):
+        config = get_config()
+        user_id = getattr(user, api_settings.USER_ID_FIELD)
+        data = self.pack(user)
+        caches[config['ALIAS']].set(self.key(user_id), data, config['TTL'])
+        self.remember(user_id, data, config)
+
+    def remember(self, user_id, data, config):
+        with self.lock:
+            self.local[user_id] = (time.monotonic() + config['LOCAL_TTL'], data)
+            self.local.move_to_end(user_id)
+            while len(self.local) > config['LOCAL_SIZE']:
+                self.local.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self.lock:
+            self.local.pop(user_id, None)
+        caches[get_config()['ALIAS']].delete(self.key(user_id))
+
+    def clear(self):
+        with self.lock:
+            self.local.clear()
+
+
+user_cache = UserCache()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication, который берёт пользователя из UserCache вместо SELECT
+    на каждый запрос. Проверки is_active и отзыва токена при смене пароля
+    (CHECK_REVOKE_TOKEN) выполняются и для пользователя из кэша.
+
+    При AUTH_USER_CACHE['STATELESS'] база и кэш не используются вовсе: запрос
+    получает TokenUser из claims токена (id, username, is_superuser кладёт
+    CustomTokenObtainPairSerializer). Деактивация и смена пароля тогда
+    действуют только после истечения уже выданных токенов.
+    """
+
+    def get_user(self, validated_token):
+        if get_config()['STATELESS']:
+            return api_settings.TOKEN_USER_CLASS(validated_token)
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        cached = user_cache.get(user_id)
+        if cached is None:
+            user = super().get_user(validated_token)
+            user_cache.set(user)
+            return user
+
+        user, password_digest = cached
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != password_digest:
+                raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+        return user
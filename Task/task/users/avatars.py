@@ -0,0 +1,202 @@
+import hashlib
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from PIL import Image, ImageOps, features
+from rest_framework.exceptions import ValidationError
+
+logger = logging.getLogger(__name__)
+
+# Обработка аватаров. Загруженный файл сохраняется как есть, а после коммита
+# в фоновом потоке режется в квадраты SIZES и пережимается в WEBP (или JPEG).
+# Имя варианта — хэш содержимого оригинала и параметров обработки:
+# avatars/ab/ab12…-128.webp, поэтому файл по имени никогда не меняется (его
+# можно кэшировать как immutable), а одинаковые загрузки дают одни и те же
+# файлы. После обработки User.avatar указывает на самый большой вариант,
+# исходная загрузка удаляется. То, что не успели обработать в фоне (рестарт,
+# ошибка) и старые загрузки, доделывает manage.py process_avatars.
+
+DEFAULTS = {
+    'SIZES': {'small': 64, 'medium': 128, 'large': 256},
+    'DEFAULT_SIZE': 'medium',
+    'FORMAT': 'WEBP',
+    'QUALITY': 80,
+    'WORKERS': 1,
+    'BACKGROUND': True,
+}
+
+EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg'}
+
+
+def get_config():
+    config = {**DEFAULTS, **getattr(settings, 'AVATARS', {})}
+    if config['FORMAT'] == 'WEBP' and not features.check('webp'):
+        config['FORMAT'] = 'JPEG'
+    return config
+
+
+def get_default_avatar():
+    from .models import User
+    return User._meta.get_field('avatar').default
+
+
+def content_hash(data, config):
+    digest = hashlib.sha256(f'{config["FORMAT"]}:{config["QUALITY"]}:'.encode())
+    digest.update(data)
+    return digest.hexdigest()[:40]
+
+
+def variant_name(digest, size, config):
+    return f'avatars/{digest[:2]}/{digest}-{size}.{EXTENSIONS[config["FORMAT"]]}'
+
+
+def master_name(digest, config):
+    return variant_name(digest, max(config['SIZES'].values()), config)
+
+
+def needs_processing(user):
+    """Аватар загружен, но ещё не заменён вариантом с именем по хэшу."""
+    name = user.avatar.name if user.avatar else ''
+    if not name or name == get_default_avatar():
+        return False
+    return not user.avatar_hash or name != master_name(user.avatar_hash, get_config())
+
+
+def render_variants(data, config):
+    """{размер: байты} — квадратные варианты изображения data для всех SIZES."""
+    image = Image.open(io.BytesIO(data))
+    largest = max(config['SIZES'].values())
+    # JPEG декодируется сразу в уменьшенном виде, не разворачивая все пиксели оригинала
+    image.draft('RGB', (largest * 2, largest * 2))
+    image = ImageOps.exif_transpose(image)
+    if config['FORMAT'] == 'JPEG' or image.mode not in ('RGB', 'RGBA'):
+        has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+    if config['FORMAT'] == 'JPEG' and image.mode == 'RGBA':
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+
+    variants = {}
+    for size in sorted(set(config['SIZES'].values()), reverse=True):
+        image = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        image.save(buffer, config['FORMAT'], quality=config['QUALITY'], optimize=True)
+        variants[size] = buffer.getvalue()
+    return variants
+
+
+def save_variant(storage, name, content):
+    """
+    Записывает вариант под именем name. exists() и save() не атомарны: если
+    параллельный обработчик (фоновый поток и process_avatars) успел записать
+    тот же файл, storage.save выбирает имя с суффиксом. Содержимое у них
+    одинаковое (имя — хэш), поэтому копия с суффиксом удаляется.
+    """
+    saved = storage.save(name, ContentFile(content))
+    if saved != name:
+        storage.delete(saved)
+        if not storage.exists(name):
+            raise OSError(f'хранилище сохранило {name} как {saved}')
+
+
+def process_avatar(user_id):
+    """
+    Делает варианты текущего аватара пользователя и переключает на них User.avatar.
+    True — аватар обработан (или обрабатывать нечего).
+    """
+    from .authentication import user_cache
+    from .models import User
+
+    user = User.objects.filter(pk=user_id).only('avatar', 'avatar_hash').first()
+    if user is None or not needs_processing(user):
+        return True
+    config = get_config()
+    storage = user.avatar.storage
+    original = user.avatar.name
+    try:
+        with storage.open(original, 'rb') as file:
+            data = file.read()
+        digest = content_hash(data, config)
+        missing = [size for size in config['SIZES'].values() if not storage.exists(variant_name(digest, size, config))]
+        if missing:
+            for size, content in render_variants(data, config).items():
+                name = variant_name(digest, size, config)
+                if not storage.exists(name):
+                    save_variant(storage, name, content)
+    except Exception:
+        logger.exception('avatars: не удалось обработать %s пользователя %s', original, user_id)
+        return False
+
+    # Аватар могли сменить, пока шла обработка: тогда новая загрузка обработается своим заданием
+    updated = User.objects.filter(pk=user_id, avatar=original).update(
+        avatar=master_name(digest, config), avatar_hash=digest,
+    )
+    if updated:
+        user_cache.invalidate(user_id)
+        storage.delete(original)
+    return True
+
+
+class AvatarWorker:
+    """Фоновые потоки обработки аватаров внутри процесса веб-сервера."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.executor = None
+
+    def submit(self, user_id):
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=get_config()['WORKERS'],
+                                                   thread_name_prefix='avatars')
+            return self.executor.submit(self.run, user_id)
+
+    def run(self, user_id):
+        try:
+            return process_avatar(user_id)
+        finally:
+            # Соединения с БД потоков пула не закрывает обработчик запроса
+            connections.close_all()
+
+
+avatar_worker = AvatarWorker()
+
+
+def schedule_avatar(user):
+    """После коммита ставит обработку аватара в фон (или выполняет сразу при BACKGROUND=False)."""
+    if not needs_processing(user):
+        return
+    user_id = user.pk
+    if get_config()['BACKGROUND']:
+        transaction.on_commit(lambda: avatar_worker.submit(user_id))
+    else:
+        transaction.on_commit(lambda: process_avatar(user_id))
+
+
+def get_avatar_size(request):
+    """Имя размера из ?avatar_size= (по умолчанию DEFAULT_SIZE)."""
+    config = get_config()
+    size = config['DEFAULT_SIZE']
+    if request is not None:
+        size = request.query_params.get('avatar_size', size)
+    if size not in config['SIZES']:
+        raise ValidationError({'avatar_size': [f'Допустимые размеры: {", ".join(config["SIZES"])}.']})
+    return size
+
+
+def avatar_url(user, size, request=None):
+    """URL варианта аватара размера size; пока аватар не обработан — URL исходного файла."""
+    if not user.avatar:
+        return None
+    if needs_processing(user) or not user.avatar_hash:
+        url = user.avatar.url
+    else:
+        config = get_config()
+        url = user.avatar.storage.url(variant_name(user.avatar_hash, config['SIZES'][size], config))
+    return request.build_absolute_uri(url) if request is not None else url
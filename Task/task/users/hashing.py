@@ -0,0 +1,157 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher, identify_hasher, is_password_usable, make_password
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+# Хэширование и проверка паролей (PBKDF2 и т. п.) — сотни миллисекунд CPU на
+# вызов. Они выполняются в отдельном ограниченном пуле потоков: hashlib,
+# bcrypt и argon2 отпускают GIL, поэтому пул считает параллельно, а всплеск
+# логинов занимает только его WORKERS потоков, а не воркеры всего API.
+# В работе и очереди одновременно не больше MAX_PENDING задач; задача,
+# прождавшая в очереди дольше QUEUE_TIMEOUT, не считается вовсе — клиент
+# получает 503 с Retry-After, и после всплеска очередь быстро рассасывается.
+# Потоки пула работают с пониженным приоритетом (NICE, только Linux), чтобы
+# планировщик ОС отдавал ядра обычным запросам раньше, чем хэшированию.
+#
+# Синхронный код (регистрация и смена пароля в сериализаторах) ждёт результат
+# в потоке запроса, поэтому в очередь не встаёт: задача принимается, только
+# если в пуле есть свободный поток, иначе сразу 503. Поток запроса занят не
+# дольше одного хэша — как и без пула, — а не ждёт ещё и чужие.
+
+DEFAULTS = {
+    'WORKERS': max(1, (os.cpu_count() or 2) // 2),
+    'MAX_PENDING': 64,
+    'QUEUE_TIMEOUT': 2.0,
+    'RETRY_AFTER': 1,
+    'NICE': 10,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'PASSWORD_HASHING', {})}
+
+
+class HashingUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Сервер перегружен проверкой паролей, повторите попытку позже.'
+    default_code = 'hashing_unavailable'
+
+    def __init__(self, detail=None, code=None):
+        super().__init__(detail, code)
+        # exception_handler DRF выставляет по wait заголовок Retry-After
+        self.wait = get_config()['RETRY_AFTER']
+
+
+def lower_priority(nice):
+    # В Linux nice задаётся для отдельного потока по его native id; поднять приоритет без прав нельзя
+    if not nice or not hasattr(os, 'setpriority'):
+        return
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), nice)
+    except OSError:
+        pass
+
+
+class HashingPool:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.executor = None
+        self.workers = None
+        self.pending = 0
+        self.stats = {'completed': 0, 'rejected': 0, 'expired': 0}
+
+    def get_executor(self, workers, nice):
+        if self.executor is None or self.workers != (workers, nice):
+            if self.executor is not None:
+                self.executor.shutdown(wait=False)
+            self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hashing',
+                                               initializer=lower_priority, initargs=(nice, ))
+            self.workers = (workers, nice)
+        return self.executor
+
+    def submit(self, fn, *args, limit=None):
+        """
+        Ставит fn(*args) в пул; HashingUnavailable, если в работе и очереди уже
+        MAX_PENDING задач (или limit, если он меньше).
+        """
+        config = get_config()
+        limit = config['MAX_PENDING'] if limit is None else min(limit, config['MAX_PENDING'])
+        with self.lock:
+            if self.pending >= limit:
+                self.stats['rejected'] += 1
+                raise HashingUnavailable()
+            self.pending += 1
+            executor = self.get_executor(config['WORKERS'], config['NICE'])
+        deadline = time.monotonic() + config['QUEUE_TIMEOUT']
+        try:
+            return executor.submit(self.run, deadline, fn, args)
+        except BaseException:
+            with self.lock:
+                self.pending -= 1
+            raise
+
+    def run(self, deadline, fn, args):
+        try:
+            if time.monotonic() > deadline:
+                with self.lock:
+                    self.stats['expired'] += 1
+                raise HashingUnavailable()
+            result = fn(*args)
+            with self.lock:
+                self.stats['completed'] += 1
+            return result
+        finally:
+            with self.lock:
+                self.pending -= 1
+
+    def call(self, fn, *args):
+        """Для синхронного кода: только на свободный поток пула, без очереди."""
+        return self.submit(fn, *args, limit=get_config()['WORKERS']).result()
+
+    async def acall(self, fn, *args):
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+
+hashing_pool = HashingPool()
+
+
+def verify_password(password, encoded):
+    """
+    (верен ли пароль, новый хэш или None) — как django.contrib.auth.hashers.check_password,
+    только вместо вызова setter новый хэш возвращается, если параметры хэшера
+    устарели (другой алгоритм по умолчанию или выросло число итераций).
+    """
+    if password is None or not is_password_usable(encoded):
+        return False, None
+    preferred = get_hasher('default')
+    try:
+        hasher = identify_hasher(encoded)
+    except ValueError:
+        return False, None
+    hasher_changed = hasher.algorithm != preferred.algorithm
+    must_update = hasher_changed or preferred.must_update(encoded)
+    is_correct = hasher.verify(password, encoded)
+    if not is_correct and not hasher_changed and must_update:
+        hasher.harden_runtime(password, encoded)
+    if is_correct and must_update:
+        return True, make_password(password)
+    return is_correct, None
+
+
+def hash_password(password):
+    """make_password в пуле; для синхронного кода (сериализаторы)."""
+    return hashing_pool.call(make_password, password)
+
+
+async def ahash_password(password):
+    return await hashing_pool.acall(make_password, password)
+
+
+async def averify_password(password, encoded):
+    return await hashing_pool.acall(verify_password, password, encoded)
@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from users.authentication import CachedJWTAuthentication, get_config, user_cache
+from users.models import User
+from users.serializers import CustomTokenObtainPairSerializer
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает JWT-аутентификацию без кэша, с UserCache и в режиме STATELESS: запросы к БД и время на запрос'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000)
+
+    def handle(self, *args, requests, **options):
+        user, created = User.objects.get_or_create(username='bench-auth')
+        if created:
+            user.set_password('bench-auth')
+            user.save()
+        token = str(CustomTokenObtainPairSerializer.get_token(user).access_token)
+        factory = APIRequestFactory()
+
+        modes = [
+            ('simplejwt', JWTAuthentication(), {}),
+            ('cached', CachedJWTAuthentication(), {}),
+            # Без LRU процесса: каждый запрос идёт в общий кэш
+            ('shared', CachedJWTAuthentication(), {'LOCAL_TTL': 0}),
+            ('stateless', CachedJWTAuthentication(), {'STATELESS': True}),
+        ]
+        for name, authentication, config in modes:
+            with override_settings(AUTH_USER_CACHE={**get_config(), **config}):
+                user_cache.clear()
+                stats = dict(user_cache.stats)
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    for _ in range(requests):
+                        request = Request(factory.get('/api/v1/tasks/', HTTP_AUTHORIZATION=f'Bearer {token}'))
+                        authenticated, _ = authentication.authenticate(request)
+                    elapsed = time.perf_counter() - started
+                hits = {key: user_cache.stats[key] - stats[key] for key in stats}
+            self.stdout.write(
+                f'{name:>10}: {len(captured) / requests:.3f} queries/request, '
+                f'{elapsed / requests * 1e6:.1f} us/request, user={authenticated.username!r}, cache={hits}'
+            )
@@ -0,0 +1,119 @@
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from user_messages.backpressure import percentile
+from user_messages.management.commands.loadtest_websockets import wait_for_port
+from users.models import User
+from users.serializers import CustomTokenObtainPairSerializer
+
+
+def fetch(request):
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as exc:
+        return exc.code
+
+
+def login_loop(base, stop, counts):
+    body = json.dumps({'username': 'bench-login', 'password': 'bench-login'}).encode()
+    while not stop.is_set():
+        code = fetch(urllib.request.Request(base + '/api/v1/token/', data=body,
+                                            headers={'Content-Type': 'application/json'}))
+        counts[code] = counts.get(code, 0) + 1
+
+
+def flood(base, logins, duration, results):
+    # Отдельный процесс: клиентские потоки логинов не делят GIL с потоком, который меряет задержку
+    stop = threading.Event()
+    counts = {}
+    with ThreadPoolExecutor(max_workers=logins) as executor:
+        for _ in range(logins):
+            executor.submit(login_loop, base, stop, counts)
+        time.sleep(duration)
+        stop.set()
+    results.put(counts)
+
+
+class Command(BaseCommand):
+    help = ('Задержка обычного эндпоинта (по умолчанию /api/v1/messages/unread/) до и во время '
+            'потока логинов на /api/v1/token/: запускает daphne и сравнивает p50/p99')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=32, help='Параллельных клиентов, бьющих в /api/v1/token/')
+        parser.add_argument('--duration', type=float, default=10.0, help='Секунд на каждую фазу')
+        parser.add_argument('--probe', default='/api/v1/messages/unread/')
+        parser.add_argument('--probe-interval', type=float, default=0.02)
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8766)
+        parser.add_argument('--no-spawn', action='store_true', help='Не запускать daphne: сервер уже работает')
+
+    def handle(self, *args, logins, duration, probe, probe_interval, host, port, no_spawn, **options):
+        user, created = User.objects.get_or_create(username='bench-login')
+        if created or not user.check_password('bench-login'):
+            user.set_password('bench-login')
+            user.save()
+        token = str(CustomTokenObtainPairSerializer.get_token(user).access_token)
+        base = f'http://{host}:{port}'
+
+        server = None
+        if not no_spawn:
+            server = subprocess.Popen(
+                [sys.executable, '-m', 'daphne', '-b', host, '-p', str(port), settings.ASGI_APPLICATION.replace(
+                    '.application', ':application')],
+                cwd=settings.BASE_DIR, env=os.environ.copy(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+        try:
+            wait_for_port(host, port, 30)
+            probe_request = lambda: urllib.request.Request(base + probe, headers={'Authorization': f'Bearer {token}'})
+            # Прогрев: первые запросы открывают соединение с БД и импортируют представления
+            for _ in range(5):
+                fetch(probe_request())
+
+            baseline = self.measure(probe_request, duration, probe_interval)
+            context = multiprocessing.get_context('fork')
+            results = context.Queue()
+            flooder = context.Process(target=flood, args=(base, logins, duration, results))
+            flooder.start()
+            try:
+                during = self.measure(probe_request, duration, probe_interval)
+                counts = results.get(timeout=duration + 60)
+            finally:
+                flooder.join()
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+        for name, latencies in (('baseline', baseline), ('login flood', during)):
+            self.stdout.write(
+                f'{name:>12}: {probe} n={len(latencies)} '
+                f'p50={percentile(latencies, 0.5) * 1000:.1f}ms p99={percentile(latencies, 0.99) * 1000:.1f}ms '
+                f'max={max(latencies) * 1000:.1f}ms'
+            )
+        self.stdout.write(
+            f'logins: {logins} clients, {counts.get(200, 0) / duration:.1f}/s ok, '
+            f'status counts {dict(sorted(counts.items()))}'
+        )
+
+    def measure(self, make_request, duration, interval):
+        latencies = []
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            fetch(make_request())
+            latencies.append(time.perf_counter() - started)
+            time.sleep(interval)
+        return latencies
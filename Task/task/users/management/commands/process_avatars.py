@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.avatars import get_default_avatar, needs_processing, process_avatar
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = ('Обрабатывает аватары, которые ещё не заменены вариантами по хэшу содержимого: '
+            'старые загрузки и те, что не успели обработаться в фоне')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Работать постоянно, опрашивая пользователей')
+        parser.add_argument('--interval', type=float, default=60.0, help='Пауза между проходами, сек')
+
+    def handle(self, *args, loop=False, interval=60.0, **options):
+        while True:
+            processed = failed = 0
+            users = (User.objects.exclude(avatar__isnull=True).exclude(avatar='')
+                     .exclude(avatar=get_default_avatar()).only('avatar', 'avatar_hash').order_by('id'))
+            for user in users.iterator():
+                if not needs_processing(user):
+                    continue
+                if process_avatar(user.pk):
+                    processed += 1
+                else:
+                    failed += 1
+            if processed or failed or not loop:
+                self.stdout.write(f'processed={processed} failed={failed}')
+            if not loop:
+                break
+            time.sleep(interval)
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.11 on 2026-10-18 20:35
+
+from django.db import migrations
+
+# Участники проектов теперь только в main_membership (main 0007 перенёс туда
+# и эту таблицу). При откате таблица восстанавливается из main_membership.
+RESTORE_SQL = """
+INSERT INTO users_user_user_projects (user_id, project_id)
+SELECT user_id, project_id FROM main_membership;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_membership'),
+        ('users', '0007_user_avatar_hash'),
+    ]
+
+    operations = [
+        migrations.RunSQL(migrations.RunSQL.noop, RESTORE_SQL),
+        migrations.RemoveField(
+            model_name='user',
+            name='user_projects',
+        ),
+    ]
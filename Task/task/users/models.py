@@ -17,8 +17,9 @@ class User(AbstractUser):
     email = models.EmailField(default='')
     usable_password = models.CharField(max_length=100, null=True)
     avatar = models.ImageField(upload_to='avatars/', null=True, blank=True, default='avatars/default_avatar.png')
+    # Хэш содержимого обработанного аватара (users/avatars.py); пусто, пока загрузка не обработана
+    avatar_hash = models.CharField(max_length=40, null=True, blank=True, editable=False)
     role = models.CharField(max_length=2, choices=Role.choices, default=Role.INTERN, null=True)
-    user_projects = models.ManyToManyField('main.Project', related_name='projects', null=True, blank=True)
 
     def __str__(self):
         return self.username
@@ -1,26 +1,40 @@
 from rest_framework import serializers
+from task.fieldsets import SparseFieldsetSerializerMixin
+from .avatars import avatar_url, get_avatar_size
+from .hashing import hash_password
 from .models import User
-from django.contrib.auth.hashers import make_password
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
-class UserSerializer(serializers.ModelSerializer):
+class AvatarSerializerMixin:
+    """avatar в ответе — URL варианта размера ?avatar_size= (small, medium, large), а не исходного файла."""
+    field_dependencies = {'avatar': ('avatar_hash', )}
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if 'avatar' in data:
+            request = self.context.get('request')
+            data['avatar'] = avatar_url(instance, get_avatar_size(request), request)
+        return data
+
+
+class UserSerializer(AvatarSerializerMixin, SparseFieldsetSerializerMixin, serializers.ModelSerializer):
+    # Проекты пользователя (Membership); состав меняется через проект
+    user_projects = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+
     class Meta:
         model = User
         fields = '__all__'
+        # Хэш пароля наружу не отдаётся
+        extra_kwargs = {'password': {'write_only': True}}
 
     def create(self, validated_data):
-        user = User.objects.create(
+        # Хэш до вставки: при 503 от пула пользователь без пароля не создаётся
+        password = hash_password(validated_data['password'])
+        return User.objects.create(
             username=validated_data['username'],
-            email=validated_data.get('email', '')
+            email=validated_data.get('email', ''),
+            password=password,
         )
-        user.set_password(validated_data['password'])
-        user.save()
-        return user
-
-    def get_avatar(self, obj):
-        if obj.avatar:
-            return self.context['request'].build_absolute_uri(obj.avatar.url)
-        return None
 
     def update(self, instance, validated_data):
         instance.username = validated_data.get('username', instance.username)
@@ -35,12 +49,19 @@ class UserSerializer(serializers.ModelSerializer):
 
         password = validated_data.get('password')
         if password:
-            instance.password = make_password(password)
+            instance.password = hash_password(password)
 
         instance.save()
         return instance
 
 
+class UserBriefSerializer(AvatarSerializerMixin, SparseFieldsetSerializerMixin, serializers.ModelSerializer):
+    """Пользователь внутри развёрнутых связей (?expand=...executor): без пароля и служебных полей."""
+    class Meta:
+        model = User
+        fields = ('id', 'username', 'first_name', 'last_name', 'email', 'role', 'avatar')
+
+
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     @classmethod
     def get_token(cls, user):
@@ -0,0 +1,26 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.settings import api_settings
+
+from .authentication import user_cache
+from .avatars import schedule_avatar
+from .models import User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, raw=False, **kwargs):
+    # Сохранение, удаление и смена пароля (set_password + save) сбрасывают пользователя в UserCache.
+    # Повторно после коммита: параллельный запрос мог успеть положить в кэш ещё старую строку
+    user_id = getattr(instance, api_settings.USER_ID_FIELD)
+    user_cache.invalidate(user_id)
+    transaction.on_commit(lambda: user_cache.invalidate(user_id))
+
+
+@receiver(post_save, sender=User)
+def process_uploaded_avatar(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Новая загрузка режется на варианты в фоне после коммита (users/avatars.py)
+    if raw or (update_fields is not None and 'avatar' not in update_fields):
+        return
+    schedule_avatar(instance)
\ No newline at end of file
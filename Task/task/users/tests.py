@@ -1,7 +1,33 @@
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
+from main.models import Membership, Project
+from task.testing import QueryPlanMixin
+from task.throttling import TokenBucketThrottle
+from PIL import Image
+from .authentication import get_config, user_cache
+from .avatars import get_config as get_avatar_config, process_avatar
+from .hashing import HashingPool, HashingUnavailable, get_config as get_hashing_config, hashing_pool
 from .models import User
+from .serializers import CustomTokenObtainPairSerializer
 
 class UserViewTests(APITestCase):
     def setUp(self):
@@ -62,3 +88,412 @@ class UserViewTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertEqual(User.objects.count(), 2)
 
+    def test_list_is_slim_projection(self):
+        """
+        Список по умолчанию — короткая карточка без пароля, прав и проектов, читаемая одним запросом.
+        """
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('user-list'))
+        self.assertEqual(set(response.data[0]), {'id', 'username', 'first_name', 'last_name', 'email', 'role', 'avatar'})
+        selects = [query['sql'] for query in captured.captured_queries if 'FROM "users_user"' in query['sql']]
+        self.assertEqual(len(selects), 1)
+        self.assertNotIn('"users_user"."password"', selects[0])
+        self.assertNotIn('password', self.client.get(reverse('user-detail', args=[self.user1.id])).data)
+
+    def test_requested_m2m_is_prefetched(self):
+        """
+        ?fields= с M2M подгружает его одним запросом на весь список, а не на каждого пользователя.
+        """
+        counts = []
+        for i in range(2):
+            with CaptureQueriesContext(connection) as captured:
+                response = self.client.get(reverse('user-list'), {'fields': 'id,username,groups,user_projects'})
+            counts.append(len(captured))
+            User.objects.create_user(username=f'extra{i}', password='pass')
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(set(response.data[0]), {'id', 'username', 'groups', 'user_projects'})
+
+
+
+class CachedAuthenticationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        token = CustomTokenObtainPairSerializer.get_token(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        cache.clear()
+        user_cache.clear()
+
+    def request(self, expected=status.HTTP_200_OK):
+        """Запрос с JWT; возвращает число SELECT к users_user."""
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('message-list'))
+        self.assertEqual(response.status_code, expected)
+        return len([query for query in captured.captured_queries if 'FROM "users_user"' in query['sql']])
+
+    def test_user_is_loaded_once(self):
+        """
+        Пользователь загружается из базы только при первом запросе, дальше — из LRU процесса.
+        """
+        self.assertEqual(self.request(), 1)
+        self.assertEqual(self.request(), 0)
+        self.assertEqual(self.request(), 0)
+
+    def test_shared_tier_survives_local_eviction(self):
+        """
+        Без записи в LRU процесса пользователь берётся из общего кэша, а не из базы.
+        """
+        self.request()
+        user_cache.clear()
+        shared_hits = user_cache.stats['shared_hits']
+        self.assertEqual(self.request(), 0)
+        self.assertEqual(user_cache.stats['shared_hits'], shared_hits + 1)
+
+    def test_save_and_password_change_invalidate(self):
+        """
+        Сохранение пользователя и смена пароля сбрасывают кэш: следующий запрос читает базу.
+        """
+        self.request()
+        self.user.first_name = 'Renamed'
+        self.user.save()
+        self.assertEqual(self.request(), 1)
+        self.user.set_password('newpass')
+        self.user.save()
+        self.assertEqual(self.request(), 1)
+        self.assertEqual(self.request(), 0)
+
+    def test_inactive_and_deleted_users_are_rejected(self):
+        """
+        Деактивированный и удалённый пользователь не проходят аутентификацию, несмотря на кэш.
+        """
+        self.request()
+        self.user.is_active = False
+        self.user.save()
+        self.request(status.HTTP_401_UNAUTHORIZED)
+        self.user.delete()
+        self.request(status.HTTP_401_UNAUTHORIZED)
+
+    def test_cache_holds_only_auth_fields(self):
+        """
+        В общем кэше только поля аутентификации и md5 хэша пароля; остальные поля
+        пользователя из кэша отложены и читаются из базы при обращении.
+        """
+        self.request()
+        data = cache.get(user_cache.key(self.user.pk))
+        self.assertEqual(set(data), {'pk', 'username', 'is_active', 'is_staff', 'is_superuser', 'password_digest'})
+        self.assertNotIn(self.user.password, data.values())
+        user, _ = user_cache.get(self.user.pk)
+        self.assertIn('password', user.get_deferred_fields())
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, self.user.email)
+
+    def test_queryset_deactivation_takes_effect(self):
+        """
+        update(is_active=False) мимо сигналов действует не позже TTL общего кэша,
+        а после user_cache.invalidate — сразу.
+        """
+        with override_settings(AUTH_USER_CACHE={**get_config(), 'LOCAL_TTL': 0}):
+            self.request()
+            User.objects.filter(pk=self.user.pk).update(is_active=False)
+            self.request()
+            with mock.patch('time.time', return_value=time.time() + get_config()['TTL'] + 1):
+                self.request(status.HTTP_401_UNAUTHORIZED)
+
+            User.objects.filter(pk=self.user.pk).update(is_active=True)
+            self.request()
+            User.objects.filter(pk=self.user.pk).update(is_active=False)
+            user_cache.invalidate(self.user.pk)
+            self.request(status.HTTP_401_UNAUTHORIZED)
+
+    def test_stateless_mode_uses_token_claims(self):
+        """
+        В режиме STATELESS пользователь строится из claims токена без запросов к users_user.
+        """
+        with override_settings(AUTH_USER_CACHE={**get_config(), 'STATELESS': True}):
+            self.assertEqual(self.request(), 0)
+            response = self.client.get(reverse('message-unread'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class TokenObtainTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.url = reverse('token_obtain_pair')
+
+    def hashing(self, **options):
+        return override_settings(PASSWORD_HASHING={**get_hashing_config(), **options})
+
+    def test_obtain_token_pair(self):
+        """
+        Верный пароль — пара токенов с claims CustomTokenObtainPairSerializer.
+        """
+        response = self.client.post(self.url, {'username': 'testuser', 'password': 'testpass'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.json()), {'refresh', 'access'})
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.json()["access"]}')
+        self.assertEqual(self.client.get(reverse('message-unread')).status_code, status.HTTP_200_OK)
+
+    def test_invalid_credentials(self):
+        """
+        Неверный пароль, неизвестный и неактивный пользователь — 401, без полей — 400.
+        """
+        for username, password in (('testuser', 'wrong'), ('nobody', 'testpass')):
+            response = self.client.post(self.url, {'username': username, 'password': password}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.post(self.url, {'username': 'testuser', 'password': 'testpass'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.post(self.url, {'username': 'testuser'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('password', response.json())
+
+    def test_outdated_hash_is_upgraded_on_login(self):
+        """
+        Хэш с устаревшим числом итераций пересчитывается текущим хэшером при входе.
+        """
+        hasher = PBKDF2PasswordHasher()
+        User.objects.filter(pk=self.user.pk).update(password=hasher.encode('testpass', hasher.salt(), iterations=1000))
+        response = self.client.post(self.url, {'username': 'testuser', 'password': 'testpass'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith(f'pbkdf2_sha256${hasher.iterations}$'))
+        self.assertTrue(self.user.check_password('testpass'))
+
+    def test_overloaded_pool_rejects_with_retry_after(self):
+        """
+        Когда пул хэширования заполнен, вход и смена пароля отклоняются с 503 и Retry-After.
+        """
+        with self.hashing(MAX_PENDING=0, RETRY_AFTER=3):
+            response = self.client.post(self.url, {'username': 'testuser', 'password': 'testpass'}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+            self.assertEqual(response['Retry-After'], '3')
+
+            self.client.force_authenticate(user=self.user)
+            response = self.client.patch(reverse('user-detail', args=[self.user.id]), {'password': 'other'},
+                                         format='json')
+            self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+            self.assertEqual(response['Retry-After'], '3')
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('testpass'))
+
+    def test_queue_timeout_skips_expired_tasks(self):
+        """
+        Задача, прождавшая в очереди дольше QUEUE_TIMEOUT, не выполняется и отклоняется.
+        """
+        pool = HashingPool()
+        started, release = threading.Event(), threading.Event()
+
+        def block():
+            started.set()
+            release.wait(5)
+            return 'done'
+
+        with self.hashing(WORKERS=1, QUEUE_TIMEOUT=0.05):
+            first = pool.submit(block)
+            started.wait(5)
+            second = pool.submit(lambda: 'hashed')
+            threading.Event().wait(0.1)
+            release.set()
+            self.assertEqual(first.result(5), 'done')
+            with self.assertRaises(HashingUnavailable):
+                second.result(5)
+        self.assertEqual(pool.pending, 0)
+        self.assertEqual(pool.stats, {'completed': 1, 'rejected': 0, 'expired': 1})
+
+    def test_sync_hashing_does_not_queue(self):
+        """
+        Регистрация не ждёт в очереди пула: когда все его потоки заняты,
+        сразу 503 с Retry-After, и пользователь не создаётся.
+        """
+        started, release = threading.Event(), threading.Event()
+        data = {'username': 'newuser', 'password': 'newpass', 'email': 'new@example.com'}
+        with self.hashing(WORKERS=1, RETRY_AFTER=2):
+            busy = hashing_pool.submit(lambda: started.set() or release.wait(5))
+            try:
+                started.wait(5)
+                response = self.client.post(reverse('user-list'), data, format='json')
+                self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+                self.assertEqual(response['Retry-After'], '2')
+                self.assertFalse(User.objects.filter(username='newuser').exists())
+            finally:
+                release.set()
+                busy.result(5)
+            response = self.client.post(reverse('user-list'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(User.objects.get(username='newuser').check_password('newpass'))
+
+    def test_attempts_throttled_per_username_and_ip(self):
+        """
+        Сверх ставки token попытки входа под одним логином получают 429 с
+        Retry-After — даже с верным паролем и без проверки пароля; другие
+        логины ограничивает только token_ip.
+        """
+        rates = {'token': '2/min', 'token_ip': '4/min'}
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates}), \
+                mock.patch.object(TokenBucketThrottle, 'timer', mock.Mock(return_value=1_000_000.0)), \
+                mock.patch('users.views.averify_password') as verify:
+            verify.return_value = (False, None)
+            for _ in range(2):
+                response = self.client.post(self.url, {'username': 'testuser', 'password': 'wrong'}, format='json')
+                self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+            response = self.client.post(self.url, {'username': 'testuser', 'password': 'testpass'}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            self.assertEqual(response['Retry-After'], '30')
+            self.assertEqual(verify.call_count, 2)
+
+            response = self.client.post(self.url, {'username': 'nobody', 'password': 'x'}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+            response = self.client.post(self.url, {'username': 'nobody2', 'password': 'x'}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+
+def make_png(size=(800, 600), color=(200, 30, 30)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class AvatarTests(APITestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, True)
+        settings = override_settings(MEDIA_ROOT=self.media, AVATARS={**get_avatar_config(), 'BACKGROUND': False})
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.client.force_authenticate(user=self.user)
+
+    def upload(self, user, data, name='avatar.png'):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(reverse('user-detail', args=[user.id]),
+                                         {'avatar': SimpleUploadedFile(name, data, content_type='image/png')},
+                                         format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        user.refresh_from_db()
+        return response
+
+    def stored_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(root, name), self.media)
+            for root, _, names in os.walk(self.media) for name in names
+        )
+
+    def test_upload_is_replaced_by_hashed_variants(self):
+        """
+        Загрузка режется в квадраты WEBP всех размеров под именами по хэшу, оригинал удаляется.
+        """
+        self.upload(self.user, make_png())
+        digest = self.user.avatar_hash
+        self.assertEqual(self.user.avatar.name, f'avatars/{digest[:2]}/{digest}-256.webp')
+        self.assertEqual(self.stored_files(), [f'avatars/{digest[:2]}/{digest}-{size}.webp' for size in (128, 256, 64)])
+        with Image.open(os.path.join(self.media, 'avatars', digest[:2], f'{digest}-64.webp')) as image:
+            self.assertEqual((image.format, image.size), ('WEBP', (64, 64)))
+
+    def test_url_for_requested_size(self):
+        """
+        avatar в ответе — URL варианта размера ?avatar_size=, по умолчанию medium; неизвестный размер — 400.
+        """
+        self.upload(self.user, make_png())
+        url = reverse('user-detail', args=[self.user.id])
+        self.assertTrue(self.client.get(url).data['avatar'].endswith(f'{self.user.avatar_hash}-128.webp'))
+        response = self.client.get(url, {'avatar_size': 'small'})
+        self.assertEqual(response.data['avatar'], f'http://testserver/media/avatars/{self.user.avatar_hash[:2]}/'
+                                                  f'{self.user.avatar_hash}-64.webp')
+        response = self.client.get(url, {'avatar_size': 'huge'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_identical_uploads_share_files(self):
+        """
+        Одинаковые загрузки разных пользователей ссылаются на одни и те же файлы вариантов.
+        """
+        other = User.objects.create_user(username='other', password='pass')
+        self.upload(self.user, make_png())
+        self.upload(other, make_png(), name='copy.png')
+        self.assertEqual(other.avatar_hash, self.user.avatar_hash)
+        self.assertEqual(other.avatar.name, self.user.avatar.name)
+        self.assertEqual(len(self.stored_files()), 3)
+
+    def test_unprocessed_upload_until_command(self):
+        """
+        Пока загрузка не обработана, отдаётся исходный файл; process_avatars доделывает пропущенное.
+        """
+        with self.captureOnCommitCallbacks(execute=False):
+            self.client.patch(reverse('user-detail', args=[self.user.id]),
+                              {'avatar': SimpleUploadedFile('big.png', make_png(), content_type='image/png')},
+                              format='multipart')
+        response = self.client.get(reverse('user-detail', args=[self.user.id]))
+        self.assertTrue(response.data['avatar'].endswith('/media/avatars/big.png'))
+        call_command('process_avatars', stdout=io.StringIO())
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.avatar.name.endswith(f'{self.user.avatar_hash}-256.webp'))
+        self.assertNotIn('avatars/big.png', self.stored_files())
+
+    def test_concurrent_processing_keeps_hashed_names(self):
+        """
+        Если те же варианты между exists() и save() записал параллельный обработчик,
+        копии с суффиксом удаляются, а avatar указывает на файл с именем по хэшу.
+        """
+        with self.captureOnCommitCallbacks(execute=False):
+            self.client.patch(reverse('user-detail', args=[self.user.id]),
+                              {'avatar': SimpleUploadedFile('avatar.png', make_png(), content_type='image/png')},
+                              format='multipart')
+        save = FileSystemStorage.save
+
+        def racing_save(storage, name, content, *args, **kwargs):
+            if name.endswith('.webp') and not storage.exists(name):
+                # Параллельный обработчик успел записать тот же вариант первым
+                save(storage, name, ContentFile(content.read()))
+                content.seek(0)
+            return save(storage, name, content, *args, **kwargs)
+
+        with mock.patch.object(FileSystemStorage, 'save', racing_save):
+            self.assertTrue(process_avatar(self.user.id))
+        self.user.refresh_from_db()
+        digest = self.user.avatar_hash
+        self.assertEqual(self.user.avatar.name, f'avatars/{digest[:2]}/{digest}-256.webp')
+        self.assertEqual(self.stored_files(), [f'avatars/{digest[:2]}/{digest}-{size}.webp' for size in (128, 256, 64)])
+
+
+class UserProjectsTests(QueryPlanMixin, APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.other = User.objects.create_user(username='other', password='pass')
+        self.client.force_authenticate(user=self.user)
+        self.first = Project.objects.create(title='First', description='Description')
+        self.second = Project.objects.create(title='Second', description='Description')
+        hidden = Project.objects.create(title='Hidden', description='Description')
+        self.first.project_users.add(self.user, through_defaults={'role': Membership.Role.OWNER})
+        self.second.project_users.add(self.user, self.other)
+        hidden.project_users.add(self.other)
+
+    def test_my_projects_in_one_query(self):
+        """
+        /users/me/projects/ — только проекты текущего пользователя с ролью, новые сверху, одним запросом.
+        """
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('user-projects'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(captured), 1)
+        self.assertEqual([(row['title'], row['role']) for row in response.data],
+                         [('Second', Membership.Role.MEMBER), ('First', Membership.Role.OWNER)])
+        self.assertEqual(set(response.data[0]), {'id', 'title', 'description', 'status', 'created', 'update',
+                                                 'role', 'joined_at'})
+
+    def test_lookups_use_membership_indexes(self):
+        """
+        Проекты пользователя и участники проекта выбираются по индексам Membership.
+        """
+        self.analyze('main_membership')
+        self.assertUsesIndex('main_membership', reverse('user-projects'), index='membership_user_joined_idx')
+        plan = self.explain_queryset(Membership.objects.filter(project=self.second).values('user_id'))
+        self.assertIn('membership_project_user_unique', plan)
+
+    def test_user_projects_follow_membership(self):
+        """
+        user_projects пользователя и project_users проекта — одна и та же таблица.
+        """
+        self.second.project_users.remove(self.user)
+        response = self.client.get(reverse('user-detail', args=[self.user.id]), {'fields': 'id,user_projects'})
+        self.assertEqual(response.data, {'id': self.user.id, 'user_projects': [self.first.id]})
+        self.assertEqual(set(self.second.project_users.all()), {self.other})
\ No newline at end of file
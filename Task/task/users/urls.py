@@ -1,7 +1,8 @@
 from django.urls import path
-from .views import UserView, UsersUpdate
+from .views import UserProjects, UserView, UsersUpdate
 
 urlpatterns = [
     path('', UserView.as_view(), name='user-list'),
-    path('<int:pk>/', UsersUpdate.as_view(), name='user-detail')
+    path('<int:pk>/', UsersUpdate.as_view(), name='user-detail'),
+    path('me/projects/', UserProjects.as_view(), name='user-projects'),
 ]
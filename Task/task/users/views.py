@@ -1,16 +1,122 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import update_last_login
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import serializers
+from rest_framework.exceptions import Throttled
+from rest_framework.permissions import IsAuthenticated
+from main.models import Membership
+from main.serializers import UserProjectSerializer
 from .serializers import UserSerializer
+from task.fieldsets import SparseFieldsetMixin
 from rest_framework import generics
 from .models import User
-from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.serializers import TokenObtainSerializer
+from rest_framework_simplejwt.settings import api_settings
+from .hashing import HashingUnavailable, ahash_password, averify_password
 from .serializers import CustomTokenObtainPairSerializer
+from task.throttling import IPTokenBucketThrottle, UsernameTokenBucketThrottle
 
-class CustomTokenObtainPairView(TokenObtainPairView):
-    serializer_class = CustomTokenObtainPairSerializer
 
-class UserView(generics.ListCreateAPIView):
-    queryset = User.objects.all()
+class TokenCredentialsSerializer(serializers.Serializer):
+    username = serializers.CharField()
+    password = serializers.CharField(trim_whitespace=False)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class CustomTokenObtainPairView(View):
+    """
+    Асинхронная выдача пары токенов. Пароль проверяется в пуле users.hashing,
+    поэтому поток запроса (в ASGI — цикл событий) не занят PBKDF2, а при
+    перегрузке пула клиент сразу получает 503 с Retry-After.
+
+    Семантика та же, что у TokenObtainPairView с ModelBackend: неактивный или
+    несуществующий пользователь — 401 (для несуществующего пароль всё равно
+    хэшируется, чтобы время ответа не выдавало наличие логина). Если хэш
+    пароля сделан устаревшими параметрами, он пересчитывается и сохраняется.
+
+    Попытки входа ограничены до проверки пароля двумя бакетами task.throttling
+    (ставки token и token_ip): на логин и на IP — перебор паролей одного
+    пользователя и перебор логинов с одного адреса получают 429 с Retry-After,
+    не занимая пул хэширования.
+    """
+    throttle_scope = 'token'
+    throttle_classes = (UsernameTokenBucketThrottle, IPTokenBucketThrottle)
+
+    async def post(self, request, *args, **kwargs):
+        try:
+            data = json.loads(request.body or b'{}') if request.content_type == 'application/json' else request.POST
+        except ValueError:
+            return JsonResponse({'detail': 'Некорректный JSON.'}, status=400)
+        credentials = TokenCredentialsSerializer(data=data)
+        if not credentials.is_valid():
+            return JsonResponse(credentials.errors, status=400)
+        username = credentials.validated_data['username']
+        password = credentials.validated_data['password']
+        self.throttle_username = username
+        wait = await sync_to_async(self.check_throttles, thread_sensitive=False)(request)
+        if wait is not None:
+            return JsonResponse({'detail': str(Throttled(wait).detail)}, status=429,
+                                headers={'Retry-After': str(wait)})
+
+        try:
+            user = await User._default_manager.filter(**{User.USERNAME_FIELD: username}).afirst()
+            if user is None:
+                await ahash_password(password)
+                return self.no_active_account()
+            is_correct, new_password = await averify_password(password, user.password)
+        except HashingUnavailable as exc:
+            return JsonResponse({'detail': str(exc.detail)}, status=exc.status_code,
+                                headers={'Retry-After': str(exc.wait)})
+        if not is_correct or not api_settings.USER_AUTHENTICATION_RULE(user):
+            return self.no_active_account()
+
+        if new_password is not None:
+            user.password = new_password
+            await user.asave(update_fields=['password'])
+        if api_settings.UPDATE_LAST_LOGIN:
+            await sync_to_async(update_last_login)(None, user)
+
+        refresh = CustomTokenObtainPairSerializer.get_token(user)
+        return JsonResponse({'refresh': str(refresh), 'access': str(refresh.access_token)})
+
+    def check_throttles(self, request):
+        """None — попытка разрешена, иначе через сколько секунд повторить."""
+        waits = []
+        for throttle_class in self.throttle_classes:
+            throttle = throttle_class()
+            if not throttle.allow_request(request, self):
+                waits.append(throttle.wait())
+        return max(waits) if waits else None
+
+    def no_active_account(self):
+        return JsonResponse({'detail': str(TokenObtainSerializer.default_error_messages['no_active_account'])},
+                            status=401)
+
+class UserView(SparseFieldsetMixin, generics.ListCreateAPIView):
+    # Список без ?fields= — короткая карточка: ни прав, ни групп, ни проектов.
+    # Их можно запросить явно (?fields=id,username,user_projects), M2M подгрузятся prefetch_related
+    queryset = User.objects.order_by('id')
     serializer_class =UserSerializer
+    default_fields = ('id', 'username', 'first_name', 'last_name', 'email', 'role', 'avatar')
 
-class UsersUpdate(generics.RetrieveUpdateDestroyAPIView):
+class UsersUpdate(SparseFieldsetMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
+
+
+class UserProjects(SparseFieldsetMixin, generics.ListAPIView):
+    """
+    Проекты текущего пользователя с его ролью, новые сверху: один запрос
+    Membership JOIN Project по индексу (user, joined_at).
+    """
+    serializer_class = UserProjectSerializer
+    permission_classes = (IsAuthenticated, )
+
+    def get_queryset(self):
+        return (Membership.objects.filter(user_id=self.request.user.pk)
+                .select_related('project').order_by('-joined_at', '-id'))
\ No newline at end of file